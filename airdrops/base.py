@@ -9,6 +9,16 @@
 #         {"platform": "discord", "action": "join_server", "server_url": "ServerURL"}
 #     ]
 # ]
+# Actions run one after the other by default. To run independent actions concurrently, give them an "id" and
+# list the ids they must wait for in "depends_on", e.g. {"id": "swap", "depends_on": ["bridge"], ...}.
+# An action without an id is referred to by its position in the list ("0", "1", ...).
+# Add "diversify": {"actions_per_wallet": 2, "amount_jitter": 0.05} to an airdrop without dependencies to give each
+# wallet its own subset of the actions, order, timing and amounts (see src/activity_planner.py).
+# DeFi actions may be delayed until gas is cheap when the user enabled gas saving, add "urgent": True to an action
+# that must be sent right away.
+# Add "bridge": {"to_blockchain": "scroll_alpha", "amount": 10000000000000000} to a deposit on an L1 bridge: the next
+# actions of the wallet start once the amount arrived on the L2, and the other wallets go on in the meantime.
+# Add "best_route": True to a swap that may go through any venue of DEX_VENUES with a better price than its exchange.
 airdrop_info = {
     "name": "Base",
     "isActivated": True,
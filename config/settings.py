@@ -9,6 +9,7 @@ ADMIN_TG_IDS = [1892238442]
 ADMIN_COMMANDS = [
     types.BotCommand(command="send_update", description="Send an update to all users"),
     types.BotCommand(command="send_message", description="Send a message to a user"),
+    types.BotCommand(command="rpc_stats", description="Show the JSON-RPC calls by method and action"),
 ]
 SUPPORT_TG_IDS = [1892238442]
 SUPPORT_COMMANDS = [
@@ -59,14 +60,118 @@ BLOCKCHAIN_SETTINGS = {
         'weth_address': '0x20b28b1e4665fff290650586ad76e977eab90c5d',
         'weth_abi': 'weth_mainnet_abi.json',
         'token_abi': 'erc20_abi.json'
+    },
+    'scroll_alpha': {
+        'endpoint': 'https://alpha-rpc.scroll.io/l2',
+        'explorer_url': 'https://blockscout.scroll.io/tx/',
+        'weth_address': '0x5300000000000000000000000000000000000004',
+        'weth_abi': 'weth_mainnet_abi.json',
+        'token_abi': 'erc20_abi.json'
+    },
+    'bsc': {
+        'endpoint': 'https://bsc-dataseed.bnbchain.org',
+        'explorer_url': 'https://bscscan.com/tx/',
+        'weth_address': '0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c',
+        'weth_abi': 'weth_mainnet_abi.json',
+        'token_abi': 'erc20_abi.json'
+    },
+    # Local dev chain (anvil, hardhat), e.g. to test the reward payouts with REWARD_PAYOUT_BLOCKCHAIN=dev
+    'dev': {
+        'endpoint': config("DEV_CHAIN_ENDPOINT", default="http://127.0.0.1:8545"),
+        'explorer_url': '',
+        'weth_address': config("DEV_CHAIN_WETH_ADDRESS", default="0x0000000000000000000000000000000000000000"),
+        'weth_abi': 'weth_mainnet_abi.json',
+        'token_abi': 'erc20_abi.json'
     }
     # Add more blockchains here
 }
 
 DEFAULT_TRANSACTION_TIMEOUT = 120
-GAS_PRICE_INCREASE = 1.2
+GAS_PRICE_INCREASE = 1.2 # Fee increase of a transaction replacing a pending one (the nodes require at least 10%)
+STUCK_TRANSACTION_SEC = 600 # A transaction still pending after this long is replaced by a cancellation
+CANCEL_STUCK_TRANSACTIONS = True # Cancel the stuck transactions of the wallets before a run (see src/transaction_journal.py)
+TRANSACTION_JOURNAL_SIZE = 100 # Sent transactions remembered per wallet to find the stuck ones
+GAS_ORACLE_TTL_SEC = 12 # Fee estimate reused by the chain actors for this many seconds (about one block)
+# EIP-1559 fees (see src/fee_builder.py), chains without EIP-1559 use gasPrice
+FEE_PRIORITY_BLOCKS = 10 # Recent blocks used to estimate the priority fee
+FEE_PRIORITY_PERCENTILE = 50 # Percentile of the priority fees paid in these blocks
+BASE_FEE_HEADROOM = 2 # maxFeePerGas = BASE_FEE_HEADROOM * next base fee + priority fee
+MIN_PRIORITY_FEE_GWEI = 0.001
+MAX_PRIORITY_FEE_GWEI = 3
+MAX_FEE_PER_GAS_GWEI = 300 # Can be overridden per blockchain with "max_fee_per_gas_gwei" in BLOCKCHAIN_SETTINGS
+# Gas limits reused between wallets for calls of the same shape (see src/gas_estimate_cache.py)
+GAS_ESTIMATE_MARGIN = 1.25 # Gas limit = highest gas seen for the shape * margin
+GAS_ESTIMATE_DRIFT = 0.1 # A receipt using this much more gas than the cached value invalidates it
+GAS_ESTIMATE_CACHE_SIZE = 10000
+GAS_LIMIT_MARGIN = 1.2 # Gas limits are the estimate plus this margin for the multi-step swaps
+FALLBACK_SWAP_GAS_LIMIT = 1500000 # Gas limit of the multi-step swaps when they can't be estimated
+# Fee-aware timing: non-urgent DeFi actions wait, within the window chosen by the user, for cheap gas
+FEE_HISTORY_SIZE = 4096 # Base fees kept per blockchain (one per block)
+FEE_HISTORY_BLOCKS = 64 # Blocks requested per eth_feeHistory call
+FEE_SAMPLE_INTERVAL_SEC = 60 # Minimum time between two refreshes of the base fee history
+FEE_DEFER_PERCENTILE = 30 # Actions wait for the base fee to fall below this percentile of the history
+FEE_WINDOW_OPTIONS_SEC = [0, 1800, 3600, 3 * 3600, 6 * 3600] # Maximum waiting times offered in the settings menu
 MIN_WAITING_SEC = 30
 MAX_WAITING_SEC = 300
+# Diversified airdrops (see "diversify" in the airdrop files)
+ACTIVITY_START_SPREAD_SEC = 3600 # Wallets start their first action at a random time within this window
+ACTIVITY_AMOUNT_JITTER = 0.05 # Amounts vary by up to +/- 5% between wallets
+# Synchronized wallets detection
+SYNC_DETECTION_WINDOW_SEC = 300 # Transactions sent within this window are considered simultaneous
+SYNC_DETECTION_MIN_WALLETS = 3 # Alert when this many wallets of a user send the same transaction in the window
+SYNC_DETECTION_AMOUNT_TOLERANCE = 0.1 # Amounts within ~10% of each other count as the same amount
+# Bridges (see "bridge" in the airdrop files)
+BRIDGE_POLL_INTERVAL_SEC = 30 # L2 balances of the pending deposits are read this often
+BRIDGE_TIMEOUT_SEC = 3600 # The actions following a deposit are skipped if the funds didn't arrive after this time
+BRIDGE_AMOUNT_TOLERANCE = 0.01 # A deposit has arrived when the L2 balance went up by the amount minus 1%
+# Swap routing: a swap action with "best_route": True quotes its exchange and these venues concurrently, and swaps on
+# the best one. Off by default, the exchange of an airdrop is usually the protocol it rewards
+# ("uniswap_v2" routers, "mute" routers, "odos" aggregator API)
+DEX_VENUES = {
+    'ethereum': [
+        {'name': 'Uniswap V2', 'type': 'uniswap_v2', 'router': '0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D'},
+        {'name': 'SushiSwap', 'type': 'uniswap_v2', 'router': '0xd9e1cE17f2641f24aE83637ab66a2cca9C378B9F'},
+        {'name': 'Odos', 'type': 'odos', 'router': '0xCf5540fFFCdC3d510B18bFcA6d2b9987b0772559', 'chain_id': 1},
+    ],
+    'zkSync Era Mainnet': [
+        {'name': 'Mute', 'type': 'mute', 'router': '0x8B791913eB07C32779a16750e3868aA8495F5964', 'abi': 'MuteSwitchRouterDynamic.json'},
+        {'name': 'Odos', 'type': 'odos', 'router': '0x4bBa932E9792A2b917D47830C93a9BC79320E4f7', 'chain_id': 324},
+    ],
+}
+QUOTE_LATENCY_BUDGET_SEC = 2 # Venues that haven't quoted after this time are cancelled
+ODOS_QUOTE_URL = 'https://api.odos.xyz/sor/quote/v2'
+ODOS_ASSEMBLE_URL = 'https://api.odos.xyz/sor/assemble'
+ODOS_SLIPPAGE_PERCENT = 1
+BALANCE_PRECHECK = True # Skip the wallets that can't fund an airdrop before sending any transaction
+MAX_CONCURRENT_PREPARATIONS_PER_CHAIN = 4 # Transactions prepared at the same time on a blockchain (non-custodial flow)
+
+# JSON-RPC batching
+RPC_BATCH_MAX_SIZE = 100 # Maximum number of calls sent in a single batch request
+RPC_BATCH_TIMEOUT = 15 # Timeout for a batch request in seconds
+
+# JSON-RPC cassettes (see src/rpc_cassette.py): "record" saves the calls of a run, "replay" answers them offline
+RPC_CASSETTE_MODE = config("RPC_CASSETTE_MODE", default="")  # "", "record" or "replay"
+RPC_CASSETTE_DIRECTORY = config("RPC_CASSETTE_DIRECTORY", default="cassettes")  # One file per blockchain
+RPC_CASSETTE_LATENCY = config("RPC_CASSETTE_LATENCY", default="0")  # Replay delay in seconds, or "recorded"
+
+# JSON-RPC accounting (see src/rpc_accounting.py and the /rpc_stats admin command)
+RPC_SLOW_CALL_SEC = 2 # Calls slower than this are traced to the system log
+RPC_LATENCY_SAMPLE_SIZE = 1000 # Latencies kept per method for the percentiles
+
+# Run plan (dry-run)
+PLAN_CONFIRMATION_SEC = 15 # Average time for a transaction to be mined
+# Gas limits used when an action can't be estimated in a single call (multi-transaction actions or failed estimates)
+PLAN_DEFAULT_GAS_LIMITS = {
+    "transfer_native_token": 21000,
+    "transfer_token": 65000,
+    "swap_native_token": 250000, # Wrap + approval + swap
+    "swap_tokens": 220000, # Approval + swap
+    "swap_tokens_with_steps": 300000,
+    "add_liquidity": 350000,
+    "remove_liquidity": 300000,
+    "interact_with_api": 300000,
+    "default": 200000,
+}
 
 # Coinpayments API
 COINPAYMENTS_PUBLIC_KEY = config("COINPAYMENTS_PUBLIC_KEY")
@@ -93,6 +198,8 @@ DAYS_IN_MONTH = 30
 DAYS_IN_YEAR = 365
 LOG_PATH = 'logs'
 LOG_MAX_AGE_DAYS = 30
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")  # Records below this level are dropped before their values are computed
+LOG_TO_STDOUT = config("LOG_TO_STDOUT", default=True, cast=bool)  # Also print the user logs (journald)
 AIRDROP_FARMER_DATABASE_URL = config("AIRDROP_FARMER_DATABASE_URL")
 # It's important to keep the order of the plans
 SUBSCRIPTION_PLANS = [
@@ -103,6 +210,8 @@ SUBSCRIPTION_PLANS = [
         'price_yearly': 0,
         'wallets': 1,
         'airdrop_limit': 1,
+        'scheduling_weight': 1,
+        'max_concurrent_runs': 5,
     },
     {
         'level': 'Adventurer (Basic Plan)',
@@ -111,6 +220,8 @@ SUBSCRIPTION_PLANS = [
         'price_yearly': 199.99,
         'wallets': 5,
         'airdrop_limit': 10,
+        'scheduling_weight': 2,
+        'max_concurrent_runs': 10,
     },
     {
         'level': 'Conqueror (Pro Plan)',
@@ -120,6 +231,8 @@ SUBSCRIPTION_PLANS = [
         'wallets': 100,
         'airdrop_limit': 200,
         'most_popular': True,
+        'scheduling_weight': 4,
+        'max_concurrent_runs': 15,
     },
     {
         'level': 'Elite (Enterprise Plan)',
@@ -128,9 +241,18 @@ SUBSCRIPTION_PLANS = [
         'price_yearly': 'Custom',
         'airdrop_limit': None,
         'wallets': '♾ (Unlimited)',
+        'scheduling_weight': 8,
+        'max_concurrent_runs': None, # Only limited by MAX_CONCURRENT_FARMING_SESSIONS
     },
 ]
 
+# Farming runs executed at the same time, the others wait in a weighted fair queue (see scheduling_weight and
+# max_concurrent_runs in SUBSCRIPTION_PLANS)
+MAX_CONCURRENT_FARMING_SESSIONS = 20
+MAX_QUEUED_FARMING_SESSIONS = 200 # Farming requests beyond this are refused until the queue shrinks
+FARMING_RUN_DURATION_ESTIMATE_SEC = 3600 # Initial average run duration used to estimate the queue waiting time
+SHUTDOWN_DRAIN_TIMEOUT_SEC = 120 # Time given to the farming sessions to stop cleanly on shutdown
+
 # Waiting time between actions for each platform
 PLATEFORM_WAIT_TIMES = {
     "twitter": 3000, # Seconds delay between Twitter actions
@@ -146,4 +268,12 @@ DELAY_BETWEEN_DB_RETRIES = 5 # Delay between retries in seconds
 # Referral
 MAX_REFERRAL_CODE_USES = 3
 MAX_REFERRAL_CODE_GENERATION_PER_DAY = 1
-REWARD_PERCENTAGE = 10
\ No newline at end of file
+REWARD_PERCENTAGE = 10
+# Claimed rewards are paid in batches, many recipients per transaction of a multi-send contract (see src/reward_payouts.py)
+REWARD_PAYOUT_BLOCKCHAIN = config("REWARD_PAYOUT_BLOCKCHAIN", default="bsc")
+REWARD_PAYOUT_TOKEN_ADDRESS = config("REWARD_PAYOUT_TOKEN_ADDRESS", default="0x55d398326f99059fF775485246999027B3197955")  # USDT (BEP-20)
+REWARD_PAYOUT_TOKEN_DECIMALS = config("REWARD_PAYOUT_TOKEN_DECIMALS", default=18, cast=int)
+REWARD_PAYOUT_MULTISEND_ADDRESS = config("REWARD_PAYOUT_MULTISEND_ADDRESS", default="0xD152f549545093347A162Dce210e7293f1452150")  # Disperse
+REWARD_PAYOUT_PRIVATE_KEY = config("REWARD_PAYOUT_PRIVATE_KEY", default="")  # Wallet paying the rewards, no payout when empty
+REWARD_PAYOUT_INTERVAL_SEC = 86400 # Time between two payouts
+REWARD_PAYOUT_BATCH_SIZE = 200 # Maximum number of recipients paid by a single transaction
\ No newline at end of file
@@ -1,9 +1,14 @@
 import asyncio
+import signal
 from quart import Quart, request
 from src.db_manager import DBManager
 from src.discord_handler import DiscordHandler
+from src.eip712_templates import EIP712Templates
 from src.ipn_handler import IPNHandler
 from src.logger import Logger
+from src.metrics import metrics_response
+from src.reward_payouts import RewardPayouts
+from src.rpc_accounting import RPCAccounting
 from src.telegram_bot import TelegramBot
 from asyncpg.exceptions import ConnectionDoesNotExistError
 from hypercorn.asyncio import serve
@@ -32,27 +37,47 @@ async def check_subscriptions_periodically(db_manager):
         await db_manager.check_and_update_expired_subscriptions()
         await asyncio.sleep(86400)  # Sleep for a day
 
+async def pay_rewards_periodically(reward_payouts):
+    while True:
+        try:
+            await reward_payouts.pay_rewards()
+        except Exception as e:
+            system_logger.add_log(f"ERROR - Reward payouts failed: {e}", logging.ERROR)
+        await asyncio.sleep(settings.REWARD_PAYOUT_INTERVAL_SEC)
+
 app = Quart(__name__)
 
 # Create an instance of the Logger class for system logs
 system_logger = Logger(app_log=True)
 
-async def run_flask_app(app, ipn_handler_instance, telegram_bot):
+async def run_flask_app(app, ipn_handler_instance, telegram_bot, shutdown_trigger):
     @app.route('/ipn', methods=['POST'])
     async def handle_ipn_route():
         ipn_data = await request.form
         await ipn_handler_instance.handle_ipn(ipn_data, telegram_bot=telegram_bot)
         return json.dumps({'success': True}), 200, {'ContentType': 'application/json'}
 
+    @app.route('/metrics', methods=['GET'])
+    async def handle_metrics_route():
+        body, content_type = metrics_response()
+        return body, 200, {'Content-Type': content_type}
+
     config = hypercorn.Config()
     config.bind = [
         "0.0.0.0:{}".format(settings.IPN_PORT)]  # Replace 127.0.0.1 with 0.0.0.0 to receive requests from outside
-    await serve(app, config)
+    # Without a trigger, hypercorn installs its own SIGTERM handler in place of ours
+    await serve(app, config, shutdown_trigger=shutdown_trigger)
 
 async def main():
     # Initialize the database
     db_manager = DBManager(system_logger)
 
+    # Parse the EIP-712 message templates once for all the signatures
+    EIP712Templates.load_all()
+
+    # Slow JSON-RPC calls are traced to the system log
+    RPCAccounting.get_shared().system_logger = system_logger
+
     # Initialize instances
     ipn_handler_instance = IPNHandler(db_manager, system_logger)
     telegram_bot = TelegramBot(settings.TELEGRAM_TOKEN, db_manager, system_logger)
@@ -76,13 +101,33 @@ async def main():
     airdrop_farmer = AirdropFarmer()
     await airdrop_farmer.initialize()
 
+    # systemd stops the bot with SIGTERM: cancel the main tasks so that the farming sessions are drained below
+    shutdown_requested = asyncio.Event()
     tasks = []
+    main_tasks = None
+
+    def request_shutdown(signal_name):
+        system_logger.add_log(f"{signal_name} received. Exiting...", logging.INFO)
+        shutdown_requested.set()
+        if main_tasks is not None:
+            main_tasks.cancel()
+
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, request_shutdown, signal_number.name)
+
     try:
         # Run the Quart app concurrently with the Telegram bot
-        tasks.append(asyncio.create_task(run_flask_app(app, ipn_handler_instance, telegram_bot)))
+        tasks.append(asyncio.create_task(run_flask_app(app, ipn_handler_instance, telegram_bot, shutdown_requested.wait)))
         tasks.append(asyncio.create_task(telegram_bot.start_polling()))
         tasks.append(asyncio.create_task(check_subscriptions_periodically(db_manager)))
-        await asyncio.gather(*tasks)
+        if settings.REWARD_PAYOUT_PRIVATE_KEY:
+            tasks.append(asyncio.create_task(pay_rewards_periodically(RewardPayouts(db_manager, system_logger))))
+        main_tasks = asyncio.gather(*tasks)
+        await main_tasks
+    except asyncio.CancelledError:
+        if not shutdown_requested.is_set():
+            raise
     except KeyboardInterrupt:
         system_logger.add_log("Keyboard interrupt detected. Exiting...", logging.INFO)
     except Exception as e:
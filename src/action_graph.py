@@ -0,0 +1,60 @@
+# action_graph.py
+
+
+class ActionGraphError(Exception):
+    pass
+
+
+class ActionGraph:
+    """
+    Dependencies between the actions of an airdrop.
+
+    An action can declare an "id" and a list of ids it "depends_on". Actions without an id are
+    identified by their position in the airdrop file. Dependencies on deactivated actions are ignored.
+    """
+
+    def __init__(self, all_actions, active_actions):
+        self.actions = {}
+        self.dependencies = {}
+        active_ids = {id(action) for action in active_actions}
+        known_ids = set()
+
+        for index, action in enumerate(all_actions):
+            action_id = self.get_action_id(index, action)
+            if action_id in known_ids:
+                raise ActionGraphError(f"Duplicate action id '{action_id}'")
+            known_ids.add(action_id)
+            if id(action) in active_ids:
+                self.actions[action_id] = action
+
+        for action_id, action in self.actions.items():
+            dependencies = set(action.get("depends_on", []))
+            unknown = dependencies - known_ids
+            if unknown:
+                raise ActionGraphError(f"Action '{action_id}' depends on unknown action(s): {', '.join(sorted(unknown))}")
+            self.dependencies[action_id] = {dependency for dependency in dependencies if dependency in self.actions}
+
+        self.order = self.topological_order()
+
+    @staticmethod
+    def get_action_id(index, action):
+        return str(action.get("id", index))
+
+    @staticmethod
+    def declares_dependencies(actions):
+        return any("depends_on" in action for action in actions)
+
+    def topological_order(self):
+        # Kahn's algorithm, keeping the order of the airdrop file between independent actions
+        remaining = {action_id: set(dependencies) for action_id, dependencies in self.dependencies.items()}
+        order = []
+        while remaining:
+            ready = [action_id for action_id, dependencies in remaining.items() if not dependencies]
+            if not ready:
+                raise ActionGraphError(f"Circular dependency between actions: {', '.join(remaining)}")
+            for action_id in ready:
+                order.append(action_id)
+                del remaining[action_id]
+            for dependencies in remaining.values():
+                dependencies.difference_update(ready)
+        return order
@@ -0,0 +1,66 @@
+# activity_planner.py
+import numpy as np
+import config.settings as settings
+
+# Action fields holding amounts, scaled together so that e.g. the minimum amounts stay consistent with the desired ones
+AMOUNT_FIELDS = ("amount_in_wei", "amount", "amount_in", "amount_a_desired", "amount_b_desired", "amount_a_min",
+                 "amount_b_min")
+
+
+class ActivityPlanner:
+    """
+    Timetable of a diversified airdrop run, generated for all the wallets in one vectorized pass.
+
+    Each wallet performs a rotating subset of the actions, in its own random order, with random gaps of at least
+    min_gap_sec between two of its actions and a random start offset so that wallets don't act at the same time.
+    Amounts get a per (wallet, action) jitter. All the draws come from a single PCG64 generator, so the timetables
+    of the wallets are independent and reproducible from the seed.
+    """
+
+    def __init__(self, wallet_count, action_count, actions_per_wallet=None, min_gap_sec=None, max_gap_sec=None,
+                 start_spread_sec=None, amount_jitter=None, seed=None):
+        self.wallet_count = wallet_count
+        self.action_count = action_count
+        self.actions_per_wallet = min(actions_per_wallet or action_count, action_count)
+        self.min_gap_sec = settings.MIN_WAITING_SEC if min_gap_sec is None else min_gap_sec
+        self.max_gap_sec = max(settings.MAX_WAITING_SEC if max_gap_sec is None else max_gap_sec, self.min_gap_sec)
+        self.start_spread_sec = settings.ACTIVITY_START_SPREAD_SEC if start_spread_sec is None else start_spread_sec
+        self.amount_jitter = settings.ACTIVITY_AMOUNT_JITTER if amount_jitter is None else amount_jitter
+        self.rng = np.random.default_rng(seed)
+
+    def plan(self):
+        """
+        Return the timetable as (wallet_count, action_count) arrays:
+        - "enabled": whether the wallet performs the action
+        - "start_sec": start time of the action from the beginning of the run, NaN when disabled
+        - "amount_factor": multiplier applied to the amounts of the action
+        """
+        wallets, actions, per_wallet = self.wallet_count, self.action_count, self.actions_per_wallet
+        rows = np.arange(wallets)[:, None]
+
+        # Rotating subsets: consecutive wallets start one step further in a shuffled action list,
+        # so every action is covered evenly across wallets
+        shuffled_actions = self.rng.permutation(actions)
+        offsets = (self.rng.integers(actions) + np.arange(wallets)) % actions
+        subsets = shuffled_actions[(offsets[:, None] + np.arange(per_wallet)[None, :]) % actions]
+
+        # Random order of the subset for each wallet
+        subsets = np.take_along_axis(subsets, np.argsort(self.rng.random((wallets, per_wallet)), axis=1), axis=1)
+
+        # Start time of each position: wallet offset + cumulated gaps, the first action has no gap
+        gaps = self.rng.uniform(self.min_gap_sec, self.max_gap_sec, (wallets, per_wallet))
+        gaps[:, 0] = 0
+        starts = self.rng.uniform(0, self.start_spread_sec, (wallets, 1)) + np.cumsum(gaps, axis=1)
+
+        enabled = np.zeros((wallets, actions), dtype=bool)
+        enabled[rows, subsets] = True
+        start_sec = np.full((wallets, actions), np.nan)
+        start_sec[rows, subsets] = starts
+        amount_factor = 1 + self.rng.uniform(-self.amount_jitter, self.amount_jitter, (wallets, actions))
+
+        return {"enabled": enabled, "start_sec": start_sec, "amount_factor": amount_factor}
+
+
+def jitter_amounts(action, factor):
+    """Return the amount fields of an action multiplied by factor, to be used as an overlay of the action."""
+    return {field: int(int(action[field]) * factor) for field in AMOUNT_FIELDS if action.get(field) is not None}
@@ -3,16 +3,28 @@ import asyncio
 import random
 import traceback
 
+import numpy as np
+
 from config import settings
 from config.settings import BLOCKCHAIN_SETTINGS
+from src.action_graph import ActionGraph, ActionGraphError
+from src.activity_planner import ActivityPlanner, jitter_amounts
+from src.airdrop_spec import AirdropRegistry, action_overlay
+from src.bridge_watcher import BridgeWatcher
+from src.chain_actor import ChainActor
+from src.clock import Clock
 from src.defi_handler import DeFiHandler
+from src.fee_sampler import FeeSampler
+from src.metrics import ACTION_DURATION, ACTIONS
+from src.rpc_accounting import RPC_TAGS, RPCAccounting, tag_rpc_calls
+from src.run_planner import RunPlanner
+from src.signer_cache import SignerCache
+from src.transaction_journal import TransactionJournal
 from src.twitter_handler import TwitterHandler
-import os
-import logging
-import importlib.util
 
 class AirdropExecution:
-    def __init__(self, discord_handler=None, logger=None, wallets=None):
+    def __init__(self, discord_handler=None, logger=None, wallets=None, db_manager=None, user_id=None, clock=None,
+                 defi_handler_factory=None, chain_actor_factory=None, sync_detector=None, fee_window_sec=0):
         self.logger = logger
         self.last_executed = {}  # Dictionary to store the last execution time
         self.airdrop_info = self.load_airdrop_files() # Load the airdrop files
@@ -25,25 +37,34 @@ class AirdropExecution:
         self.airdrop_statuses = {}
         self.stop_requested = False
         self.wallets = wallets
+        # Used to record the progress of the run so that it can be resumed after an interruption
+        self.db_manager = db_manager
+        self.user_id = user_id
+        # Injected by the simulator to run the schedule in virtual time against a mock chain
+        self.clock = clock or Clock()
+        self.defi_handler_factory = defi_handler_factory or DeFiHandler
+        # DeFi actions go through the actor of their blockchain, which orders the transactions of each wallet
+        self.chain_actor_factory = chain_actor_factory or ChainActor.get
+        self.balance_precheck = settings.BALANCE_PRECHECK
+        self.cancel_stuck_transactions = settings.CANCEL_STUCK_TRANSACTIONS
+        # Journal of the transactions sent on the clock of the execution, shared with its DeFi handlers
+        self.transaction_journal = TransactionJournal.get_shared(clock)
+        self.unaffordable_airdrops = {}  # {(wallet address, airdrop name): reason} found by the balance pre-check
+        # Shared by all the runs of the bot, sees every transaction sent by the wallets of the user
+        self.sync_detector = sync_detector
+        # Non-urgent DeFi actions may wait this long for the base fee to drop (0 sends right away)
+        self.fee_window_sec = fee_window_sec
+        self.fee_sampler_factory = FeeSampler.get
+        self.signer_cache = SignerCache()
+        # Deposit waits and timeouts run on the clock of the execution
+        self.bridge_watcher = BridgeWatcher.get_shared(clock)
+        self.rpc_accounting = RPCAccounting.get_shared()
 
 
     # Function to load airdrop files
     def load_airdrop_files(self):
-        airdrops_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "airdrops"))
-        airdrop_files = [f for f in os.listdir(airdrops_path) if f.endswith(".py")]
-
-        airdrop_list = []
-        for airdrop_file in airdrop_files:
-            try:
-                file_path = os.path.join(airdrops_path, airdrop_file)
-                spec = importlib.util.spec_from_file_location(airdrop_file[:-3], file_path)
-                airdrop_module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(airdrop_module)
-                airdrop_list.append(airdrop_module.airdrop_info)
-            except Exception as e:
-                self.logger.add_log(f"ERROR - Error loading {airdrop_file}: {e}", logging.ERROR)
-
-        return airdrop_list
+        # The specs are loaded once and shared read-only by all the runs, see AirdropRegistry
+        return AirdropRegistry.get(self.logger)
 
     # Function to get the active airdrops
     def get_active_airdrops(self):
@@ -55,46 +76,54 @@ class AirdropExecution:
         return active_airdrops
 
     async def execute_single_airdrop(self, airdrop):
-        message = "------------------------"
-        self.logger.add_log(message)
-        print(message)
-        message = f"INFO - Executing actions for {airdrop['name']} airdrop"
-        print(message)
-        self.logger.add_log(message)
+        self.logger.separator()
+        self.logger.info(f"Executing actions for {airdrop['name']} airdrop")
 
         success = await self.execute_airdrop_actions(airdrop)
         self.airdrop_statuses[airdrop['name']] = success
 
         # Message indicating that the actions for the current airdrop are finished
-        message = f"INFO - Finished actions for {airdrop['name']} airdrop"
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info(f"Finished actions for {airdrop['name']} airdrop")
 
     async def airdrop_execution(self):
-        # Connect to Discord if there is at least one Discord action
-        if self.has_discord_action:
-            await self.discord_handler.connect()
+        # The JSON-RPC calls of the run are counted for the summary written at its end
+        run_id = self.rpc_accounting.start_run()
+        tags_token = RPC_TAGS.set({"run": run_id, "user": self.user_id})
+        try:
+            # Connect to Discord if there is at least one Discord action
+            if self.has_discord_action:
+                await self.discord_handler.connect()
 
-        # Iterate through the airdrop files
-        for airdrop in self.airdrop_info:
-            if self.stop_requested:
-                break
-            if airdrop["isActivated"] and airdrop["name"] in self.airdrops_to_execute:
-                await self.execute_single_airdrop(airdrop)
-                # Wait for a random time if there are more airdrops to execute
-                if airdrop != self.airdrop_info[-1]:
-                    waiting_time = random.randint(settings.MIN_WAITING_SEC, settings.MAX_WAITING_SEC)
-                    message = f"INFO - Waiting for {waiting_time} seconds before executing the next airdrop"
-                    print(message)
-                    self.logger.add_log(message)
-                    await asyncio.sleep(waiting_time)
-
-                # Yield control back to the event loop
-                await asyncio.sleep(0)
-            elif not self.airdrops_to_execute:
-                message = f"INFO - No airdrop to execute"
-                print(message)
-                self.logger.add_log(message)
+            if self.balance_precheck and self.wallets:
+                await self.check_wallet_balances()
+
+            if self.cancel_stuck_transactions and self.wallets:
+                await self.cancel_wallets_stuck_transactions()
+
+            if self.wallets:
+                self.reset_wallet_nonces()
+
+            # Iterate through the airdrop files
+            for airdrop in self.airdrop_info:
+                if self.stop_requested:
+                    break
+                if airdrop["isActivated"] and airdrop["name"] in self.airdrops_to_execute:
+                    await self.execute_single_airdrop(airdrop)
+                    # Wait for a random time if there are more airdrops to execute
+                    if airdrop is not self.airdrop_info[-1]:
+                        waiting_time = random.randint(settings.MIN_WAITING_SEC, settings.MAX_WAITING_SEC)
+                        self.logger.info(f"Waiting for {waiting_time} seconds before executing the next airdrop")
+                        await self.clock.sleep(waiting_time)
+
+                    # Yield control back to the event loop
+                    await asyncio.sleep(0)
+                elif not self.airdrops_to_execute:
+                    self.logger.info(f"No airdrop to execute")
+        finally:
+            # The parsed keys of the wallets don't outlive the run
+            self.signer_cache.clear()
+            RPC_TAGS.reset(tags_token)
+            self.logger.info(self.rpc_accounting.format_run(self.rpc_accounting.finish_run(run_id)))
 
         self.finished = True
 
@@ -107,76 +136,410 @@ class AirdropExecution:
         #random.shuffle(active_actions)
 
         if not active_actions:
-            message = f"INFO - No active actions found for {airdrop_info['name']} airdrop."
-            print(message)
-            self.logger.add_log(message)
+            self.logger.info(f"No active actions found for {airdrop_info['name']} airdrop.")
             return
 
+        completed_actions = await self.get_completed_actions(airdrop_info)
+        if completed_actions:
+            self.logger.info(f"Resuming {airdrop_info['name']} airdrop, {len(completed_actions)} action(s) already completed will be skipped")
+
+        # Wallets that can't fund this airdrop are skipped before any transaction is sent
+        wallets = []
         for wallet in self.wallets:
+            reason = self.unaffordable_airdrops.get((wallet["public_key"].lower(), airdrop_info["name"]))
+            if reason:
+                self.logger.warning(f"Skipping wallet {wallet['public_key']} for {airdrop_info['name']} airdrop: {reason}")
+                success = False
+            else:
+                wallets.append(wallet)
+
+        if airdrop_info.get("diversify") and not ActionGraph.declares_dependencies(active_actions):
+            if not await self.execute_diversified_schedule(airdrop_info, active_actions, wallets, completed_actions):
+                success = False
+        elif ActionGraph.declares_dependencies(active_actions):
+            try:
+                graph = ActionGraph(airdrop_info["actions"], active_actions)
+            except ActionGraphError as e:
+                self.logger.error(f"Invalid action dependencies in {airdrop_info['name']} airdrop: {e}")
+                return False
+            for wallet in wallets:
+                if self.stop_requested:
+                    break
+                if not await self.execute_action_graph(airdrop_info, graph, wallet, completed_actions):
+                    success = False
+        else:
+            # The actions following a bridge run in the background once the funds arrived on the L2
+            continuations = []
+            try:
+                for wallet in wallets:
+                    if self.stop_requested:  # Add this check
+                        break
+                    wallet_success, continuation = await self.execute_wallet_actions(airdrop_info, active_actions, wallet,
+                                                                                     completed_actions)
+                    if not wallet_success:
+                        success = False
+                    if continuation is not None:
+                        continuations.append(continuation)
+                if not all(await asyncio.gather(*continuations)):
+                    success = False
+            finally:
+                # A cancelled run doesn't leave continuations behind
+                for continuation in continuations:
+                    continuation.cancel()
+
+        # The airdrop has been fully executed, the next run will start from the beginning
+        if success and not self.stop_requested:
+            await self.clear_checkpoints(airdrop_info)
+
+        return success
+
+    async def execute_wallet_actions(self, airdrop_info, actions, wallet, completed_actions):
+        """
+        Execute the actions of a wallet one after the other.
+        After a bridge action, the remaining actions are handed to a background continuation that starts when the funds
+        arrive on the L2, so that the next wallet doesn't wait. Returns (success, continuation task or None).
+        """
+        success = True
+        for index, action in enumerate(actions):
             if self.stop_requested:  # Add this check
                 break
-            for action in active_actions:
-                if self.stop_requested:  # Add this check
-                    break
-                message = "------------------------"
-                print(message)
-                self.logger.add_log(message)
-                message = f"INFO - Executing action '{action['action'].replace('_', ' ')}' for {airdrop_info['name']} airdrop"
-                print(message)
-                self.logger.add_log(message)
-                # Add the wallet's public address and private key to the action
-                action["wallet"] = {"address": wallet["public_key"], "private_key": wallet["private_key"]}
-                platform = action["platform"]
+            action_key = self.get_action_key(airdrop_info, action)
+            if (wallet["public_key"].lower(), action_key) in completed_actions:
+                continue
+            deposit = None
+            if action.get("bridge") and self.bridge_watcher is not None and action is not actions[-1]:
+                deposit = await self.bridge_watcher.prepare(action["bridge"], wallet["public_key"], action.get("msg_value", 0))
+            if not await self.execute_action(airdrop_info, action, wallet, action_key):
+                success = False
+            elif deposit is not None:
+                self.logger.info(f"Waiting in the background for the funds of wallet {wallet['public_key']} to arrive on {deposit['blockchain']}, moving on")
+                continuation = asyncio.create_task(
+                    self.continue_after_bridge(deposit, airdrop_info, actions[index + 1:], wallet, completed_actions))
+                return success, continuation
+            # Wait for a random time if there are more actions to execute
+            if action is not actions[-1]:
+                await self.wait_before_next_action()
+        return success, None
+
+    async def continue_after_bridge(self, deposit, airdrop_info, actions, wallet, completed_actions):
+        if not await self.bridge_watcher.wait(deposit):
+            self.logger.error(f"The funds bridged by wallet {wallet['public_key']} didn't arrive on {deposit['blockchain']} in time, skipping its remaining actions.")
+            return False
+        self.logger.info(f"Funds of wallet {wallet['public_key']} arrived on {deposit['blockchain']}, resuming its actions")
+        success, continuation = await self.execute_wallet_actions(airdrop_info, actions, wallet, completed_actions)
+        if continuation is not None:
+            success = await continuation and success
+        return success
+
+    async def execute_diversified_schedule(self, airdrop_info, active_actions, wallets, completed_actions):
+        """
+        Execute the timetable of the activity planner: each wallet performs its own subset of the actions,
+        in its own order, at its own times and with jittered amounts. The wallets run concurrently.
+        """
+        options = airdrop_info["diversify"]
+        planner = ActivityPlanner(len(wallets), len(active_actions), actions_per_wallet=options.get("actions_per_wallet"),
+                                  amount_jitter=options.get("amount_jitter"))
+        timetable = planner.plan()
+        run_start = self.clock.monotonic()
+
+        async def run_wallet(row, wallet):
+            succeeded = True
+            last_action_finished = None
+            columns = np.flatnonzero(timetable["enabled"][row])
+            for column in columns[np.argsort(timetable["start_sec"][row, columns])]:
+                action = active_actions[column]
+                action_key = self.get_action_key(airdrop_info, action)
+                if (wallet["public_key"].lower(), action_key) in completed_actions:
+                    continue
+                delay = run_start + timetable["start_sec"][row, column] - self.clock.monotonic()
+                # An action that took longer than planned (receipt waits, fee deferral) must not eat the minimum gap
+                if last_action_finished is not None:
+                    delay = max(delay, planner.min_gap_sec - (self.clock.monotonic() - last_action_finished))
+                if delay > 0:
+                    await self.clock.sleep(delay)
+                if self.stop_requested:
+                    return False
+                planned_action = action_overlay(action, **jitter_amounts(action, timetable["amount_factor"][row, column]))
+                if not await self.execute_action(airdrop_info, planned_action, wallet, action_key):
+                    succeeded = False
+                last_action_finished = self.clock.monotonic()
+            return succeeded
+
+        self.logger.info("Diversified schedule: %s action(s) over %s wallet(s), last one in %s",
+                         int(timetable['enabled'].sum()), len(wallets),
+                         self.format_seconds(np.nanmax(timetable['start_sec'], initial=0)))
+        results = await asyncio.gather(*[run_wallet(row, wallet) for row, wallet in enumerate(wallets)])
+        return all(results)
+
+    @staticmethod
+    def format_seconds(seconds):
+        return f"{int(seconds) // 3600}h{int(seconds) % 3600 // 60:02d}m"
+
+    async def execute_action_graph(self, airdrop_info, graph, wallet, completed_actions):
+        """
+        Execute the actions of a wallet following their dependencies.
+        Independent actions run concurrently, the chain actors keep the transactions of the wallet in order.
+        """
+        finished = {action_id: asyncio.Event() for action_id in graph.order}
+        results = {}
+
+        async def run(position, action_id):
+            action = graph.actions[action_id]
+            try:
+                for dependency in graph.dependencies[action_id]:
+                    await finished[dependency].wait()
+                failed_dependencies = [dependency for dependency in graph.dependencies[action_id] if not results[dependency]]
+                action_key = self.get_action_key(airdrop_info, action)
+
+                if failed_dependencies:
+                    self.logger.warning(f"Skipping action '{action['action'].replace('_', ' ')}' because it depends on failed action(s): {', '.join(failed_dependencies)}")
+                    results[action_id] = False
+                elif (wallet["public_key"].lower(), action_key) in completed_actions:
+                    results[action_id] = True
+                elif self.stop_requested:
+                    results[action_id] = False
+                else:
+                    # Keep a random delay between the actions of a wallet, only the first one starts immediately
+                    if position > 0:
+                        await self.wait_before_next_action()
+                    deposit = None
+                    if action.get("bridge") and self.bridge_watcher is not None:
+                        deposit = await self.bridge_watcher.prepare(action["bridge"], wallet["public_key"], action.get("msg_value", 0))
+                    results[action_id] = await self.execute_action(airdrop_info, action, wallet, action_key)
+                    # The dependents of a bridge need the funds on the L2, not only the L1 transaction
+                    if results[action_id] and deposit is not None:
+                        results[action_id] = await self.bridge_watcher.wait(deposit)
+            finally:
+                results.setdefault(action_id, False)
+                finished[action_id].set()
 
+        await asyncio.gather(*[run(position, action_id) for position, action_id in enumerate(graph.order)])
+        return all(results.values())
+
+    async def execute_action(self, airdrop_info, action, wallet, action_key):
+        self.logger.separator()
+        self.logger.info(f"Executing action '{action['action'].replace('_', ' ')}' for {airdrop_info['name']} airdrop")
+        # The wallet's public address and private key only live in this run's view of the shared action
+        action = action_overlay(action, wallet={"address": wallet["public_key"], "private_key": wallet["private_key"]})
+        platform = action["platform"]
+        action_succeeded = False
+        txn_hash = None
+        start_time = self.clock.monotonic()
+
+        try:
+            if platform == "twitter":
+                await TwitterHandler.perform_action(action)
+                action_succeeded = True
+            elif platform == "discord":
+                await self.discord_handler.perform_action(action)
+                action_succeeded = True
+            elif platform == "defi":
+                self.rpc_accounting.count_action(airdrop_info["name"], action["action"])
+                with tag_rpc_calls(wallet=wallet["public_key"], airdrop=airdrop_info["name"], action=action["action"]):
+                    if self.fee_window_sec and not action.get("urgent"):
+                        await self.wait_for_low_fees(action["blockchain"])
+                    chain_actor = self.chain_actor_factory(action["blockchain"])
+                    defi_handler = self.defi_handler_factory(action["blockchain"], self.logger, self.stop_requested,
+                                                             clock=self.clock, chain_actor=chain_actor,
+                                                             on_broadcast=self.on_transaction_broadcast,
+                                                             signer_cache=self.signer_cache,
+                                                             transaction_journal=self.transaction_journal)
+                    txn_hash = await chain_actor.submit(wallet["public_key"],
+                                                        lambda: defi_handler.perform_action(action))
+                if txn_hash is None:
+                    self.logger.error(f"Due to an error while executing {platform} action for {airdrop_info['name']} airdrop, skipping this action.")
+                else:
+                    self.logger.info(f"Transaction hash : {BLOCKCHAIN_SETTINGS[action['blockchain']]['explorer_url']}{txn_hash}")
+                    action_succeeded = True
+            # If any exception occurs, log it and set success to False
+        except Exception as e:
+            self.logger.error(f"An error occurred while executing action {platform} : {e}")
+            traceback.print_exc() # Uncomment this line to print the full stack trace
+        metric_blockchain = action.get("blockchain", platform)
+        ACTION_DURATION.labels(action["action"], metric_blockchain).observe(self.clock.monotonic() - start_time)
+        ACTIONS.labels(action["action"], metric_blockchain, "success" if action_succeeded else "failure").inc()
+        if action_succeeded:
+            await self.save_checkpoint(airdrop_info, wallet, action_key, txn_hash)
+        return action_succeeded
+
+    async def wait_for_low_fees(self, blockchain):
+        try:
+            fee_sampler = self.fee_sampler_factory(blockchain)
+            await asyncio.to_thread(fee_sampler.sample)
+            projection = fee_sampler.project(settings.FEE_DEFER_PERCENTILE, self.fee_window_sec)
+        except Exception as e:
+            self.logger.warning(f"Could not sample the fees on {blockchain}, sending without waiting: {e}")
+            return
+        if projection is None or projection["current"] <= projection["threshold"]:
+            return
+
+        self.logger.info(f"Base fee on {blockchain} is {projection['current']:.2f} gwei, waiting up to {self.format_seconds(self.fee_window_sec)} for it to fall below {projection['threshold']:.2f} gwei (expected delay: {self.format_seconds(projection['delay_sec'])}, expected savings: {projection['savings']:.0%})")
+        start_time = self.clock.monotonic()
+        fee = await fee_sampler.wait_for_fee(projection["threshold"], self.fee_window_sec,
+                                             stop_requested=lambda: self.stop_requested, clock=self.clock)
+        self.logger.info(f"Sending after {self.format_seconds(self.clock.monotonic() - start_time)} at {fee:.2f} gwei ({1 - fee / projection['current']:.0%} saved)")
+
+    def on_transaction_broadcast(self, wallet_address, transaction):
+        if self.sync_detector is None or self.user_id is None:
+            return
+        # Runs right after the transaction was sent: an error here must not turn it into a failed action, which
+        # would be sent again on resume (e.g. the alert can't be spawned during shutdown)
+        try:
+            self.sync_detector.record(self.user_id, wallet_address, transaction.get("to"), transaction.get("data"),
+                                      transaction.get("value", 0))
+        except Exception as e:
+            self.logger.error(f"Could not check wallet {wallet_address} for synchronized transactions: {e}")
+
+    async def wait_before_next_action(self):
+        waiting_time = random.randint(settings.MIN_WAITING_SEC, settings.MAX_WAITING_SEC)
+        self.logger.info(f"Waiting for {waiting_time} seconds before executing the next action")
+        await self.clock.sleep(waiting_time)
+
+    @staticmethod
+    def get_action_key(airdrop_info, action):
+        # The position of the action in the airdrop file identifies it, the name guards against reordered files
+        index = next(i for i, item in enumerate(airdrop_info['actions']) if item is action)
+        return f"{index}:{action['action']}"
+
+    async def get_completed_actions(self, airdrop_info):
+        if self.db_manager is None or self.user_id is None:
+            return set()
+        try:
+            return await self.db_manager.get_checkpoints(self.user_id, airdrop_info["name"])
+        except Exception as e:
+            self.logger.warning(f"Could not load the progress of {airdrop_info['name']} airdrop, starting from the beginning: {e}")
+            return set()
+
+    async def save_checkpoint(self, airdrop_info, wallet, action_key, txn_hash=None):
+        if self.db_manager is None or self.user_id is None:
+            return
+        try:
+            await self.db_manager.save_checkpoint(self.user_id, airdrop_info["name"], wallet["public_key"],
+                                                  action_key, txn_hash if isinstance(txn_hash, str) else None)
+        except Exception as e:
+            self.logger.warning(f"Could not save the progress of {airdrop_info['name']} airdrop: {e}")
+
+    async def clear_checkpoints(self, airdrop_info):
+        if self.db_manager is None or self.user_id is None:
+            return
+        try:
+            await self.db_manager.clear_checkpoints(self.user_id, airdrop_info["name"])
+        except Exception as e:
+            self.logger.warning(f"Could not reset the progress of {airdrop_info['name']} airdrop: {e}")
+
+    async def plan_airdrop_execution(self):
+        # Dry-run of the selected airdrops for all the wallets: gas, cost, duration and underfunded wallets
+        airdrops = [airdrop for airdrop in self.airdrop_info
+                    if airdrop["isActivated"] and airdrop["name"] in self.airdrops_to_execute]
+        planner = RunPlanner(airdrops, self.wallets or [], self.logger)
+        return await planner.plan()
+
+    async def check_wallet_balances(self):
+        # Compare the balances of all the wallets with what the selected airdrops will spend, in a few batched requests
+        airdrops = [airdrop for airdrop in self.airdrop_info
+                    if airdrop["isActivated"] and airdrop["name"] in self.airdrops_to_execute]
+        try:
+            self.unaffordable_airdrops = await RunPlanner(airdrops, self.wallets, self.logger).find_unaffordable_airdrops()
+        except Exception as e:
+            self.logger.warning(f"Balance pre-check failed, all the wallets will be used: {e}")
+            self.unaffordable_airdrops = {}
+
+    def get_defi_blockchains(self):
+        # Blockchains of the DeFi actions of the selected airdrops
+        return sorted({action["blockchain"] for airdrop in self.airdrop_info
+                       if airdrop["isActivated"] and airdrop["name"] in self.airdrops_to_execute
+                       for action in airdrop["actions"] if action["platform"] == "defi" and action["isActivated"]})
+
+    def reset_wallet_nonces(self):
+        # The nonce an actor kept from a previous run is ahead of the chain if one of its transactions was dropped,
+        # the first transaction of the run reads it from the chain again
+        for blockchain in self.get_defi_blockchains():
+            chain_actor = self.chain_actor_factory(blockchain)
+            for wallet in self.wallets:
+                chain_actor.reset_nonce(wallet["public_key"])
+
+    async def cancel_wallets_stuck_transactions(self):
+        # A stuck transaction blocks all the next ones of its wallet. The nonces of all the wallets are read in one
+        # batched request per blockchain, then the transactions pending for too long are replaced by cancellations
+        wallets = {wallet["public_key"]: wallet for wallet in self.wallets if wallet.get("private_key")}
+        for blockchain in self.get_defi_blockchains():
+            try:
+                stuck_wallets = await self.transaction_journal.find_stuck_transactions(blockchain, list(wallets))
+            except Exception as e:
+                self.logger.warning(f"Could not look for stuck transactions on {blockchain}: {e}")
+                continue
+            for address, stuck_transactions in stuck_wallets.items():
+                self.logger.warning(f"{len(stuck_transactions)} transaction(s) of wallet {address} stuck on {blockchain}, canceling them")
+                wallet = {"address": address, "private_key": wallets[address]["private_key"]}
+                chain_actor = self.chain_actor_factory(blockchain)
                 try:
-                    if platform == "twitter":
-                        await TwitterHandler.perform_action(action)
-                    elif platform == "discord":
-                        await self.discord_handler.perform_action(action)
-                    elif platform == "defi":
-                        defi_handler = DeFiHandler(action["blockchain"], self.logger, self.stop_requested)
-                        txn_hash = await defi_handler.perform_action(action)
-                        if txn_hash is None:
-                            message = f"ERROR - Due to an error while executing {platform} action for {airdrop_info['name']} airdrop, skipping this action."
-                            success = False  # Set success to False if an error occurs
-                        else:
-                            message = f"INFO - Transaction hash : {BLOCKCHAIN_SETTINGS[action['blockchain']]['explorer_url']}{txn_hash}"
-                    # If any exception occurs, log it and set success to False
+                    defi_handler = self.defi_handler_factory(blockchain, self.logger, self.stop_requested,
+                                                             clock=self.clock, chain_actor=chain_actor,
+                                                             signer_cache=self.signer_cache,
+                                                             transaction_journal=self.transaction_journal)
+                    await chain_actor.submit(address, lambda: defi_handler.cancel_pending_transactions(wallet, stuck_transactions))
                 except Exception as e:
-                    success = False
-                    message = f"ERROR - An error occurred while executing action {platform} : {e}"
-                    traceback.print_exc() # Uncomment this line to print the full stack trace
-                print(message)
-                self.logger.add_log(message)
-                # Wait for a random time if there are more actions to execute
-                if action != active_actions[-1]:
-                    waiting_time = random.randint(settings.MIN_WAITING_SEC, settings.MAX_WAITING_SEC)
-                    message = f"INFO - Waiting for {waiting_time} seconds before executing the next action"
-                    print(message)
-                    self.logger.add_log(message)
-                    await asyncio.sleep(waiting_time)
-
-        return success
+                    self.logger.error(f"Could not cancel the stuck transactions of wallet {address} on {blockchain}: {e}")
 
     async def prepare_defi_transactions(self, user_id, db_manager, airdrop_names, public_key):
-        self.logger.add_log("INFO - Preparing DeFi transactions")
-        prepared_txns = []
+        self.logger.info("Preparing DeFi transactions")
 
+        actions = []
         for airdrop_name in airdrop_names:
             airdrop = next((item for item in self.airdrop_info if item["name"] == airdrop_name), None)
             if airdrop is None:
-                self.logger.add_log(f"ERROR - Airdrop {airdrop_name} not found")
+                self.logger.error(f"Airdrop {airdrop_name} not found")
                 continue
 
             if airdrop['isActivated']:
-                actions = airdrop['actions']
-                for action in actions:
+                for action in airdrop['actions']:
                     if action['platform'] == 'defi' and action['isActivated']:
-                        defi_handler = DeFiHandler(action["blockchain"], self.logger, self.stop_requested)
-                        prepared_tx = await defi_handler.prepare_transaction(action, public_key)
-                        prepared_txns.append(prepared_tx)
+                        actions.append((airdrop_name, action))
+
+        # Connect once to each blockchain, the handlers are shared by the preparations of that blockchain
+        blockchains = sorted({action["blockchain"] for _, action in actions})
+        handlers = await asyncio.gather(*[asyncio.to_thread(self.defi_handler_factory, blockchain, self.logger, self.stop_requested)
+                                          for blockchain in blockchains])
+        defi_handlers = dict(zip(blockchains, handlers))
+
+        # Web3 calls are blocking, the preparations run in threads with a limit per blockchain
+        semaphores = {blockchain: asyncio.Semaphore(settings.MAX_CONCURRENT_PREPARATIONS_PER_CHAIN)
+                      for blockchain in blockchains}
+
+        async def prepare(action):
+            async with semaphores[action["blockchain"]]:
+                return await asyncio.to_thread(self.prepare_defi_transaction, defi_handlers[action["blockchain"]],
+                                               action, public_key)
+
+        results = await asyncio.gather(*[prepare(action) for _, action in actions], return_exceptions=True)
+
+        prepared_txns = []
+        prepared_metadata = []  # Airdrop, action and blockchain of each prepared transaction, in the same order
+        errors = []
+        for (airdrop_name, action), result in zip(actions, results):
+            if isinstance(result, Exception):
+                errors.append(result)
+                self.logger.error(f"Could not prepare action '{action['action']}' for {airdrop_name} airdrop: {result}")
+            elif result is None:
+                self.logger.error(f"Could not prepare action '{action['action']}' for {airdrop_name} airdrop")
+            else:
+                prepared_txns.append(result)
+                prepared_metadata.append({
+                    "airdrop": airdrop_name,
+                    "action": action["action"],
+                    "blockchain": action["blockchain"],
+                })
+
+        # Nothing could be prepared, let the caller report the reason (e.g. an invalid public key)
+        if errors and not prepared_txns:
+            raise errors[0]
 
-        txn_key = await db_manager.insert_prepared_transaction(user_id, prepared_tx)
+        self.logger.info(f"Prepared {len(prepared_txns)} transaction(s) out of {len(actions)} action(s)")
+        txn_key = await db_manager.insert_prepared_transaction(user_id, prepared_txns, prepared_metadata)
 
         return txn_key
 
+    @staticmethod
+    def prepare_defi_transaction(defi_handler, action, public_key):
+        # Runs in a worker thread, the preparation writes the wallet into an overlay of the shared action
+        return asyncio.run(defi_handler.prepare_transaction(action_overlay(action), public_key))
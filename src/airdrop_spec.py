@@ -0,0 +1,75 @@
+# airdrop_spec.py
+import importlib.util
+import logging
+import os
+import threading
+from collections import ChainMap
+from collections.abc import Mapping
+from types import MappingProxyType
+
+AIRDROPS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "airdrops"))
+
+
+def freeze(obj):
+    """Return a read-only copy of obj: mappings become mappingproxy objects and lists become tuples."""
+    if isinstance(obj, Mapping):
+        return MappingProxyType({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(value) for value in obj)
+    return obj
+
+
+def thaw(obj):
+    """Return a plain copy of a frozen value: mappings become dicts and tuples become lists, e.g. to serialize it."""
+    if isinstance(obj, Mapping):
+        return {key: thaw(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(value) for value in obj]
+    return obj
+
+
+def action_overlay(action, **values):
+    """
+    Per-run view of a shared action spec.
+    Reads fall through to the spec, writes (wallet, user parameters, runtime state) stay in the overlay.
+    """
+    return ChainMap(values, action)
+
+
+class AirdropRegistry:
+    """Airdrop specs loaded once from the airdrops folder and shared, read-only, by every run."""
+
+    _airdrops = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, logger=None):
+        if cls._airdrops is None:
+            with cls._lock:
+                if cls._airdrops is None:
+                    cls._airdrops = cls.load(logger)
+        return cls._airdrops
+
+    @classmethod
+    def reload(cls, logger=None):
+        with cls._lock:
+            cls._airdrops = cls.load(logger)
+        return cls._airdrops
+
+    @staticmethod
+    def load(logger=None):
+        airdrop_files = sorted(f for f in os.listdir(AIRDROPS_PATH) if f.endswith(".py"))
+
+        airdrop_list = []
+        for airdrop_file in airdrop_files:
+            try:
+                file_path = os.path.join(AIRDROPS_PATH, airdrop_file)
+                spec = importlib.util.spec_from_file_location(airdrop_file[:-3], file_path)
+                airdrop_module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(airdrop_module)
+                airdrop_list.append(freeze(airdrop_module.airdrop_info))
+            except Exception as e:
+                if logger is not None:
+                    logger.add_log(f"ERROR - Error loading {airdrop_file}: {e}", logging.ERROR)
+
+        return tuple(airdrop_list)
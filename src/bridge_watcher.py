@@ -0,0 +1,103 @@
+# bridge_watcher.py
+import asyncio
+from collections import defaultdict
+import config.settings as settings
+from src.clock import Clock
+from src.rpc_batch import RPCBatch, to_int
+
+
+class BridgeWatcher:
+    """
+    Background tracking of L1 -> L2 deposits.
+
+    The L2 balance of a wallet is read before its deposit is sent, then a single polling task reads the balances of
+    all the pending deposits with one batched request per L2 every BRIDGE_POLL_INTERVAL_SEC. A deposit has arrived
+    when the balance went up by the bridged amount; its future then resolves to True, or to False after
+    BRIDGE_TIMEOUT_SEC. The run is free to work on other wallets in the meantime.
+    """
+
+    _instances = {}  # {clock: watcher}, None for the wall clock
+
+    def __init__(self, poll_interval_sec=None, timeout_sec=None, clock=None):
+        self.poll_interval_sec = poll_interval_sec or settings.BRIDGE_POLL_INTERVAL_SEC
+        self.timeout_sec = timeout_sec or settings.BRIDGE_TIMEOUT_SEC
+        self.clock = clock or Clock()
+        self.pending = []  # Deposits waiting for their funds
+        self.poller = None
+
+    @classmethod
+    def get_shared(cls, clock=None):
+        """
+        Return the watcher shared by all the runs of the process on the same clock, so that their deposits are
+        polled together. The runs on the wall clock pass None, a simulation passes its virtual clock.
+        """
+        if clock not in cls._instances:
+            cls._instances[clock] = cls(clock=clock)
+        return cls._instances[clock]
+
+    async def prepare(self, bridge, wallet_address, amount):
+        """Read the L2 balance before the deposit is sent, return the deposit to watch once it has been sent."""
+        blockchain = bridge["to_blockchain"]
+        balances = await self.get_balances([(blockchain, wallet_address)])
+        return {
+            "blockchain": blockchain,
+            "address": wallet_address,
+            # The bridged amount may differ slightly from the sent one (fees paid on the L2 side)
+            "expected": int(int(bridge.get("amount", amount)) * (1 - settings.BRIDGE_AMOUNT_TOLERANCE)),
+            "baseline": balances[0],
+        }
+
+    def watch(self, deposit, on_arrival=None):
+        """Start watching a sent deposit, return a future resolving to whether the funds arrived."""
+        future = asyncio.get_running_loop().create_future()
+        if on_arrival is not None:
+            future.add_done_callback(lambda done: on_arrival(deposit) if not done.cancelled() and done.result() else None)
+        if deposit["baseline"] is None:
+            # Without the balance before the deposit there is nothing to compare to
+            future.set_result(False)
+            return future
+        deposit = dict(deposit, future=future, deadline=self.clock.monotonic() + self.timeout_sec)
+        self.pending.append(deposit)
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.create_task(self.poll())
+        return future
+
+    async def wait(self, deposit):
+        return await self.watch(deposit)
+
+    async def poll(self):
+        while self.pending:
+            await self.clock.sleep(self.poll_interval_sec)
+            self.pending = [deposit for deposit in self.pending if not deposit["future"].done()]
+            if not self.pending:
+                return
+            deposits = list(self.pending)
+            balances = await self.get_balances([(deposit["blockchain"], deposit["address"]) for deposit in deposits])
+            now = self.clock.monotonic()
+            for deposit, balance in zip(deposits, balances):
+                if balance is not None and balance - deposit["baseline"] >= deposit["expected"]:
+                    deposit["future"].set_result(True)
+                elif now >= deposit["deadline"]:
+                    deposit["future"].set_result(False)
+            self.pending = [deposit for deposit in self.pending if not deposit["future"].done()]
+
+    async def get_balances(self, wallets):
+        """Balances of (blockchain, address) pairs, None when they couldn't be read. One batched request per blockchain."""
+        indexes = defaultdict(list)
+        for position, (blockchain, address) in enumerate(wallets):
+            indexes[blockchain].append(position)
+        balances = [None] * len(wallets)
+
+        async def read_blockchain(blockchain, positions):
+            batch = RPCBatch(blockchain)
+            for position in positions:
+                batch.add("eth_getBalance", [wallets[position][1], "latest"])
+            try:
+                results = await batch.execute()
+            except Exception:
+                return
+            for position, result in zip(positions, results):
+                balances[position] = to_int(result)
+
+        await asyncio.gather(*[read_blockchain(blockchain, positions) for blockchain, positions in indexes.items()])
+        return balances
@@ -0,0 +1,110 @@
+# chain_actor.py
+import asyncio
+import contextvars
+import time
+from web3 import Web3
+import config.settings as settings
+from src.fee_builder import estimate_fees
+from src.rpc_cassette import create_web3
+
+
+class ChainActor:
+    """
+    Long-lived owner of a blockchain: the connection, the nonce of each wallet and the fee oracle.
+
+    Action requests are queued per wallet: the requests of a wallet run strictly one after the other so
+    its transactions never race on a nonce, while the requests of different wallets are interleaved freely.
+    web3 is synchronous, so DeFiHandler makes the JSON-RPC round trips of the actions in worker threads: the
+    requests of different wallets overlap on them and not only on their waits.
+    """
+
+    _actors = {}
+
+    def __init__(self, blockchain, web3=None):
+        if blockchain not in settings.BLOCKCHAIN_SETTINGS:
+            raise ValueError(f"Settings for blockchain '{blockchain}' not found.")
+        self.blockchain = blockchain
+        self._web3 = web3
+        self.nonces = {}  # Next nonce to use for each wallet
+        self.wallet_queues = {}
+        self.workers = {}
+        self.fee_estimate = None
+        self.fee_estimate_time = 0
+
+    @classmethod
+    def get(cls, blockchain):
+        """Return the actor of a blockchain, shared by all the runs of the process."""
+        if blockchain not in cls._actors:
+            cls._actors[blockchain] = cls(blockchain)
+        return cls._actors[blockchain]
+
+    @property
+    def web3(self):
+        # Connect on first use
+        if self._web3 is None:
+            self._web3 = create_web3(self.blockchain)
+        return self._web3
+
+    async def submit(self, wallet_address, request):
+        """Run request (a coroutine function) after the pending requests of the wallet and return its result."""
+        address = wallet_address.lower()
+        future = asyncio.get_running_loop().create_future()
+        # The request runs in the context of its caller, e.g. with the tags of its JSON-RPC calls
+        self.wallet_queues.setdefault(address, asyncio.Queue()).put_nowait((request, future, contextvars.copy_context()))
+        if address not in self.workers:
+            self.workers[address] = asyncio.create_task(self.run_wallet(address))
+        return await future
+
+    async def run_wallet(self, address):
+        queue = self.wallet_queues[address]
+        try:
+            # The worker stops when the queue is empty, a new request starts a new worker
+            while not queue.empty():
+                request, future, context = queue.get_nowait()
+                if future.done():
+                    continue
+                try:
+                    result = await asyncio.create_task(request(), context=context)
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            while not queue.empty():
+                _, future, _ = queue.get_nowait()
+                future.cancel()
+            del self.workers[address]
+            del self.wallet_queues[address]
+
+    def peek_nonce(self, address):
+        """Next nonce of the wallet as far as the actor knows, read from the chain the first time."""
+        key = address.lower()
+        if key not in self.nonces:
+            self.nonces[key] = self.get_pending_nonce(address)
+        return self.nonces[key]
+
+    def reserve_nonce(self, address):
+        # Resynced with the chain for every transaction: the transactions sent outside the bot and the replacements
+        # move the pending count past the nonce the actor knows, the actor's nonce covers a lagging node
+        key = address.lower()
+        nonce = max(self.nonces.get(key, 0), self.get_pending_nonce(address))
+        self.nonces[key] = nonce + 1
+        return nonce
+
+    def reset_nonce(self, address):
+        # The next transaction reads the nonce from the chain again, e.g. after a transaction was rejected or dropped
+        self.nonces.pop(address.lower(), None)
+
+    def get_pending_nonce(self, address):
+        return self.web3.eth.get_transaction_count(Web3.to_checksum_address(address), "pending")
+
+    def get_fee_estimate(self):
+        if self.fee_estimate is None or time.monotonic() - self.fee_estimate_time > settings.GAS_ORACLE_TTL_SEC:
+            self.fee_estimate = estimate_fees(self.web3)
+            self.fee_estimate_time = time.monotonic()
+        return self.fee_estimate
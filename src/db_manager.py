@@ -6,7 +6,9 @@ from config import settings
 from datetime import datetime, timedelta, timezone
 from src.user import User
 import asyncio
+import time
 import uuid
+from src.metrics import DB_QUERY_LATENCY, sql_operation
 
 class DBManager:
     def __init__(self, logger):
@@ -35,9 +37,12 @@ class DBManager:
                 twitter_credentials JSONB,
                 discord_credentials JSONB,
                 session_logs JSONB,
-                referral_code VARCHAR(255)
+                referral_code VARCHAR(255),
+                preferences JSONB
             );
         ''')
+        # Column added after the first release
+        await self.execute_query("ALTER TABLE users ADD COLUMN IF NOT EXISTS preferences JSONB;")
         await self.execute_query('''
                 CREATE TABLE IF NOT EXISTS transactions (
                     id SERIAL PRIMARY KEY,
@@ -64,17 +69,40 @@ class DBManager:
                         user_id INTEGER REFERENCES users (telegram_id) ON DELETE CASCADE,
                         amount FLOAT NOT NULL,
                         claimed BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                        payout_address VARCHAR(42),
+                        payout_txn_hash VARCHAR(66),
+                        paid_at TIMESTAMP WITH TIME ZONE
                     );
                 ''')
+        # Columns added with the batched reward payouts
+        await self.execute_query('''
+            ALTER TABLE rewards ADD COLUMN IF NOT EXISTS payout_address VARCHAR(42),
+                                ADD COLUMN IF NOT EXISTS payout_txn_hash VARCHAR(66),
+                                ADD COLUMN IF NOT EXISTS paid_at TIMESTAMP WITH TIME ZONE;
+        ''')
         await self.execute_query('''
             CREATE TABLE IF NOT EXISTS prepared_transactions (
                 id SERIAL PRIMARY KEY,
                 user_id INTEGER REFERENCES users (telegram_id) ON DELETE CASCADE,
                 transaction_data JSONB,
+                transaction_metadata JSONB,
                 unique_key VARCHAR(255) UNIQUE NOT NULL,
                 created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
             );
+            ALTER TABLE prepared_transactions ADD COLUMN IF NOT EXISTS transaction_metadata JSONB;
+        ''')
+        await self.execute_query('''
+            CREATE TABLE IF NOT EXISTS execution_checkpoints (
+                id SERIAL PRIMARY KEY,
+                user_id BIGINT REFERENCES users (telegram_id) ON DELETE CASCADE,
+                airdrop_name VARCHAR(255) NOT NULL,
+                wallet_address VARCHAR(42) NOT NULL,
+                action_key VARCHAR(255) NOT NULL,
+                txn_hash VARCHAR(66),
+                completed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (user_id, airdrop_name, wallet_address, action_key)
+            );
         ''')
 
     async def get_all_users(self):
@@ -91,6 +119,7 @@ class DBManager:
 
         for i in range(retries):
             async with self.pool.acquire() as connection:
+                start_time = time.perf_counter()
                 try:
                     result = await query_fn(connection, query, *args, **kwargs)
                     return result
@@ -107,6 +136,8 @@ class DBManager:
                     # Handle other exceptions as appropriate
                     self.sys_logger.add_log(f"An error occurred while executing query in the database: {e}")
                     raise e
+                finally:
+                    DB_QUERY_LATENCY.labels(sql_operation(query)).observe(time.perf_counter() - start_time)
 
     async def execute_query(self, query, *args, **kwargs):
         """Execute a single query."""
@@ -249,16 +280,17 @@ class DBManager:
             WHERE telegram_id=$1
         ''', telegram_id)
 
-    async def insert_prepared_transaction(self, user_id, transaction_data):
+    async def insert_prepared_transaction(self, user_id, transaction_data, transaction_metadata=None):
         unique_key = str(uuid.uuid4())
 
-        # Convert transaction_data to string
+        # Convert transaction_data to string, the metadata is kept apart so the approval page reads the raw transactions
         transaction_data_str = json.dumps(transaction_data)
+        transaction_metadata_str = json.dumps(transaction_metadata) if transaction_metadata is not None else None
 
         await self.execute_query('''
-            INSERT INTO prepared_transactions (user_id, transaction_data, unique_key)
-            VALUES ($1, $2, $3)
-        ''', user_id, transaction_data_str, unique_key)
+            INSERT INTO prepared_transactions (user_id, transaction_data, transaction_metadata, unique_key)
+            VALUES ($1, $2, $3, $4)
+        ''', user_id, transaction_data_str, transaction_metadata_str, unique_key)
 
         self.sys_logger.add_log(
             f"Successfully inserted prepared transaction for user {user_id} with unique_key {unique_key}")
@@ -275,4 +307,63 @@ class DBManager:
             return transaction_data
         else:
             self.sys_logger.add_log(f"No transaction found with unique_key {unique_key}")
-            return None
\ No newline at end of file
+            return None
+
+    async def save_checkpoint(self, user_id, airdrop_name, wallet_address, action_key, txn_hash=None):
+        """Record that an action has been completed for a wallet."""
+        await self.execute_query('''
+            INSERT INTO execution_checkpoints (user_id, airdrop_name, wallet_address, action_key, txn_hash)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (user_id, airdrop_name, wallet_address, action_key)
+            DO UPDATE SET txn_hash = EXCLUDED.txn_hash, completed_at = CURRENT_TIMESTAMP
+        ''', user_id, airdrop_name, wallet_address.lower(), action_key, txn_hash)
+
+    async def get_checkpoints(self, user_id, airdrop_name):
+        """Return the (wallet_address, action_key) pairs already completed for an airdrop."""
+        records = await self.fetch_query('''
+            SELECT wallet_address, action_key FROM execution_checkpoints
+            WHERE user_id = $1 AND airdrop_name = $2
+        ''', user_id, airdrop_name)
+        return {(record['wallet_address'], record['action_key']) for record in records}
+
+    async def clear_checkpoints(self, user_id, airdrop_name):
+        """Forget the progress of an airdrop once it has been fully executed."""
+        await self.execute_query('''
+            DELETE FROM execution_checkpoints
+            WHERE user_id = $1 AND airdrop_name = $2
+        ''', user_id, airdrop_name)
+
+    async def get_unpaid_rewards(self):
+        """Claimed rewards without a payout transaction, summed by payout address, the oldest claims first."""
+        return await self.fetch_query('''
+            SELECT payout_address, array_agg(reward_id) AS reward_ids, SUM(amount) AS amount FROM rewards
+            WHERE claimed = TRUE AND payout_address IS NOT NULL AND payout_txn_hash IS NULL
+            GROUP BY payout_address
+            ORDER BY MIN(created_at)
+        ''')
+
+    async def get_sent_reward_payouts(self):
+        """Hashes of the payout transactions sent but not confirmed yet."""
+        records = await self.fetch_query('''
+            SELECT DISTINCT payout_txn_hash FROM rewards WHERE payout_txn_hash IS NOT NULL AND paid_at IS NULL
+        ''')
+        return [record['payout_txn_hash'] for record in records]
+
+    async def set_reward_payouts(self, reward_ids, txn_hashes):
+        """Record the payout transaction of each reward in a single update."""
+        await self.execute_query('''
+            UPDATE rewards SET payout_txn_hash = payouts.txn_hash
+            FROM unnest($1::int[], $2::varchar[]) AS payouts (reward_id, txn_hash)
+            WHERE rewards.reward_id = payouts.reward_id
+        ''', reward_ids, txn_hashes)
+
+    async def confirm_reward_payout(self, txn_hash):
+        await self.execute_query('''
+            UPDATE rewards SET paid_at = CURRENT_TIMESTAMP WHERE payout_txn_hash = $1 AND paid_at IS NULL
+        ''', txn_hash)
+
+    async def cancel_reward_payout(self, txn_hash):
+        """Make the rewards of a failed payout transaction payable again."""
+        await self.execute_query('''
+            UPDATE rewards SET payout_txn_hash = NULL WHERE payout_txn_hash = $1 AND paid_at IS NULL
+        ''', txn_hash)
@@ -2,26 +2,46 @@
 import asyncio
 import datetime
 from statistics import median
-from src.utils.file_utils import load_json
 from web3.exceptions import TransactionNotFound
 from web3 import Web3
 import json
 import time
+from collections.abc import Mapping
 import os
 import config.settings as settings
-from eth_account.messages import encode_structured_data
+from src.airdrop_spec import thaw
+from src.clock import Clock
+from src.eip712_templates import EIP712Templates
+from src.gas_estimate_cache import GasEstimateCache
+from src.signer_cache import SignerCache
+from src.transaction_journal import TransactionJournal
+from src.fee_builder import build_fee_fields, build_replacement_fee_fields, estimate_fees
+from src.metrics import observe_receipt
+from src.quote_router import QuoteRouter
+from src.rpc_cassette import create_web3
+from src.logger import Lazy
 from decimal import Decimal
 from eth_abi import encode
 import httpx
 
 
-# TODO: Implement feature to automatically vary activities across user wallets (e.g., token bridging on one, token swapping on another).
-# TODO: Detect and alert users if they're synchronizing actions across multiple wallets (like simultaneous withdrawals or identical transactions).
 # TODO: Wallet generation
 class DeFiHandler:
-    def __init__(self, blockchain, logger, stop_requested):
+    def __init__(self, blockchain, logger, stop_requested, clock=None, chain_actor=None, on_broadcast=None,
+                 signer_cache=None, transaction_journal=None):
         self.logger = logger
         self.stop_requested = stop_requested
+        self.clock = clock or Clock()
+        # When set, the connection, nonces and gas price of the blockchain come from its long-lived actor
+        self.chain_actor = chain_actor
+        # Called with (wallet address, transaction) for every transaction sent, e.g. to detect synchronized wallets
+        self.on_broadcast = on_broadcast
+        self.gas_estimate_cache = GasEstimateCache.get_shared()
+        # Sent transactions by nonce, to find and replace the stuck ones, given by the run so that it uses its clock
+        self.transaction_journal = transaction_journal if transaction_journal is not None \
+            else TransactionJournal.get_shared()
+        # Parsed keys of the wallets, shared by the handlers of a run and cleared at its end
+        self.signer_cache = signer_cache if signer_cache is not None else SignerCache()
         self.web3 = self.connect_to_blockchain(blockchain)
 
     def connect_to_blockchain(self, blockchain):
@@ -31,36 +51,37 @@ class DeFiHandler:
             raise ValueError(f"Settings for blockchain '{blockchain}' not found.")
             return None
 
-        endpoint = blockchain_settings['endpoint']
-        web3 = Web3(Web3.HTTPProvider(endpoint))
-
         self.blockchain=blockchain
-        self.wrapped_native_token_address = web3.to_checksum_address(blockchain_settings['weth_address'])
+        self.wrapped_native_token_address = Web3.to_checksum_address(blockchain_settings['weth_address'])
         self.wrapped_native_token_abi = self.get_token_abi(blockchain_settings['weth_abi'])
         self.token_abi = self.get_token_abi(blockchain_settings['token_abi'])
 
+        if self.chain_actor is not None:
+            return self.chain_actor.web3
+
+        web3 = create_web3(blockchain)
+
         if web3.is_connected():
-            message = "------------------------\n"
-            message += f"INFO - Connected to {blockchain} blockchain."
-            print(message)
-            self.logger.add_log(message)
+            self.logger.separator()
+            self.logger.info(f"Connected to {blockchain} blockchain.")
         else:
-            message = f"ERROR - Could not connect to {blockchain} blockchain."
-            print(message)
-            self.logger.add_log(message)
+            self.logger.error(f"Could not connect to {blockchain} blockchain.")
             return None
         return web3
 
     async def perform_action(self, action):
         # Print the wallet balance before start
-        message = f"INFO - Wallet: {action['wallet']['address']}\nINFO - Native token Balance: {self.web3.from_wei(self.get_token_balance(action['wallet'], native=True), 'ether')}\n------------------------"
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info(f"Wallet: {action['wallet']['address']}")
+        self.logger.info("Native token Balance: %s", Lazy(
+            lambda: self.web3.from_wei(self.get_token_balance(action['wallet'], native=True), 'ether')))
+        self.logger.separator()
 
-        # self.logger.add_log(f"INFO - Performing action: {action['description']}")
+        # self.logger.info(f"Performing action: {action['description']}")
 
         # Replace placeholder with actual wallet address in action
-        self.replace_placeholder_with_value(action, "<WALLET_ADDRESS>", action["wallet"]["address"])
+        action = self.replace_placeholder_with_value(action, "<WALLET_ADDRESS>", action["wallet"]["address"])
+        # The shared spec is frozen, web3, httpx and json.dumps get plain dicts and lists
+        action = thaw(action)
 
         if action["action"] == "interact_with_contract":
             # Convert address type arguments to checksum address
@@ -95,7 +116,8 @@ class DeFiHandler:
                 exchange_address=self.web3.to_checksum_address(action["exchange_address"].strip('"')),
                 exchange_abi=action["exchange_abi"],
                 deadline_minutes=action["deadline_minutes"],
-                blockchain=action["blockchain"]
+                blockchain=action["blockchain"],
+                best_route=action.get("best_route", False),
             )
         elif action["action"] == "swap_tokens":
             return await self.swap_tokens(
@@ -107,6 +129,7 @@ class DeFiHandler:
                 exchange_address=self.web3.to_checksum_address(action["exchange_address"].strip('"')),
                 exchange_abi=action["exchange_abi"],
                 deadline_minutes=action["deadline_minutes"],
+                best_route=action.get("best_route", False),
             )
 
         elif action["action"] == "swap_tokens_with_steps":
@@ -166,26 +189,18 @@ class DeFiHandler:
             )
 
     def replace_placeholder_with_value(self, obj, placeholder, value):
-        if isinstance(obj, dict):
-            for k, v in obj.items():
-                if isinstance(v, (dict, list, tuple)):
-                    obj[k] = self.replace_placeholder_with_value(v, placeholder, value)
-                elif v == placeholder:
-                    obj[k] = self.replace_value_with_appropriate_format(value)
-        elif isinstance(obj, list):
-            for i in range(len(obj)):
-                if isinstance(obj[i], (dict, list, tuple)):
-                    obj[i] = self.replace_placeholder_with_value(obj[i], placeholder, value)
-                elif obj[i] == placeholder:
-                    obj[i] = self.replace_value_with_appropriate_format(value)
-        elif isinstance(obj, tuple):
-            obj = list(obj)
-            for i in range(len(obj)):
-                if isinstance(obj[i], (dict, list, tuple)):
-                    obj[i] = self.replace_placeholder_with_value(obj[i], placeholder, value)
-                elif obj[i] == placeholder:
-                    obj[i] = self.replace_value_with_appropriate_format(value)
-            obj = tuple(obj)
+        # Copy-on-write: only the containers holding the placeholder are copied, the rest (e.g. ABIs) is shared
+        # with the airdrop spec, which is read-only
+        if isinstance(obj, Mapping):
+            replaced = {k: self.replace_placeholder_with_value(v, placeholder, value) for k, v in obj.items()}
+            if any(replaced[k] is not v for k, v in obj.items()):
+                return replaced
+        elif isinstance(obj, (list, tuple)):
+            replaced = [self.replace_placeholder_with_value(v, placeholder, value) for v in obj]
+            if any(new is not old for new, old in zip(replaced, obj)):
+                return type(obj)(replaced)
+        elif isinstance(obj, str) and obj == placeholder:
+            return self.replace_value_with_appropriate_format(value)
         return obj
 
     def replace_value_with_appropriate_format(self, value):
@@ -197,42 +212,61 @@ class DeFiHandler:
         else:
             return value
 
-    def cancel_pending_transactions(self, wallet):
-        nonce = self.web3.eth.get_transaction_count(wallet["address"], 'pending')
-
-        # Fetch recommended gas price
-        gas_price = self.gas_price_strategy()
-
-        message = f"INFO - Canceling pending transactions for {wallet['address']} with nonce {nonce} and gas price {gas_price}"
-        print(message)
-        self.logger.add_log(message)
+    async def cancel_pending_transactions(self, wallet, stuck_transactions=None):
+        """
+        Replace the stuck transactions of a wallet with empty transfers to itself, one per nonce
+        :param wallet: The wallet whose transactions are stuck
+        :param stuck_transactions: The stuck transactions of the wallet found by TransactionJournal, read if None
+        :return: The hashes of the cancellations, or the transactions to sign if the wallet has no private key
+        """
+        if stuck_transactions is None:
+            stuck_transactions = await self.get_pending_transactions(wallet["address"])
+        if not stuck_transactions:
+            return []
 
-        transaction = {
+        fee_estimate = self.get_fee_estimate()
+        gas_limit = int(self.web3.eth.estimate_gas({
             'from': wallet["address"],
             'to': wallet["address"],
             'value': 0,
-            'gas': int(self.web3.eth.estimate_gas({
+        }) * 2)
+        chain_id = self.web3.eth.chain_id
+        results = []
+        for stuck_transaction in stuck_transactions:
+            nonce = stuck_transaction["nonce"]
+            if stuck_transaction["transaction"] is not None:
+                # The replacement must pay more than the original transaction, whatever its type
+                fee_fields = build_replacement_fee_fields(fee_estimate, stuck_transaction["transaction"], self.blockchain)
+            else:
+                # Outbid a transaction we didn't send
+                fee_fields = build_fee_fields(fee_estimate, self.blockchain, bump=settings.GAS_PRICE_INCREASE,
+                                              capped=False)
+
+            self.logger.info(f"Canceling pending transaction of {wallet['address']} with nonce {nonce} and fees {fee_fields}")
+
+            transaction = {
                 'from': wallet["address"],
                 'to': wallet["address"],
                 'value': 0,
-            }) * 2),
-            'gasPrice': gas_price,
-            'nonce': nonce,
-            'chainId': self.web3.eth.chain_id
-        }
+                'gas': gas_limit,
+                **fee_fields,
+                'nonce': nonce,
+                'chainId': chain_id
+            }
 
-        if wallet["private_key"] is None:
-            return transaction
+            if wallet["private_key"] is None:
+                results.append(transaction)
+                continue
 
-        signed_txn = self.web3.eth.account.sign_transaction(transaction, wallet["private_key"])
-        txn_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
-        txn_hash_hex = self.web3.to_hex(txn_hash)
+            signed_txn = self.signer_cache.sign_transaction(wallet, transaction)
+            txn_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            txn_hash_hex = self.web3.to_hex(txn_hash)
+            self.transaction_journal.record(self.blockchain, wallet["address"], transaction, txn_hash_hex)
 
-        message = f"INFO - Pending transactions canceled for {wallet['address']} with nonce {nonce} and gas price {gas_price} with hash {txn_hash_hex}"
-        print(message)
-        self.logger.add_log(message)
+            self.logger.info(f"Pending transaction canceled for {wallet['address']} with nonce {nonce} and fees {fee_fields} with hash {txn_hash_hex}")
+            results.append(txn_hash_hex)
 
-        return txn_hash_hex
+        return results
 
     def get_token_abi(self, filename):
         # Get the current file's directory
@@ -246,23 +280,20 @@ class DeFiHandler:
             with open(token_abi_path, 'r') as f:
                 token_abi = json.load(f)
         except Exception as e:
-            message = f"ERROR - Failed to read {token_abi_path} file"
-            print(message)
-            self.logger.add_log(message)
+            self.logger.error(f"Failed to read {token_abi_path} file")
             raise e
         return token_abi
 
     def convert_to_checksum_address_recursive(self, item):
-        if isinstance(item, dict):
-            for key, value in item.items():
-                if isinstance(value, (dict, list, tuple, str)):
-                    item[key] = self.convert_to_checksum_address_recursive(value)
-        elif isinstance(item, list):
-            for i, value in enumerate(item):
-                item[i] = self.convert_to_checksum_address_recursive(value)
-        elif isinstance(item, tuple):
-            # Convert tuple to list, process it, then convert it back to tuple
-            item = tuple(self.convert_to_checksum_address_recursive(list(item)))
+        # Returns a new structure when an address is converted, the arguments of the airdrop spec are read-only
+        if isinstance(item, Mapping):
+            converted = {key: self.convert_to_checksum_address_recursive(value) for key, value in item.items()}
+            if any(converted[key] is not value for key, value in item.items()):
+                return converted
+        elif isinstance(item, (list, tuple)):
+            converted = [self.convert_to_checksum_address_recursive(value) for value in item]
+            if any(new is not old for new, old in zip(converted, item)):
+                return type(item)(converted)
         elif isinstance(item, str):
             if len(item) == 42 and item[:2] == "0x" and self.web3.is_address(item):
                 return self.web3.to_checksum_address(item.strip('"'))
@@ -271,15 +302,64 @@ class DeFiHandler:
     def convert_args_to_checksum_address(self, args):
         return self.convert_to_checksum_address_recursive(args)
 
-    def gas_price_strategy(self):
-        return int(
-            self.web3.eth.gas_price * settings.GAS_PRICE_INCREASE)  # Increase the gas price by 20% to prioritize the transaction
+    def get_nonce(self, wallet):
+        if self.chain_actor is not None and wallet["private_key"] is not None:
+            return self.chain_actor.peek_nonce(wallet["address"])
+        return self.web3.eth.get_transaction_count(wallet["address"])
+
+    def get_fee_estimate(self):
+        if self.chain_actor is not None:
+            return self.chain_actor.get_fee_estimate()
+        return estimate_fees(self.web3)
+
+    def get_fee_fields(self, bump=1.0, capped=True):
+        # Type-2 fees from the next base fee and the recent priority fees, gasPrice on chains without EIP-1559
+        return build_fee_fields(self.get_fee_estimate(), self.blockchain, bump=bump, capped=capped)
+
+    async def sign_and_send_transaction(self, wallet, transaction):
+        # Reading the nonce and broadcasting block on the sync HTTP provider: they run in a worker thread (with the
+        # JSON-RPC tags of the caller) so that the other wallets of the chain go on meanwhile. The broadcast is
+        # recorded back on the event loop, where the callback may start tasks
+        txn_hash = await asyncio.to_thread(lambda: self.broadcast(wallet, self.sign_transaction(wallet, transaction)))
+        self.record_broadcast(wallet, transaction, txn_hash)
+        return txn_hash
+
+    def sign_transaction(self, wallet, transaction):
+        # The nonce is only consumed when the transaction is actually sent, a rejected transaction gives it back
+        if self.chain_actor is not None:
+            transaction["nonce"] = self.chain_actor.reserve_nonce(wallet["address"])
+        try:
+            return self.signer_cache.sign_transaction(wallet, transaction)
+        except Exception:
+            self.release_nonce(wallet)
+            raise
+
+    def release_nonce(self, wallet):
+        # Nonce reserved by sign_transaction for a transaction that won't be sent
+        if self.chain_actor is not None:
+            self.chain_actor.reset_nonce(wallet["address"])
+
+    def send_signed_transaction(self, wallet, transaction, signed_txn):
+        txn_hash = self.broadcast(wallet, signed_txn)
+        self.record_broadcast(wallet, transaction, txn_hash)
+        return txn_hash
+
+    def broadcast(self, wallet, signed_txn):
+        try:
+            return self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+        except Exception:
+            self.release_nonce(wallet)
+            raise
+
+    def record_broadcast(self, wallet, transaction, txn_hash):
+        self.transaction_journal.record(self.blockchain, wallet["address"], transaction, txn_hash)
+        if self.on_broadcast is not None:
+            self.on_broadcast(wallet["address"], transaction)
 
     def check_wallet_balance(self, wallet):
-        message = f"INFO - Wallet {wallet['address']} balance: {self.web3.from_wei(self.web3.eth.get_balance(wallet['address']), 'ether')} ETH"
-        print(message)
-        self.logger.add_log(message)
-        return self.web3.eth.get_balance(wallet["address"])
+        balance = self.web3.eth.get_balance(wallet["address"])
+        self.logger.info("Wallet %s balance: %s ETH", wallet['address'], self.web3.from_wei(balance, 'ether'))
+        return balance
 
     def get_token_name(self, token_address):
         # Create contract object
@@ -290,112 +370,108 @@ class DeFiHandler:
             token_name = token_contract.functions.name().call()
             return token_name
         except Exception as e:
-            message = f"ERROR - Error getting token name: {e}"
-            print(message)
-            self.logger.add_log(message)
+            self.logger.error(f"Error getting token name: {e}")
             return "Unknown Token"
 
     async def build_and_send_transaction(self, wallet, function_call, msg_value=None):
-        message = f"INFO - Building transaction for wallet {wallet['address']} with function call {function_call}"
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info(f"Building transaction for wallet {wallet['address']} with function call {function_call}")
 
-        gas_price = self.web3.eth.gas_price
+        # The JSON-RPC round trips of the action run in worker threads, see sign_and_send_transaction
+        fee_fields = await asyncio.to_thread(self.get_fee_fields)
 
-        # Estimate gas_limit
+        # Calls of the same shape made by other wallets give the gas limit without estimating it
+        gas_cache_key = GasEstimateCache.get_key(self.blockchain, function_call, msg_value)
+        estimated_gas_limit = self.gas_estimate_cache.get(gas_cache_key)
+        if estimated_gas_limit is not None:
+            # The estimation was also the check that the call doesn't revert for this wallet (balance, allowance,
+            # msg.value): a cheaper eth_call still simulates it, and a revert goes through the estimation below
+            try:
+                await asyncio.to_thread(function_call.call, {
+                    "from": wallet["address"],
+                    "value": msg_value if msg_value is not None else 0,
+                })
+            except Exception as e:
+                self.logger.warning(f"The call would fail for wallet {wallet['address']}, estimating its gas: {e}")
+                estimated_gas_limit = None
         try:
-            message = f"INFO - Estimating gas limit for wallet {wallet['address']}"
-            print(message)
-            self.logger.add_log(message)
-            estimated_gas_limit = function_call.estimate_gas({
-                "from": wallet["address"],
-                "nonce": self.web3.eth.get_transaction_count(wallet["address"]),
-                "value": msg_value if msg_value is not None else 0,
-            })
+            if estimated_gas_limit is None:
+                self.logger.info(f"Estimating gas limit for wallet {wallet['address']}")
+                estimated_gas_limit = await asyncio.to_thread(lambda: function_call.estimate_gas({
+                    "from": wallet["address"],
+                    "nonce": self.web3.eth.get_transaction_count(wallet["address"]),
+                    "value": msg_value if msg_value is not None else 0,
+                }))
+                self.gas_estimate_cache.store(gas_cache_key, estimated_gas_limit)
         except Exception as e:
             error_message = str(e)
             if "Insufficient msg.value" in error_message or "execution reverted:" in error_message:
-                message = f"ERROR - {error_message}."
+                message = f"{error_message}."
                 try:
-                    estimated_gas_limit = int(
-                        median(t.gas for t in self.web3.eth.get_block("latest", full_transactions=True).transactions))
+                    latest_block = await asyncio.to_thread(self.web3.eth.get_block, "latest", True)
+                    estimated_gas_limit = int(median(t.gas for t in latest_block.transactions))
                     message += "\nTrying to execute the transaction with last block average gas limit but it will probably fail."
                 except Exception as e:
                     message += f"{e}"
                     return None
                 finally:
-                    print(message)
-                    self.logger.add_log(message)
+                    self.logger.error(message)
             else:
-                message = f"ERROR - Error estimating gas limit: {error_message}"
-                print(message)
-                self.logger.add_log(message)
+                self.logger.error(f"Error estimating gas limit: {error_message}")
                 return None
-        message=f"INFO - Estimated gas limit: {estimated_gas_limit}"
-        print(message)
-        self.logger.add_log(message)
-
-        nonce = self.web3.eth.get_transaction_count(wallet["address"])  # Get the nonce
+        self.logger.info(f"Estimated gas limit: {estimated_gas_limit}")
 
         # Build the transaction
-        transaction = function_call.build_transaction({
+        transaction = await asyncio.to_thread(lambda: function_call.build_transaction({
             "chainId": self.web3.eth.chain_id,
             "gas": estimated_gas_limit,
-            "gasPrice": gas_price,
-            "nonce": nonce,
+            **fee_fields,
+            "nonce": self.get_nonce(wallet),
             "value": msg_value if msg_value is not None else 0,
-        })
+        }))
 
         if wallet["private_key"] is None:
             return transaction
 
         # Send the transaction and wait for it to be mined
-        signed_txn = self.web3.eth.account.sign_transaction(transaction, wallet["private_key"])
         try:
-            txn_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            txn_hash = await self.sign_and_send_transaction(wallet, transaction)
         except ValueError as e:
             error_message = str(e)
             if "insufficient funds for gas * price + value" in error_message:
-                message = f"ERROR - Insufficient funds for gas * price + value. Check your account balance."
-                print(message)
-                self.logger.add_log(message)
+                self.logger.error(f"Insufficient funds for gas * price + value. Check your account balance.")
             else:
-                message = f"ERROR - Unexpected error occurred while sending transaction: {error_message}"
-                print(message)
-                self.logger.add_log(message)
+                self.logger.error(f"Unexpected error occurred while sending transaction: {error_message}")
             return
-        txn_hash_hex = await self.wait_for_transaction_mined(txn_hash)
+        txn_hash_hex = await self.wait_for_transaction_mined(
+            txn_hash, on_receipt=lambda receipt: self.gas_estimate_cache.observe_receipt(gas_cache_key, receipt))
 
         return txn_hash_hex
 
-    async def wait_for_transaction_mined(self, txn_hash, timeout=settings.DEFAULT_TRANSACTION_TIMEOUT):
+    async def wait_for_transaction_mined(self, txn_hash, timeout=settings.DEFAULT_TRANSACTION_TIMEOUT, on_receipt=None):
         txn_hash_hex = self.web3.to_hex(txn_hash)
-        start_time = time.time()
+        start_time = self.clock.time()
 
-        message = f"INFO - Waiting for transaction to be mined..."
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info(f"Waiting for transaction to be mined...")
         txn_receipt = None
-        while txn_receipt is None and time.time() - start_time < timeout:
+        while txn_receipt is None and self.clock.time() - start_time < timeout:
             try:
-                txn_receipt = self.web3.eth.get_transaction_receipt(txn_hash)
+                txn_receipt = await asyncio.to_thread(self.web3.eth.get_transaction_receipt, txn_hash)
             except TransactionNotFound:
-                await asyncio.sleep(1)
+                await self.clock.sleep(1)
             except Exception as e:
-                message = f"ERROR - Error while fetching transaction receipt: {e}"
-                print(message)
-                self.logger.add_log(message)
+                self.logger.error(f"Error while fetching transaction receipt: {e}")
                 return None
             if self.stop_requested:
                 return None
 
         if txn_receipt is None:
-            message = f"WARNING - Transaction has not been mined after the timeout.\nYou may want to check the transaction manually: {settings.BLOCKCHAIN_SETTINGS[self.blockchain]['explorer_url']}{txn_hash_hex}"
-            print(message)
-            self.logger.add_log(message)
+            self.logger.warning(f"Transaction has not been mined after the timeout.\nYou may want to check the transaction manually: {settings.BLOCKCHAIN_SETTINGS[self.blockchain]['explorer_url']}{txn_hash_hex}")
             return None
 
-        message = f"INFO - Transaction mined in {round(time.time() - start_time, 2)} seconds with status: "
+        observe_receipt(self.blockchain, txn_receipt, self.clock.time() - start_time)
+        if on_receipt is not None:
+            on_receipt(txn_receipt)
+        message = f"Transaction mined in {round(self.clock.time() - start_time, 2)} seconds with status: "
 
         if txn_receipt['status'] == 1:
             message += "Success!"
@@ -404,23 +480,21 @@ class DeFiHandler:
         else:
             message += "Failed."
 
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info(message)
 
         return txn_hash_hex
 
     def cancel_transaction(self, wallet, original_txn_hash):
         original_txn = self.web3.eth.get_transaction(original_txn_hash)
         nonce = original_txn["nonce"]
-        gas_price = original_txn["gasPrice"]
 
-        new_gas_price = int(gas_price * 1.2)  # Increase the gas price by 20%
+        # The replacement must pay more than the original transaction, whatever its type
         transaction = {
             "from": wallet["address"],
             "to": wallet["address"],
             "value": 0,
             "gas": 21000,
-            "gasPrice": new_gas_price,
+            **build_replacement_fee_fields(self.get_fee_estimate(), original_txn, self.blockchain),
             "nonce": nonce,
             "chainId": self.web3.eth.chain_id,
         }
@@ -428,41 +502,25 @@ class DeFiHandler:
         if wallet["private_key"] is None:
             return transaction
 
-        signed_txn = self.web3.eth.account.sign_transaction(transaction, wallet["private_key"])
+        signed_txn = self.signer_cache.sign_transaction(wallet, transaction)
         txn_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
         txn_hash_hex = self.web3.to_hex(txn_hash)
+        self.transaction_journal.record(self.blockchain, wallet["address"], transaction, txn_hash_hex)
 
-        message = f"INFO - Cancelled original transaction. Sent a new transaction with hash {txn_hash_hex}"
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info(f"Cancelled original transaction. Sent a new transaction with hash {txn_hash_hex}")
         return txn_hash_hex
 
-    def get_pending_transactions(self, wallet_address):
-        pending_transactions = []
-
-        # Get the transaction pool content
-        try:
-            txpool_content = self.web3.manager.request_blocking('txpool_content', [])
-        except Exception as e:
-            print("The connected node does not support 'txpool_content' method.")
-            return pending_transactions
-
-        # Check both queued and pending transactions
-        for group in [txpool_content['queued'], txpool_content['pending']]:
-            for txs in group.values():
-                for tx in txs.values():
-                    # Check if the transaction is related to the wallet_address
-                    if tx['from'] == wallet_address:
-                        pending_transactions.append(tx)
-
-        print(f"Pending transactions: {pending_transactions}")
-
+    async def get_pending_transactions(self, wallet_address):
+        # The nonces between the "latest" and "pending" counts of the wallet, with the transactions sent with them
+        stuck_transactions = await self.transaction_journal.find_stuck_transactions(self.blockchain, [wallet_address],
+                                                                                    min_age_sec=0)
+        pending_transactions = stuck_transactions.get(wallet_address, [])
+        self.logger.debug("Pending transactions: %s", pending_transactions)
         return pending_transactions
 
     async def approve_token_spend(self, wallet, token_address, spender, amount):
-        message = f"INFO - Approving contract {token_address} to spend {amount} {self.get_token_name(token_address)}..."
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info("Approving contract %s to spend %s %s...", token_address, amount,
+                         Lazy(self.get_token_name, token_address))
         contract = self.web3.eth.contract(
             address=token_address,
             abi=self.token_abi,
@@ -475,14 +533,12 @@ class DeFiHandler:
     async def ensure_token_approval(self, wallet, token_address, spender, amount):
         allowance = await self.check_allowance(wallet, token_address, spender)
         if allowance < amount:
-            message = f"INFO - The actual allowance is {allowance} {self.get_token_name(token_address)} and the desired amount is {amount} {self.get_token_name(token_address)}."
-            self.logger.add_log(message)
-            print(message)
+            token_name = Lazy(self.get_token_name, token_address)
+            self.logger.info("The actual allowance is %s %s and the desired amount is %s %s.", allowance, token_name,
+                             amount, token_name)
             # If allowance is already set but not enough, first reset it to zero (some tokens require this)
             if allowance > 0:
-                message = f"INFO - Resetting allowance to zero before setting the desired amount..."
-                self.logger.add_log(message)
-                print(message)
+                self.logger.info(f"Resetting allowance to zero before setting the desired amount...")
                 await self.approve_token_spend(wallet, token_address, spender, 0)
 
             # Approve the desired amount
@@ -495,32 +551,29 @@ class DeFiHandler:
         try:
             function_call = function(*args, **kwargs)
         except Exception as e:
-            self.logger.add_log(f"ERROR - Error while building function call: {e}")
-            print(f"ERROR - Error while building function call: {e}")
+            self.logger.error(f"Error while building function call: {e}")
             # Show all the arguments passed and their types
             if args:
-                print(
-                    f"INFO - Positional arguments passed to the function '{function_name}' of the contract {contract_address}:")
+                self.logger.debug("Positional arguments passed to the function '%s' of the contract %s:", function_name,
+                                  contract_address)
                 for arg in args:
-                    print(f"INFO - {arg} ({type(arg)})")
+                    self.logger.debug("%s (%s)", arg, type(arg))
             if kwargs:
-                print(
-                    f"INFO - Keyword arguments passed to the function '{function_name}' of the contract {contract_address}:")
+                self.logger.debug("Keyword arguments passed to the function '%s' of the contract %s:", function_name,
+                                  contract_address)
                 for key, value in kwargs.items():
-                    print(f"INFO - {key} = {value} ({type(value)})")
+                    self.logger.debug("%s = %s (%s)", key, value, type(value))
 
             return
 
-        self.logger.add_log(
-            f"INFO - Interacting with the function '{function_name}' of the contract {contract_address}")
+        self.logger.info(f"Interacting with the function '{function_name}' of the contract {contract_address}")
 
         return await self.build_and_send_transaction(wallet, function_call, msg_value)
 
     async def swap_tokens(self, wallet, token_in_address, token_out_address, amount_in, exchange_address, exchange_abi,
-                          slippage_tolerance=0.1, deadline_minutes=3):
-        message = f"INFO - Swapping {self.get_token_name(token_in_address)} for {self.get_token_name(token_out_address)} on contract {exchange_address}"
-        print(message)
-        self.logger.add_log(message)
+                          slippage_tolerance=0.1, deadline_minutes=3, best_route=False):
+        self.logger.info("Swapping %s for %s on contract %s", Lazy(self.get_token_name, token_in_address),
+                         Lazy(self.get_token_name, token_out_address), exchange_address)
 
         # Check minimum transfer amount
         # Assuming `minimum_transfer_amount` function exists in the token contract
@@ -528,28 +581,37 @@ class DeFiHandler:
         try:
             min_transfer_amount = contract.functions.minimum_transfer_amount().call()
             if amount_in < min_transfer_amount:
-                message = f"ERROR - Amount to swap is less than the minimum transfer amount."
-                print(message)
-                self.logger.add_log(message)
+                self.logger.error(f"Amount to swap is less than the minimum transfer amount.")
                 return
-            message = f"INFO - The minimum transfer amount is {self.web3.from_wei(min_transfer_amount, 'ether')} {self.get_token_name(token_in_address)}."
-            print(message)
-            self.logger.add_log(message)
+            self.logger.info("The minimum transfer amount is %s %s.", self.web3.from_wei(min_transfer_amount, 'ether'),
+                             Lazy(self.get_token_name, token_in_address))
         except Exception as e:
             # print(f"INFO - Token contract does not have a minimum_transfer_amount function.")
             pass
 
         # Check token balance
         token_balance = self.get_token_balance(wallet, token_in_address)
-        message = f"INFO - The token balance is {self.web3.from_wei(token_balance, 'ether')} {self.get_token_name(token_in_address)}."
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info("The token balance is %s %s.", self.web3.from_wei(token_balance, 'ether'),
+                         Lazy(self.get_token_name, token_in_address))
         if token_balance < amount_in:
-            message = f"ERROR - Insufficient token balance. Aborting..."
-            print(message)
-            self.logger.add_log(message)
+            self.logger.error(f"Insufficient token balance. Aborting...")
             return
 
+        # The exchange of the action is used unless the action opted in to routing: quote the venues of the blockchain
+        # along with it and swap on the best one
+        quote = None
+        if best_route:
+            exchange_venue = {"name": exchange_address, "type": "uniswap_v2", "router": exchange_address, "abi": exchange_abi}
+            quote = await QuoteRouter(self.blockchain, self.logger).get_best_quote(
+                token_in_address, token_out_address, amount_in, wallet["address"], extra_venues=[exchange_venue])
+        if quote is not None and quote["venue"]["type"] == "odos":
+            await self.ensure_token_approval(wallet, token_in_address, self.web3.to_checksum_address(quote["venue"]["router"]), amount_in)
+            return await self.interact_with_api(wallet, settings.ODOS_QUOTE_URL, settings.ODOS_ASSEMBLE_URL, "POST",
+                                                headers={"Content-Type": "application/json"}, json_payload=quote["payload"])
+        if quote is not None:
+            exchange_address = self.web3.to_checksum_address(quote["venue"]["router"])
+            exchange_abi = QuoteRouter.get_abi(quote["venue"])
+
         # Approve contract to spend tokens if needed
         allowance = await self.check_allowance(wallet, token_in_address, exchange_address)
         # print(f"INFO - The allowance is {self.web3.from_wei(allowance, 'ether')} and the amount to swap is {self.web3.from_wei(amount_in, 'ether')} {self.get_token_name(token_in_address)}.")
@@ -561,13 +623,9 @@ class DeFiHandler:
                 amount_in,
             )
             if approval_txn_hash is None:
-                message = f"ERROR - Token approval failed."
-                print(message)
-                self.logger.add_log(message)
+                self.logger.error(f"Token approval failed.")
                 return
-            message = f"INFO - Approval transaction hash: {approval_txn_hash}"
-            print(message)
-            self.logger.add_log(message)
+            self.logger.info(f"Approval transaction hash: {approval_txn_hash}")
         else:
             # print(f"INFO - Token allowance is sufficient.")
             pass
@@ -576,9 +634,12 @@ class DeFiHandler:
 
         # Calculate the min_amount_out by applying the slippage tolerance
         # Estimate the output amount by calling the `getAmountsOut` function
-        contract = self.web3.eth.contract(address=exchange_address, abi=exchange_abi)
-        amounts_out = contract.functions.getAmountsOut(amount_in, path).call()
-        estimated_output_amount = amounts_out[-1]
+        if quote is not None:
+            estimated_output_amount = quote["amount_out"]
+        else:
+            contract = self.web3.eth.contract(address=exchange_address, abi=exchange_abi)
+            amounts_out = contract.functions.getAmountsOut(amount_in, path).call()
+            estimated_output_amount = amounts_out[-1]
 
         # Apply the slippage tolerance to the estimated_output_amount
         min_amount_out = max(0, int(estimated_output_amount * (1 - slippage_tolerance)))
@@ -597,33 +658,33 @@ class DeFiHandler:
             path,
             wallet["address"],
             deadline,
+            # Mute routers take the kind of pool (stable or volatile) of each hop
+            *([[quote["stable"]]] if quote is not None and quote["venue"]["type"] == "mute" else []),
         )
 
         return txn_hash_hex
 
     async def swap_native_token(self, wallet, token_address, amount, exchange_address, exchange_abi,
-                                blockchain, slippage_tolerance=0.1, deadline_minutes=3, is_buy=True):
+                                blockchain, slippage_tolerance=0.1, deadline_minutes=3, is_buy=True, best_route=False):
         if is_buy:  # Swap native token for another token
             # Wrap native token
             wrap_txn_hash = await self.wrap_native_token(wallet, amount)
             if wrap_txn_hash is None:
-                message = f"ERROR - Wrapping native token failed."
-                print(message)
-                self.logger.add_log(message)
+                self.logger.error(f"Wrapping native token failed.")
                 return
-            message = f"INFO - Wrapping native token transaction hash: {wrap_txn_hash}"
-            print(message)
-            self.logger.add_log(message)
+            self.logger.info(f"Wrapping native token transaction hash: {wrap_txn_hash}")
 
             # Perform swap
             swap_txn_hash = await self.swap_tokens(wallet, self.wrapped_native_token_address, token_address, amount,
-                                                   exchange_address, exchange_abi, slippage_tolerance, deadline_minutes)
+                                                   exchange_address, exchange_abi, slippage_tolerance, deadline_minutes,
+                                                   best_route)
             return swap_txn_hash
 
         else:  # Swap another token for the native token
             # Perform swap
             swap_txn_hash = await self.swap_tokens(wallet, token_address, self.wrapped_native_token_address, amount,
-                                                   exchange_address, exchange_abi, slippage_tolerance, deadline_minutes)
+                                                   exchange_address, exchange_abi, slippage_tolerance, deadline_minutes,
+                                                   best_route)
             return swap_txn_hash
 
     async def swap_tokens_with_steps(self, wallet, pool_address, token_in, amount_in,
@@ -647,9 +708,7 @@ class DeFiHandler:
             token_in_address = self.web3.to_checksum_address(token_in)
             actual_token_in = self.web3.to_checksum_address(token_in)
 
-        message = "INFO - Swap in progress..."
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info("Swap in progress...")
 
         # Ensure token is approved
         await self.ensure_token_approval(wallet, actual_token_in, exchange_address, amount_in)
@@ -683,23 +742,29 @@ class DeFiHandler:
         router = self.web3.eth.contract(address=exchange_address, abi=exchange_abi)
 
         try:
-            # Construct the transaction
-            transaction = router.functions.swap(
+            swap_call = router.functions.swap(
                 paths,
                 0,  # amountOutMin (not used) NOTE: Ensure slippage here
                 deadline_timestamp
-            ).build_transaction({
+            )
+            value = amount_in if token_in == 'ETH' else 0
+            try:
+                gas_limit = int(swap_call.estimate_gas({
+                    'from': self.web3.to_checksum_address(wallet['address']),
+                    'value': value,
+                }) * settings.GAS_LIMIT_MARGIN)
+            except Exception as e:
+                gas_limit = settings.FALLBACK_SWAP_GAS_LIMIT
+                self.logger.warning(f"Could not estimate the gas of the swap, using {gas_limit}: {e}")
+
+            # Construct the transaction
+            transaction = swap_call.build_transaction({
                 'chainId': self.web3.eth.chain_id,
                 'from': self.web3.to_checksum_address(wallet['address']),
-                'maxFeePerGas': self.web3.eth.gas_price * 2,
-                'maxPriorityFeePerGas': self.web3.eth.gas_price,
-                'gas': 1500000,  # int(self.web3.eth.estimate_gas({
-                # 'from': self.web3.to_checksum_address(wallet['address']),
-                # 'to': self.web3.to_checksum_address(exchange_address),
-                # 'value': amount_in if token_in == 'ETH' else 0,
-                # }) * 2),
-                'nonce': self.web3.eth.get_transaction_count(wallet['address'], 'latest'),
-                'value': amount_in if token_in == 'ETH' else 0,
+                **self.get_fee_fields(),
+                'gas': gas_limit,
+                'nonce': self.get_nonce(wallet),
+                'value': value,
             })
 
             if wallet["private_key"] is None:
@@ -707,8 +772,7 @@ class DeFiHandler:
 
             try:
                 # Signs and sends the transaction.
-                signed_txn = self.web3.eth.account.sign_transaction(transaction, wallet['private_key'])
-                txn_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+                txn_hash = await self.sign_and_send_transaction(wallet, transaction)
                 txn_hash_hex = await self.wait_for_transaction_mined(txn_hash)
             except Exception as e:
                 raise Exception(f"ERROR - An error occurred while sending the transaction: {e}")
@@ -761,14 +825,10 @@ class DeFiHandler:
                         request=request,  # Pass the request object
                         response=response)  # Pass the response object
         except httpx.HTTPStatusError as e:
-            message = f"ERROR - {e}"
-            print(message)
-            self.logger.add_log(message)
+            self.logger.error(f"{e}")
             if response and hasattr(response, "status_code"):
-                message = f"Error response headers: {response.headers}\n"
-                message += f"Error response content: {response.text}\n"
-                print(message)
-                self.logger.add_log(message)
+                self.logger.error("Error response headers: %s\nError response content: %s\n", response.headers,
+                                  response.text)
             return None
 
     async def interact_with_api(self, wallet, quote_url, assemble_url, method="GET", params=None, data=None, headers=None, timeout=10,
@@ -779,9 +839,7 @@ class DeFiHandler:
 
         response_quote = await self._send_api_request(quote_url, method, params, data, headers, timeout, json_payload)
         if not response_quote:
-            message = f"ERROR - An error occurred while generating a quote"
-            print(message)
-            self.logger.add_log(message)
+            self.logger.error(f"An error occurred while generating a quote")
             return None
         quote = response_quote.json()
 
@@ -800,9 +858,7 @@ class DeFiHandler:
                                                          )
 
         if not response_assemble:
-            message = f"ERROR - An error occurred while assembling the transaction"
-            print(message)
-            self.logger.add_log(message)
+            self.logger.error(f"An error occurred while assembling the transaction")
             return None
         assembled_transaction = response_assemble.json()
 
@@ -819,15 +875,16 @@ class DeFiHandler:
         # web3 requires checksummed addresses
         transaction["from"] = self.web3.to_checksum_address(transaction["from"])
         transaction["to"] = self.web3.to_checksum_address(transaction["to"])
+        # Our own fees rather than the gas price suggested by the API
+        transaction.pop("gasPrice", None)
+        transaction.update(self.get_fee_fields())
 
         if wallet["private_key"] is None:
             return transaction
 
         try:
-            # Sign the transaction
-            signed_tx = self.web3.eth.account.sign_transaction(transaction, wallet["private_key"])
-            # Send the signed transaction
-            txn_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+            # Sign and send the transaction
+            txn_hash = await self.sign_and_send_transaction(wallet, transaction)
             txn_hash_hex = await self.wait_for_transaction_mined(txn_hash)
         except Exception as e:
             raise Exception(f"ERROR - An error occurred while processing the swap: {e}")
@@ -835,9 +892,7 @@ class DeFiHandler:
         return txn_hash_hex
 
     async def wrap_native_token(self, wallet, amount):
-        message = f"INFO - Wrapping {self.web3.from_wei(amount, 'ether')} native tokens"
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info(f"Wrapping {self.web3.from_wei(amount, 'ether')} native tokens")
 
         # Get the deposit function from the wrapped token contract
         contract = self.web3.eth.contract(address=self.wrapped_native_token_address, abi=self.wrapped_native_token_abi)
@@ -850,16 +905,13 @@ class DeFiHandler:
     # This function is used to check the allowance of a spender for a token
     async def check_allowance(self, wallet, token_address, spender):
         contract = self.web3.eth.contract(address=token_address, abi=self.token_abi)
-        message = f"INFO - Checking allowance for contract {spender}..."
-        print(message)
-        self.logger.add_log(message)
-        allowance = contract.functions.allowance(wallet["address"], spender).call()
+        self.logger.info(f"Checking allowance for contract {spender}...")
+        allowance = await asyncio.to_thread(contract.functions.allowance(wallet["address"], spender).call)
         if token_address == self.wrapped_native_token_address:
-            message = f"INFO - Allowance for contract {spender}: {self.web3.from_wei(allowance, 'ether')} {self.get_token_name(token_address)}"
+            self.logger.info("Allowance for contract %s: %s %s", spender, self.web3.from_wei(allowance, 'ether'),
+                             Lazy(self.get_token_name, token_address))
         else:
-            message = f"INFO - Allowance for contract {spender}: {allowance} {self.get_token_name(token_address)}"
-        print(message)
-        self.logger.add_log(message)
+            self.logger.info("Allowance for contract %s: %s %s", spender, allowance, Lazy(self.get_token_name, token_address))
         return allowance
 
     def get_token_balance(self, wallet, token_address=None, native=False):
@@ -892,10 +944,8 @@ class DeFiHandler:
             return token_balance
 
     async def transfer_native_token(self, wallet, recipient_address, amount_in_wei):
-        message = f"INFO - Transfering {self.web3.from_wei(amount_in_wei, 'ether')} ETH from wallet {wallet['address']} to {recipient_address}."
-        print(message)
-        self.logger.add_log(message)
-        nonce = self.web3.eth.get_transaction_count(wallet["address"])
+        self.logger.info(f"Transfering {self.web3.from_wei(amount_in_wei, 'ether')} ETH from wallet {wallet['address']} to {recipient_address}.")
+        nonce = self.get_nonce(wallet)
 
         try:
             # Estimate the gas required for the transaction
@@ -905,9 +955,7 @@ class DeFiHandler:
                 'value': amount_in_wei
             })
         except Exception as e:
-            message = f"ERROR - Error estimating gas limit: {e}"
-            self.logger.add_log(message)
-            print(message)
+            self.logger.error(f"Error estimating gas limit: {e}")
             return None
 
         transaction = {
@@ -915,7 +963,7 @@ class DeFiHandler:
             "to": recipient_address,
             "value": amount_in_wei,
             "gas": gas_limit,
-            "gasPrice": self.web3.eth.gas_price,  # Set the gas price to the average network gas price
+            **self.get_fee_fields(),
             "nonce": nonce,
             "chainId": self.web3.eth.chain_id,
         }
@@ -923,50 +971,50 @@ class DeFiHandler:
         if wallet["private_key"] is None:
             return transaction
 
-        signed_txn = self.web3.eth.account.sign_transaction(transaction, wallet["private_key"])
-        txn_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
-        message = f"Transaction hash in function 'transfer_native_token': {txn_hash.hex()}"
-        print(message)
-        self.logger.add_log(message)
+        txn_hash = await self.sign_and_send_transaction(wallet, transaction)
+        self.logger.info("Transaction hash in function 'transfer_native_token': %s", txn_hash.hex())
         txn_hash_hex = await self.wait_for_transaction_mined(txn_hash)
 
         return txn_hash_hex
 
     async def transfer_token(self, wallet, recipient_address, amount, token_address):
-        message = f"INFO - Account balance before transfer: {self.web3.from_wei(self.get_token_balance(wallet, token_address), 'ether')} {self.get_token_name(token_address)}"
-        print(message)
-        self.logger.add_log(message)
-        message = f"INFO - Sending {self.web3.from_wei(amount, 'ether')} {self.get_token_name(token_address)} to {recipient_address}"
-        print(message)
-        self.logger.add_log(message)
+        token_name = Lazy(self.get_token_name, token_address)
+        self.logger.info("Account balance before transfer: %s %s",
+                         Lazy(lambda: self.web3.from_wei(self.get_token_balance(wallet, token_address), 'ether')),
+                         token_name)
+        self.logger.info("Sending %s %s to %s", self.web3.from_wei(amount, 'ether'), token_name, recipient_address)
         contract = self.web3.eth.contract(address=token_address, abi=self.token_abi)
         function_call = contract.functions.transfer(recipient_address, amount)
         return await self.build_and_send_transaction(wallet, function_call)
 
-    async def read_and_replace_message(self, filepath, replacements):
-        message = load_json(filepath)
-
-        for placeholder, value in replacements.items():
-            self.replace_placeholder_with_value(message, placeholder, value)
-
-        return message
-
-    async def sign_message(self, wallet, message):
+    async def sign_typed_data(self, wallet, template_filename, replacements):
         """
-        Sign a message with a wallet's private key
+        Sign an EIP-712 message template of resources/messages
         :param wallet: The wallet used to sign the message
-        :param message: The message to sign
+        :param template_filename: The template, e.g. EIP712Message.json
+        :param replacements: Values of the placeholders of the template, e.g. {"<Holder Address>": "0x..."}
         :return: signature object with v, r, and s components
         """
-        msg = encode_structured_data(text=json.dumps(message))
-        signed_message = self.web3.eth.account.sign_message(msg, private_key=wallet["private_key"])
-        return signed_message
+        template = EIP712Templates.get(template_filename)
+        return template.sign(self.signer_cache.get_private_key(wallet), replacements)
+
+    async def sign_typed_data_batch(self, wallets, template_filename, replacements):
+        """
+        Sign the same EIP-712 message template with many wallets
+        :param wallets: The wallets used to sign the message
+        :param template_filename: The template, e.g. EIP712Message.json
+        :param replacements: Values of the placeholders shared by all the wallets, or a list with the values of each wallet
+        :return: list of signature objects, in the order of the wallets
+        """
+        template = EIP712Templates.get(template_filename)
+        if isinstance(replacements, Mapping):
+            replacements = [replacements] * len(wallets)
+        return [template.sign(self.signer_cache.get_private_key(wallet), wallet_replacements)
+                for wallet, wallet_replacements in zip(wallets, replacements)]
 
     async def add_liquidity(self, wallet, router_address, router_abi, token_a_address, amount_a_desired, amount_a_min,
                             amount_b_desired, deadline_minutes, is_native, token_b_address=None, amount_b_min=None, fee_type=None, stable=None):
-        message = f"INFO - Adding liquidity for {self.get_token_name(token_a_address)}..."
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info("Adding liquidity for %s...", Lazy(self.get_token_name, token_a_address))
 
         # Approve the router to spend the tokens
         await self.ensure_token_approval(wallet, token_a_address, router_address, amount_a_desired)
@@ -1008,9 +1056,7 @@ class DeFiHandler:
 
     async def remove_liquidity(self, wallet, router_address, router_abi, token_a_address, liquidity, amount_a_min,
                             amount_b_desired, deadline_minutes, is_native, token_b_address=None, amount_b_min=None, stable=None):
-        message = f"INFO - Removing liquidity for {self.get_token_name(token_a_address)}..."
-        print(message)
-        self.logger.add_log(message)
+        self.logger.info("Removing liquidity for %s...", Lazy(self.get_token_name, token_a_address))
 
         # Calculate the deadline timestamp
         deadline_timestamp = int((datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
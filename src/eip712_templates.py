@@ -0,0 +1,136 @@
+# eip712_templates.py
+import json
+import os
+import re
+import threading
+from eth_abi import encode
+from eth_account.datastructures import SignedMessage
+from eth_utils import keccak, to_bytes
+from src.airdrop_spec import thaw
+
+# Values of the form "<Holder Address>" are filled for each signature
+PLACEHOLDER_PATTERN = re.compile(r"^<[^<>]+>$")
+MESSAGES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'resources', 'messages')
+ARRAY_PATTERN = re.compile(r"^(.*)\[(\d*)\]$")
+
+
+class EIP712Template:
+    """
+    EIP-712 typed data with placeholders, compiled once.
+
+    The type hashes are computed when the template is loaded and the domain separator once per set of domain
+    values, so signing for a wallet only hashes its own message.
+    """
+
+    def __init__(self, typed_data):
+        self.types = {name: fields for name, fields in typed_data["types"].items() if name != "EIP712Domain"}
+        self.domain_fields = typed_data["types"]["EIP712Domain"]
+        self.primary_type = typed_data["primaryType"]
+        self.domain = typed_data["domain"]
+        self.message = typed_data["message"]
+        self.type_hashes = {name: keccak(text=self.encode_type(name)) for name in self.types}
+        self.type_hashes["EIP712Domain"] = keccak(text=self.encode_type("EIP712Domain"))
+        self.domain_separators = {}
+
+    def get_fields(self, type_name):
+        return self.domain_fields if type_name == "EIP712Domain" else self.types[type_name]
+
+    def get_dependencies(self, type_name, found=None):
+        found = set() if found is None else found
+        for field in self.get_fields(type_name):
+            base_type = ARRAY_PATTERN.sub(r"\1", field["type"])
+            while ARRAY_PATTERN.match(base_type):
+                base_type = ARRAY_PATTERN.sub(r"\1", base_type)
+            if base_type in self.types and base_type not in found:
+                found.add(base_type)
+                self.get_dependencies(base_type, found)
+        return found
+
+    def encode_type(self, type_name):
+        # The primary type first, then the referenced types sorted by name
+        dependencies = sorted(self.get_dependencies(type_name) - {type_name})
+        return "".join(f"{name}({','.join(field['type'] + ' ' + field['name'] for field in self.get_fields(name))})"
+                       for name in [type_name] + dependencies)
+
+    def encode_value(self, type_name, value):
+        array = ARRAY_PATTERN.match(type_name)
+        if array:
+            return keccak(b"".join(self.encode_value(array.group(1), item) for item in value))
+        if type_name in self.types:
+            return self.hash_struct(type_name, value)
+        if type_name == "string":
+            return keccak(text=value)
+        if type_name == "bytes":
+            return keccak(to_bytes(hexstr=value) if isinstance(value, str) else value)
+        if type_name.startswith(("uint", "int")) and isinstance(value, str):
+            value = int(value, 0)
+        elif type_name.startswith("bytes") and isinstance(value, str):
+            value = to_bytes(hexstr=value)
+        return encode([type_name], [value])
+
+    def hash_struct(self, type_name, data):
+        return keccak(self.type_hashes[type_name] + b"".join(
+            self.encode_value(field["type"], data[field["name"]]) for field in self.get_fields(type_name)))
+
+    @staticmethod
+    def fill(data, replacements):
+        if isinstance(data, dict):
+            return {key: EIP712Template.fill(value, replacements) for key, value in data.items()}
+        if isinstance(data, list):
+            return [EIP712Template.fill(value, replacements) for value in data]
+        if isinstance(data, str) and PLACEHOLDER_PATTERN.match(data):
+            # The values may come from a frozen airdrop spec
+            return thaw(replacements[data])
+        return data
+
+    def render(self, replacements):
+        """Typed data with the placeholders replaced, e.g. for a wallet that signs it itself."""
+        return {
+            "types": {"EIP712Domain": self.domain_fields, **self.types},
+            "primaryType": self.primary_type,
+            "domain": self.fill(self.domain, replacements),
+            "message": self.fill(self.message, replacements),
+        }
+
+    def get_domain_separator(self, replacements):
+        domain = self.fill(self.domain, replacements)
+        key = json.dumps(domain, sort_keys=True, default=str)
+        if key not in self.domain_separators:
+            self.domain_separators[key] = self.hash_struct("EIP712Domain", domain)
+        return self.domain_separators[key]
+
+    def hash(self, replacements):
+        """Digest to sign: 0x1901 + domain separator + hash of the message."""
+        return keccak(b"\x19\x01" + self.get_domain_separator(replacements)
+                      + self.hash_struct(self.primary_type, self.fill(self.message, replacements)))
+
+    def sign(self, private_key, replacements):
+        """Sign with an eth_keys PrivateKey, returns the same SignedMessage as eth_account."""
+        message_hash = self.hash(replacements)
+        signature = private_key.sign_msg_hash(message_hash)
+        v = signature.v + 27
+        return SignedMessage(message_hash, signature.r, signature.s, v,
+                             signature.r.to_bytes(32, "big") + signature.s.to_bytes(32, "big") + bytes([v]))
+
+
+class EIP712Templates:
+    """Templates of resources/messages, parsed on first use and shared by the whole process."""
+
+    _templates = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, filename):
+        if filename not in cls._templates:
+            with cls._lock:
+                if filename not in cls._templates:
+                    with open(os.path.join(MESSAGES_DIRECTORY, os.path.basename(filename)), 'r') as f:
+                        cls._templates[filename] = EIP712Template(json.load(f))
+        return cls._templates[filename]
+
+    @classmethod
+    def load_all(cls):
+        """Parse all the templates, called at startup."""
+        for filename in sorted(os.listdir(MESSAGES_DIRECTORY)):
+            if filename.endswith(".json"):
+                cls.get(filename)
@@ -0,0 +1,133 @@
+# execution_dispatcher.py
+import asyncio
+import time
+from collections import deque
+
+import config.settings as settings
+from src.metrics import FARMING_QUEUE_DEPTH, FARMING_QUEUE_WAIT, FARMING_RUNS_ACTIVE
+
+
+class ExecutionQueueFull(Exception):
+    pass
+
+
+class ExecutionDispatcher:
+    """
+    Weighted fair queuing of the farming runs across subscription tiers.
+
+    At most MAX_CONCURRENT_FARMING_SESSIONS runs execute at the same time and each tier has its own cap.
+    When a slot frees up, the waiting run with the smallest virtual finish time is started: a run submitted
+    by a tier of weight w finishes 1 / w after the later of the current virtual time and the previous run of
+    its tier. Every run counts as one unit whatever its number of wallets, so that the tier weights and not
+    the size of the runs decide the order. A burst from one tier only pushes back that tier's own runs.
+    """
+
+    def __init__(self, supervisor, max_concurrent_runs=None, max_queued_runs=None, plans=None):
+        self.supervisor = supervisor
+        self.max_concurrent_runs = max_concurrent_runs or settings.MAX_CONCURRENT_FARMING_SESSIONS
+        self.max_queued_runs = max_queued_runs or settings.MAX_QUEUED_FARMING_SESSIONS
+        plans = plans or settings.SUBSCRIPTION_PLANS
+        self.default_tier = plans[0]["level"]
+        self.weights = {plan["level"]: plan["scheduling_weight"] for plan in plans}
+        self.caps = {plan["level"]: plan["max_concurrent_runs"] for plan in plans}
+        self.queues = {level: deque() for level in self.weights}
+        self.running = {level: 0 for level in self.weights}
+        self.last_finish = {level: 0.0 for level in self.weights}
+        self.virtual_time = 0.0
+        self.queued_tasks = {}  # {task: waiter} for the runs waiting for a slot
+        # Moving average of the run durations, used to estimate when a queued run will start
+        self.average_run_duration = settings.FARMING_RUN_DURATION_ESTIMATE_SEC
+
+    def get_tier(self, subscription_level):
+        return subscription_level if subscription_level in self.weights else self.default_tier
+
+    def submit(self, subscription_level, run, name=None):
+        """
+        Schedule run (a coroutine function) and return its supervised task, which waits for a slot before running it.
+        Raises ExecutionQueueFull when too many runs are already waiting.
+        """
+        if self.supervisor.closing:
+            raise ExecutionQueueFull("The bot is shutting down")
+        if len(self.queued_tasks) >= self.max_queued_runs:
+            raise ExecutionQueueFull(f"{len(self.queued_tasks)} farming runs are already waiting")
+        tier = self.get_tier(subscription_level)
+        waiter = self.enqueue(tier)
+        task = self.supervisor.spawn(self.run_in_slot(tier, waiter, run), name=name)
+        task.add_done_callback(lambda finished_task: self.on_task_done(tier, waiter, finished_task))
+        if not waiter["future"].done():
+            self.queued_tasks[task] = waiter
+        return task
+
+    def is_queued(self, task):
+        return task in self.queued_tasks
+
+    def estimate_start_delay(self, task):
+        """Estimated seconds before a queued run starts, 0 if it already started."""
+        waiter = self.queued_tasks.get(task)
+        if waiter is None:
+            return 0
+        ahead = sum(1 for queue in self.queues.values() for other in queue if other["finish_tag"] < waiter["finish_tag"])
+        return (ahead // self.max_concurrent_runs + 1) * self.average_run_duration
+
+    def enqueue(self, tier):
+        start_tag = max(self.virtual_time, self.last_finish[tier])
+        finish_tag = start_tag + 1 / self.weights[tier]
+        self.last_finish[tier] = finish_tag
+
+        waiter = {"future": asyncio.get_running_loop().create_future(), "start_tag": start_tag,
+                  "finish_tag": finish_tag, "submitted_at": time.monotonic(), "released": False}
+        self.queues[tier].append(waiter)
+        FARMING_QUEUE_DEPTH.labels(tier).inc()
+        # Starts the run right away when there is a free slot and no run ahead of it
+        self.dispatch()
+        return waiter
+
+    async def run_in_slot(self, tier, waiter, run):
+        await waiter["future"]
+        self.queued_tasks.pop(asyncio.current_task(), None)
+        FARMING_QUEUE_WAIT.labels(tier).observe(time.monotonic() - waiter["submitted_at"])
+        start_time = time.monotonic()
+        try:
+            return await run()
+        finally:
+            self.average_run_duration = 0.8 * self.average_run_duration + 0.2 * (time.monotonic() - start_time)
+            self.release(tier, waiter)
+
+    def on_task_done(self, tier, waiter, task):
+        # Also covers the tasks cancelled before they could run: free their place in the queue or their slot
+        self.queued_tasks.pop(task, None)
+        if waiter in self.queues[tier]:
+            self.queues[tier].remove(waiter)
+            FARMING_QUEUE_DEPTH.labels(tier).dec()
+        elif waiter["future"].done():
+            self.release(tier, waiter)
+
+    def release(self, tier, waiter):
+        if waiter["released"]:
+            return
+        waiter["released"] = True
+        self.running[tier] -= 1
+        FARMING_RUNS_ACTIVE.labels(tier).dec()
+        self.dispatch()
+
+    def dispatch(self):
+        while True:
+            eligible = [tier for tier, queue in self.queues.items() if queue and self.has_capacity(tier)]
+            if not eligible:
+                return
+            tier = min(eligible, key=lambda level: self.queues[level][0]["finish_tag"])
+            waiter = self.queues[tier].popleft()
+            FARMING_QUEUE_DEPTH.labels(tier).dec()
+            self.start(tier, waiter["start_tag"])
+            waiter["future"].set_result(None)
+
+    def start(self, tier, start_tag):
+        self.running[tier] += 1
+        self.virtual_time = max(self.virtual_time, start_tag)
+        FARMING_RUNS_ACTIVE.labels(tier).inc()
+
+    def has_capacity(self, tier):
+        if sum(self.running.values()) >= self.max_concurrent_runs:
+            return False
+        cap = self.caps[tier]
+        return cap is None or self.running[tier] < cap
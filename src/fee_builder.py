@@ -0,0 +1,65 @@
+# fee_builder.py
+import math
+import statistics
+import config.settings as settings
+
+GWEI = 10 ** 9
+
+
+def estimate_fees(web3):
+    """
+    Current fee market of a blockchain, read with a single eth_feeHistory call:
+    {"base_fee", "priority_fee"} on EIP-1559 chains, {"gas_price"} on the others.
+    """
+    try:
+        fee_history = web3.eth.fee_history(settings.FEE_PRIORITY_BLOCKS, "latest", [settings.FEE_PRIORITY_PERCENTILE])
+        # The last base fee is the one of the next block
+        base_fee = fee_history["baseFeePerGas"][-1]
+        rewards = [reward[0] for reward in fee_history.get("reward") or [] if reward]
+    except Exception:
+        base_fee = 0
+    if not base_fee:
+        return {"gas_price": web3.eth.gas_price}
+    return {"base_fee": base_fee, "priority_fee": int(statistics.median(rewards)) if rewards else 0}
+
+
+def build_fee_fields(estimate, blockchain=None, bump=1.0, capped=True):
+    """
+    Fee fields of a transaction from an estimate of estimate_fees: type-2 fields when the chain supports EIP-1559,
+    gasPrice otherwise. bump multiplies the fees, e.g. to replace a pending transaction. The caps of the settings
+    (MAX_FEE_PER_GAS_GWEI, MAX_PRIORITY_FEE_GWEI, or "max_fee_per_gas_gwei" in the blockchain settings) are
+    applied unless capped is False.
+    """
+    max_fee_cap = settings.BLOCKCHAIN_SETTINGS.get(blockchain, {}).get("max_fee_per_gas_gwei",
+                                                                       settings.MAX_FEE_PER_GAS_GWEI) * GWEI
+    if "gas_price" in estimate:
+        gas_price = math.ceil(estimate["gas_price"] * bump)
+        return {"gasPrice": int(min(gas_price, max_fee_cap)) if capped else gas_price}
+
+    priority_fee = max(estimate["priority_fee"], settings.MIN_PRIORITY_FEE_GWEI * GWEI)
+    if capped:
+        priority_fee = min(priority_fee, settings.MAX_PRIORITY_FEE_GWEI * GWEI)
+    # Headroom for the base fee to rise during a few full blocks (12.5% per block) before the transaction is mined
+    max_fee = math.ceil((estimate["base_fee"] * settings.BASE_FEE_HEADROOM + priority_fee) * bump)
+    priority_fee = math.ceil(priority_fee * bump)
+    if capped:
+        max_fee = int(min(max_fee, max_fee_cap))
+    return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": min(priority_fee, max_fee)}
+
+
+def build_replacement_fee_fields(estimate, original_transaction, blockchain=None):
+    """
+    Fee fields of a transaction replacing original_transaction (same nonce): the current fees, raised if needed
+    so that they exceed the original ones by GAS_PRICE_INCREASE as the nodes require. Not capped.
+    """
+    fields = build_fee_fields(estimate, blockchain, capped=False)
+    original_max_fee = original_transaction.get("maxFeePerGas") or original_transaction["gasPrice"]
+    original_priority_fee = original_transaction.get("maxPriorityFeePerGas") or original_transaction["gasPrice"]
+    if "gasPrice" in fields:
+        fields["gasPrice"] = max(fields["gasPrice"], math.ceil(original_max_fee * settings.GAS_PRICE_INCREASE))
+        return fields
+    fields["maxPriorityFeePerGas"] = max(fields["maxPriorityFeePerGas"],
+                                         math.ceil(original_priority_fee * settings.GAS_PRICE_INCREASE))
+    fields["maxFeePerGas"] = max(fields["maxFeePerGas"], math.ceil(original_max_fee * settings.GAS_PRICE_INCREASE),
+                                 fields["maxPriorityFeePerGas"])
+    return fields
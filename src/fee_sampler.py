@@ -0,0 +1,144 @@
+# fee_sampler.py
+import asyncio
+import threading
+import time
+import numpy as np
+import config.settings as settings
+from src.chain_actor import ChainActor
+from src.clock import Clock
+
+
+class FeeSampler:
+    """
+    Rolling history of the base fee of a blockchain, used to send non-urgent transactions when gas is cheap.
+
+    The history is a fixed-size ring buffer of (timestamp, base fee in gwei) per block, filled incrementally from
+    eth_feeHistory: each refresh only appends the blocks mined since the previous one. Chains without EIP-1559
+    record the gas price instead. The sampler is shared by the runs and sampled from worker threads, the buffer
+    is only read and written under its lock.
+    """
+
+    _samplers = {}
+
+    def __init__(self, blockchain, web3=None, size=None):
+        self.blockchain = blockchain
+        self._web3 = web3
+        self.size = size or settings.FEE_HISTORY_SIZE
+        self.times = np.zeros(self.size)
+        self.fees = np.zeros(self.size, dtype=np.float32)
+        self.count = 0  # Number of samples stored, at most size
+        self.position = 0  # Next slot of the ring buffer
+        self.last_block = None
+        self.last_sample_time = 0
+        self.lock = threading.RLock()
+
+    @classmethod
+    def get(cls, blockchain):
+        """Return the sampler of a blockchain, shared by all the runs of the process."""
+        if blockchain not in cls._samplers:
+            cls._samplers[blockchain] = cls(blockchain)
+        return cls._samplers[blockchain]
+
+    @property
+    def web3(self):
+        # Reuse the connection of the chain actor
+        if self._web3 is None:
+            self._web3 = ChainActor.get(self.blockchain).web3
+        return self._web3
+
+    def append(self, timestamps, fees):
+        with self.lock:
+            for timestamp, fee in zip(timestamps, fees):
+                self.times[self.position] = timestamp
+                self.fees[self.position] = fee
+                self.position = (self.position + 1) % self.size
+                self.count = min(self.count + 1, self.size)
+
+    def history(self):
+        """Samples in chronological order, as (timestamps, fees) arrays."""
+        with self.lock:
+            if self.count < self.size:
+                return self.times[:self.count].copy(), self.fees[:self.count].copy()
+            order = np.roll(np.arange(self.size), -self.position)
+            return self.times[order], self.fees[order]
+
+    def sample(self):
+        """Append the blocks mined since the last sample, at most once per FEE_SAMPLE_INTERVAL_SEC."""
+        # A concurrent caller waits for the sample in progress, then finds it recent enough and returns
+        with self.lock:
+            self._sample()
+
+    def _sample(self):
+        now = time.time()
+        if self.count and now - self.last_sample_time < settings.FEE_SAMPLE_INTERVAL_SEC:
+            return
+        try:
+            fee_history = self.web3.eth.fee_history(settings.FEE_HISTORY_BLOCKS, "latest")
+            # baseFeePerGas has one more entry than the number of blocks: the base fee of the next block
+            base_fees = fee_history["baseFeePerGas"][:-1]
+            first_block = fee_history["oldestBlock"]
+        except Exception:
+            base_fees = [self.web3.eth.gas_price]
+            first_block = None
+
+        start = self.last_sample_time
+        if first_block is not None:
+            latest_block = first_block + len(base_fees) - 1
+            if self.last_block is not None:
+                base_fees = base_fees[max(len(base_fees) - (latest_block - self.last_block), 0):]
+            else:
+                start = self.web3.eth.get_block(first_block)["timestamp"]
+            self.last_block = latest_block
+        elif not self.count:
+            start = now - settings.FEE_SAMPLE_INTERVAL_SEC
+
+        # Block times are spread evenly since the previous sample, which is precise enough for percentiles and delays
+        timestamps = np.linspace(start, now, len(base_fees) + 1)[1:]
+        self.append(timestamps, [fee / 10 ** 9 for fee in base_fees])
+        self.last_sample_time = now
+
+    def current_fee(self):
+        with self.lock:
+            return float(self.fees[(self.position - 1) % self.size]) if self.count else None
+
+    def percentile(self, percentile):
+        _, fees = self.history()
+        return float(np.percentile(fees, percentile)) if len(fees) else None
+
+    def project(self, percentile, max_delay_sec):
+        """
+        Project the outcome of waiting, up to max_delay_sec, for the fee to fall below the given percentile of the history:
+        - "threshold": fee to wait for, in gwei
+        - "current": current fee, in gwei
+        - "delay_sec": average time it took the fee to fall below the threshold in the history
+        - "savings": expected fraction of the fee saved
+        """
+        times, fees = self.history()
+        if not len(fees):
+            return None
+        threshold = float(np.percentile(fees, percentile))
+        current = float(fees[-1])
+        projection = {"threshold": threshold, "current": current, "delay_sec": 0, "savings": 0}
+        if current <= threshold:
+            return projection
+
+        # For every sample above the threshold, time until the next sample below it
+        below = np.flatnonzero(fees <= threshold)
+        above = np.flatnonzero(fees > threshold)
+        next_below = np.searchsorted(below, above)
+        has_next = next_below < len(below)
+        delays = times[below[next_below[has_next]]] - times[above[has_next]]
+        projection["delay_sec"] = min(float(delays.mean()) if len(delays) else max_delay_sec, max_delay_sec)
+        projection["savings"] = max(0.0, 1 - float(fees[below].mean()) / current)
+        return projection
+
+    async def wait_for_fee(self, threshold, max_delay_sec, stop_requested=lambda: False, clock=None):
+        """Wait until the fee is at most threshold or max_delay_sec have passed, return the last fee seen."""
+        clock = clock or Clock()
+        deadline = clock.monotonic() + max_delay_sec
+        while True:
+            await asyncio.to_thread(self.sample)
+            fee = self.current_fee()
+            if fee is None or fee <= threshold or stop_requested() or clock.monotonic() >= deadline:
+                return fee
+            await clock.sleep(min(settings.FEE_SAMPLE_INTERVAL_SEC, max(deadline - clock.monotonic(), 0)))
@@ -0,0 +1,78 @@
+# gas_estimate_cache.py
+from collections.abc import Mapping
+import config.settings as settings
+
+
+class GasEstimateCache:
+    """
+    Gas limits of the contract calls, shared by all the wallets of the process.
+
+    Calls are grouped by shape: blockchain, contract, function selector and the shape of the arguments (types,
+    lengths and zero/non-zero values, which drive the gas cost, but not the values themselves). The first call of
+    a shape is estimated, the next ones reuse the highest gas seen for the shape (estimate or gasUsed of the
+    receipts) plus a safety margin. A shape is estimated again after a revert or when a receipt uses noticeably
+    more gas than the cached value.
+    """
+
+    _instance = None
+
+    def __init__(self, margin=None, drift=None, max_entries=None):
+        self.margin = margin or settings.GAS_ESTIMATE_MARGIN
+        self.drift = drift or settings.GAS_ESTIMATE_DRIFT
+        self.max_entries = max_entries or settings.GAS_ESTIMATE_CACHE_SIZE
+        self.entries = {}  # {key: highest gas seen}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def get_shared(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def get_key(cls, blockchain, function_call, msg_value=None):
+        return (blockchain, function_call.address.lower(), function_call.selector,
+                cls.get_shape(function_call.args), cls.get_shape(function_call.kwargs), bool(msg_value))
+
+    @classmethod
+    def get_shape(cls, value):
+        if isinstance(value, Mapping):
+            return tuple((key, cls.get_shape(item)) for key, item in sorted(value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(cls.get_shape(item) for item in value)
+        if isinstance(value, (str, bytes)):
+            return type(value).__name__, len(value)
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, int):
+            # Writing a zero or a non-zero value doesn't cost the same
+            return "int", value != 0
+        return type(value).__name__
+
+    def get(self, key):
+        """Gas limit for a call of this shape, None when it has to be estimated."""
+        gas = self.entries.get(key)
+        if gas is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return int(gas * self.margin)
+
+    def store(self, key, gas):
+        if key not in self.entries and len(self.entries) >= self.max_entries:
+            # Forget the oldest shape
+            del self.entries[next(iter(self.entries))]
+        self.entries[key] = max(gas, self.entries.get(key, 0))
+
+    def observe_receipt(self, key, receipt):
+        """Learn from the receipt of a transaction sent with a gas limit of this shape."""
+        cached = self.entries.get(key)
+        if receipt["status"] != 1:
+            # The limit may have been too low, or the call fails for this wallet: estimate the next one again
+            self.entries.pop(key, None)
+        elif cached is not None and receipt["gasUsed"] > cached * (1 + self.drift):
+            # The cost of the shape went up and is eating the safety margin
+            self.entries.pop(key, None)
+        else:
+            self.store(key, receipt["gasUsed"])
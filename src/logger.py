@@ -7,6 +7,21 @@ import logging
 from logging.handlers import TimedRotatingFileHandler
 import requests
 
+SEPARATOR = "------------------------"
+
+
+class Lazy:
+    """Log argument computed only when the record is emitted, e.g. Lazy(self.get_token_name, token_address)."""
+
+    def __init__(self, function, *args, **kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def evaluate(self):
+        return self.function(*self.args, **self.kwargs)
+
+
 class Logger:
     def __init__(self, user_id=None, log_dir='logs', app_log=False):
         self.user_id = user_id
@@ -29,6 +44,8 @@ class Logger:
         log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         log_handler.setFormatter(log_formatter)
         self.logger.addHandler(log_handler)
+        self.level = logging.getLevelName(settings.LOG_LEVEL.upper())
+        self.echo = settings.LOG_TO_STDOUT
 
     def send_message_to_admins(self, message):
         base_url = f"https://api.telegram.org/bot{settings.TELEGRAM_TOKEN}/sendMessage"
@@ -87,6 +104,42 @@ class Logger:
                 log_file.write(f"[{timestamp}] {log_message}\n")
             self.delete_old_logs()
 
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        """
+        Format and write a record if its level is enabled, printing it too when LOG_TO_STDOUT is set.
+
+        The message is %-formatted with args only when the record is emitted, Lazy args are computed at that point.
+        """
+        if not self.is_enabled_for(level):
+            return
+        if args:
+            message = message % tuple(arg.evaluate() if isinstance(arg, Lazy) else arg for arg in args)
+        message = f"{logging.getLevelName(level)} - {message}"
+        if self.echo:
+            print(message)
+        self.add_log(message, level)
+
+    def debug(self, message, *args):
+        self.log(logging.DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.log(logging.INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(logging.WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.log(logging.ERROR, message, *args)
+
+    def separator(self):
+        if self.is_enabled_for(logging.INFO):
+            if self.echo:
+                print(SEPARATOR)
+            self.add_log(SEPARATOR)
+
     def get_logs(self, log_date=None):
         if log_date:
             log_filename = f"user_{self.user_id}_{log_date}.log"
@@ -0,0 +1,99 @@
+# metrics.py
+import time
+from urllib.parse import urlparse
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# Buckets in seconds, from fast RPC calls to long-running actions waiting for several blocks
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_BUCKETS = (1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+ACTION_DURATION = Histogram("airdropfarmer_action_duration_seconds", "Duration of an airdrop action",
+                            ["action", "blockchain"], buckets=SLOW_BUCKETS)
+ACTIONS = Counter("airdropfarmer_actions_total", "Executed airdrop actions by result",
+                  ["action", "blockchain", "status"])
+RPC_CALLS = Counter("airdropfarmer_rpc_calls_total", "JSON-RPC calls by endpoint and method",
+                    ["endpoint", "method"])
+RPC_ERRORS = Counter("airdropfarmer_rpc_errors_total", "Failed JSON-RPC calls by endpoint and method",
+                     ["endpoint", "method"])
+RPC_LATENCY = Histogram("airdropfarmer_rpc_latency_seconds", "JSON-RPC call latency by endpoint",
+                        ["endpoint"], buckets=FAST_BUCKETS)
+RECEIPT_WAIT = Histogram("airdropfarmer_receipt_wait_seconds", "Time waited for a transaction receipt",
+                         ["blockchain"], buckets=SLOW_BUCKETS)
+GAS_USED = Counter("airdropfarmer_gas_used_total", "Gas units used by mined transactions", ["blockchain"])
+GAS_SPENT = Counter("airdropfarmer_gas_spent_wei_total", "Fees paid by mined transactions in wei", ["blockchain"])
+TELEGRAM_HANDLER_LATENCY = Histogram("airdropfarmer_telegram_handler_latency_seconds",
+                                     "Time to process a Telegram update", ["update_type"], buckets=FAST_BUCKETS)
+DB_QUERY_LATENCY = Histogram("airdropfarmer_db_query_latency_seconds", "Database query latency",
+                             ["operation"], buckets=FAST_BUCKETS)
+VAULT_CALL_LATENCY = Histogram("airdropfarmer_vault_call_latency_seconds", "Vault call latency",
+                               ["operation"], buckets=FAST_BUCKETS)
+FARMING_QUEUE_DEPTH = Gauge("airdropfarmer_farming_queue_depth", "Farming runs waiting for a slot by tier", ["tier"])
+FARMING_QUEUE_WAIT = Histogram("airdropfarmer_farming_queue_wait_seconds", "Time a farming run waited for a slot",
+                               ["tier"], buckets=(0, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+FARMING_RUNS_ACTIVE = Gauge("airdropfarmer_farming_runs_active", "Farming runs currently executing by tier", ["tier"])
+
+
+def metrics_response():
+    """Return the body and the content type of the /metrics route."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def endpoint_label(endpoint_uri):
+    # Only keep the host so that API keys in the path never end up in the metrics
+    return urlparse(str(endpoint_uri)).hostname or "unknown"
+
+
+def sql_operation(query):
+    words = query.split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+def rpc_metrics_middleware(make_request, w3):
+    """Web3 middleware counting JSON-RPC calls, errors and latency per endpoint."""
+    endpoint = endpoint_label(getattr(w3.provider, "endpoint_uri", None))
+
+    def middleware(method, params):
+        RPC_CALLS.labels(endpoint, method).inc()
+        start_time = time.perf_counter()
+        try:
+            response = make_request(method, params)
+        except Exception:
+            RPC_ERRORS.labels(endpoint, method).inc()
+            raise
+        finally:
+            RPC_LATENCY.labels(endpoint).observe(time.perf_counter() - start_time)
+        if isinstance(response, dict) and "error" in response:
+            RPC_ERRORS.labels(endpoint, method).inc()
+        return response
+
+    return middleware
+
+
+def observe_receipt(blockchain, receipt, wait_time):
+    RECEIPT_WAIT.labels(blockchain).observe(wait_time)
+    gas_used = receipt.get("gasUsed") or 0
+    GAS_USED.labels(blockchain).inc(gas_used)
+    GAS_SPENT.labels(blockchain).inc(gas_used * (receipt.get("effectiveGasPrice") or 0))
+
+
+class TelegramLatencyMiddleware(BaseMiddleware):
+    """Measure the time spent by the bot handlers on each update."""
+
+    async def on_pre_process_update(self, update, data):
+        data["_metrics_start_time"] = time.perf_counter()
+
+    async def on_post_process_update(self, update, results, data):
+        start_time = data.get("_metrics_start_time")
+        if start_time is None:
+            return
+        if update.callback_query and update.callback_query.data:
+            update_type = f"callback_query:{update.callback_query.data.split(':')[0]}"
+        elif update.message and update.message.is_command():
+            # Commands typed by users are free text, they are not used as label values
+            update_type = "command"
+        elif update.message:
+            update_type = "message"
+        else:
+            update_type = "other"
+        TELEGRAM_HANDLER_LATENCY.labels(update_type).observe(time.perf_counter() - start_time)
@@ -0,0 +1,112 @@
+# quote_router.py
+import asyncio
+import json
+import os
+import httpx
+from eth_abi import decode
+from web3 import Web3
+import config.settings as settings
+from src.logger import Lazy
+from src.rpc_batch import RPCBatch, RPCBatchError
+
+# Enough of a Uniswap V2 style router to quote and swap, for the venues without an ABI file
+UNISWAP_V2_ROUTER_ABI = [
+    {"inputs": [{"name": "amountIn", "type": "uint256"}, {"name": "path", "type": "address[]"}],
+     "name": "getAmountsOut", "outputs": [{"name": "amounts", "type": "uint256[]"}], "stateMutability": "view",
+     "type": "function"},
+    {"inputs": [{"name": "amountIn", "type": "uint256"}, {"name": "amountOutMin", "type": "uint256"},
+                {"name": "path", "type": "address[]"}, {"name": "to", "type": "address"},
+                {"name": "deadline", "type": "uint256"}],
+     "name": "swapExactTokensForTokens", "outputs": [{"name": "amounts", "type": "uint256[]"}],
+     "stateMutability": "nonpayable", "type": "function"},
+]
+ABI_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'resources', 'abis')
+
+
+class QuoteRouter:
+    """
+    Quote a swap on every venue configured for a blockchain at the same time and keep the best output.
+
+    Each venue is quoted in its own task: on-chain routers with an eth_call ("uniswap_v2": getAmountsOut,
+    "mute": getAmountOut), aggregators through their API ("odos"). The venues that haven't answered when
+    QUOTE_LATENCY_BUDGET_SEC expires are cancelled, so quoting never takes longer than the budget.
+    """
+
+    _abis = {}
+
+    def __init__(self, blockchain, logger, venues=None, budget_sec=None):
+        self.blockchain = blockchain
+        self.logger = logger
+        self.venues = venues if venues is not None else settings.DEX_VENUES.get(blockchain, [])
+        self.budget_sec = budget_sec or settings.QUOTE_LATENCY_BUDGET_SEC
+        self.web3 = Web3()  # Only used to encode the calls
+
+    @classmethod
+    def get_abi(cls, venue):
+        if not venue.get("abi"):
+            return UNISWAP_V2_ROUTER_ABI
+        if isinstance(venue["abi"], list):
+            return venue["abi"]
+        if venue["abi"] not in cls._abis:
+            with open(os.path.join(ABI_DIRECTORY, venue["abi"]), 'r') as f:
+                cls._abis[venue["abi"]] = json.load(f)
+        return cls._abis[venue["abi"]]
+
+    async def get_best_quote(self, token_in, token_out, amount_in, wallet_address, extra_venues=()):
+        """Return the quote with the highest output ({"venue", "amount_out", ...}), None if no venue answered in time."""
+        venues = list(extra_venues) + list(self.venues)
+        if not venues:
+            return None
+        tasks = [asyncio.create_task(self.get_quote(venue, token_in, token_out, amount_in, wallet_address))
+                 for venue in venues]
+        done, pending = await asyncio.wait(tasks, timeout=self.budget_sec)
+        for task in pending:
+            task.cancel()
+
+        quotes = []
+        for venue, task in zip(venues, tasks):
+            if task in pending:
+                self.logger.warning("%s didn't quote within %s seconds", venue['name'], self.budget_sec)
+            elif task.exception() is not None:
+                self.logger.warning("%s quote failed: %s", venue['name'], task.exception())
+            elif task.result() is not None:
+                quotes.append(task.result())
+        if not quotes:
+            return None
+        best = max(quotes, key=lambda quote: quote["amount_out"])
+        self.logger.info("Quotes: %s. Best: %s", Lazy(lambda: ", ".join(f"{quote['venue']['name']}: {quote['amount_out']}"
+                                                                       for quote in quotes)), best['venue']['name'])
+        return best
+
+    async def get_quote(self, venue, token_in, token_out, amount_in, wallet_address):
+        if venue["type"] == "odos":
+            return await self.get_odos_quote(venue, token_in, token_out, amount_in, wallet_address)
+
+        contract = self.web3.eth.contract(address=Web3.to_checksum_address(venue["router"]), abi=self.get_abi(venue))
+        if venue["type"] == "mute":
+            data = contract.encodeABI(fn_name="getAmountOut", args=[amount_in, token_in, token_out])
+        else:
+            data = contract.encodeABI(fn_name="getAmountsOut", args=[amount_in, [token_in, token_out]])
+        batch = RPCBatch(self.blockchain)
+        batch.add("eth_call", [{"to": venue["router"], "data": data}, "latest"])
+        result = (await batch.execute())[0]
+        if isinstance(result, RPCBatchError):
+            raise result
+        if venue["type"] == "mute":
+            amount_out, stable, _ = decode(["uint256", "bool", "uint256"], bytes.fromhex(result[2:]))
+            return {"venue": venue, "amount_out": amount_out, "stable": stable}
+        amounts = decode(["uint256[]"], bytes.fromhex(result[2:]))[0]
+        return {"venue": venue, "amount_out": amounts[-1]}
+
+    async def get_odos_quote(self, venue, token_in, token_out, amount_in, wallet_address):
+        payload = {
+            "chainId": venue["chain_id"],
+            "inputTokens": [{"tokenAddress": token_in, "amount": str(amount_in)}],
+            "outputTokens": [{"tokenAddress": token_out, "proportion": 1}],
+            "userAddr": wallet_address,
+            "slippageLimitPercent": settings.ODOS_SLIPPAGE_PERCENT,
+        }
+        async with httpx.AsyncClient(timeout=self.budget_sec) as client:
+            response = await client.post(settings.ODOS_QUOTE_URL, json=payload)
+            response.raise_for_status()
+        return {"venue": venue, "amount_out": int(response.json()["outAmounts"][0]), "payload": payload}
@@ -0,0 +1,136 @@
+# reward_payouts.py
+import json
+import os
+from decimal import Decimal
+from eth_account import Account
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+import config.settings as settings
+from src.defi_handler import DeFiHandler
+
+ABI_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'resources', 'abis')
+
+
+class RewardPayouts:
+    """
+    Pay the claimed referral rewards in batches.
+
+    The unpaid rewards are summed by payout address and up to REWARD_PAYOUT_BATCH_SIZE recipients are paid by a
+    single disperseToken call of the multi-send contract, so a payout costs one approval and one transaction per
+    batch instead of one transaction per user. Each transaction is signed first and its hash recorded on its
+    rewards before it is broadcast, so that a reward is never paid twice: a transaction that isn't confirmed in
+    time is checked again by the next payout, before any new transaction is sent, and a hash the node doesn't
+    know was never broadcast, its rewards are paid again.
+    """
+
+    def __init__(self, db_manager, logger, blockchain=None, private_key=None, handler_factory=DeFiHandler):
+        self.db_manager = db_manager
+        self.logger = logger
+        self.blockchain = blockchain or settings.REWARD_PAYOUT_BLOCKCHAIN
+        private_key = private_key or settings.REWARD_PAYOUT_PRIVATE_KEY
+        self.wallet = {"address": Account.from_key(private_key).address, "private_key": private_key}
+        self.token_address = Web3.to_checksum_address(settings.REWARD_PAYOUT_TOKEN_ADDRESS)
+        self.multisend_address = Web3.to_checksum_address(settings.REWARD_PAYOUT_MULTISEND_ADDRESS)
+        self.handler_factory = handler_factory
+        with open(os.path.join(ABI_DIRECTORY, 'Disperse.json'), 'r') as f:
+            self.multisend_abi = json.load(f)
+
+    @staticmethod
+    def to_token_units(amount):
+        # The rewards are stored in USD, paid in a stablecoin
+        return int(Decimal(str(amount)) * 10 ** settings.REWARD_PAYOUT_TOKEN_DECIMALS)
+
+    async def pay_rewards(self):
+        """Pay all the unpaid claimed rewards, return the number of recipients paid."""
+        handler = self.handler_factory(self.blockchain, self.logger, False)
+        if not await self.check_sent_payouts(handler):
+            self.logger.warning("Reward payouts are waiting for a previous payout transaction, nothing was sent")
+            return 0
+
+        payouts = [payout for payout in await self.db_manager.get_unpaid_rewards()
+                   if self.to_token_units(payout['amount']) > 0]
+        if not payouts:
+            return 0
+        paid = 0
+        batch_size = settings.REWARD_PAYOUT_BATCH_SIZE
+        for start in range(0, len(payouts), batch_size):
+            batch = payouts[start:start + batch_size]
+            if not await self.pay_batch(handler, batch):
+                break
+            paid += len(batch)
+        self.logger.info(f"Paid the rewards of {paid} recipient(s) out of {len(payouts)}")
+        return paid
+
+    async def pay_batch(self, handler, payouts):
+        recipients = [Web3.to_checksum_address(payout['payout_address']) for payout in payouts]
+        values = [self.to_token_units(payout['amount']) for payout in payouts]
+        await handler.ensure_token_approval(self.wallet, self.token_address, self.multisend_address, sum(values))
+
+        contract = handler.web3.eth.contract(address=self.multisend_address, abi=self.multisend_abi)
+        function_call = contract.functions.disperseToken(self.token_address, recipients, values)
+        transaction = function_call.build_transaction({
+            "chainId": handler.web3.eth.chain_id,
+            "gas": int(function_call.estimate_gas({"from": self.wallet["address"]}) * settings.GAS_LIMIT_MARGIN),
+            **handler.get_fee_fields(),
+            "nonce": handler.get_nonce(self.wallet),
+            "value": 0,
+        })
+        signed_txn = handler.sign_transaction(self.wallet, transaction)
+        txn_hash = Web3.to_hex(signed_txn.hash)
+
+        # Recorded before broadcasting, a payout must never be sent twice
+        reward_ids = [reward_id for payout in payouts for reward_id in payout['reward_ids']]
+        try:
+            await self.db_manager.set_reward_payouts(reward_ids, [txn_hash] * len(reward_ids))
+        except Exception:
+            handler.release_nonce(self.wallet)
+            raise
+        try:
+            handler.send_signed_transaction(self.wallet, transaction, signed_txn)
+        except Exception as e:
+            self.logger.error(f"Reward payout transaction {txn_hash} could not be sent, its rewards will be paid again: {e}")
+            await self.db_manager.cancel_reward_payout(txn_hash)
+            return False
+        self.logger.info(f"Paying {len(recipients)} reward(s) with transaction {txn_hash}")
+        if await handler.wait_for_transaction_mined(txn_hash) is None:
+            return False
+        return await self.confirm_payout(handler, txn_hash)
+
+    async def check_sent_payouts(self, handler):
+        """Confirm or cancel the payouts sent by a previous payout, False if one of them is still pending."""
+        settled = True
+        for txn_hash in await self.db_manager.get_sent_reward_payouts():
+            settled = await self.confirm_payout(handler, txn_hash) and settled
+        return settled
+
+    async def confirm_payout(self, handler, txn_hash):
+        try:
+            receipt = handler.web3.eth.get_transaction_receipt(txn_hash)
+        except Exception:
+            if not self.was_broadcast(handler, txn_hash):
+                # Recorded but the process stopped before sending it, the rewards can be paid by a new transaction
+                self.logger.warning(f"Reward payout transaction {txn_hash} was never sent, its rewards will be paid again")
+                await self.db_manager.cancel_reward_payout(txn_hash)
+                # Its nonce is read from the chain again, so the new transaction takes it and only one can be mined
+                handler.release_nonce(self.wallet)
+                return True
+            # Not mined yet, or dropped: left for an admin to check rather than risking a second payment
+            self.logger.warning(f"Reward payout transaction {txn_hash} is still pending")
+            return False
+        if receipt["status"] == 1:
+            await self.db_manager.confirm_reward_payout(txn_hash)
+            return True
+        self.logger.error(f"Reward payout transaction {txn_hash} failed, its rewards will be paid again")
+        await self.db_manager.cancel_reward_payout(txn_hash)
+        return False
+
+    @staticmethod
+    def was_broadcast(handler, txn_hash):
+        # Only a hash unknown to the node counts as not sent, any other error may hide a pending transaction
+        try:
+            handler.web3.eth.get_transaction(txn_hash)
+        except TransactionNotFound:
+            return False
+        except Exception:
+            pass
+        return True
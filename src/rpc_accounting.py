@@ -0,0 +1,134 @@
+# rpc_accounting.py
+import itertools
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import numpy as np
+import config.settings as settings
+
+# Tags of the JSON-RPC calls made in the current context: run, user, wallet, airdrop and action
+RPC_TAGS = ContextVar("rpc_tags", default={})
+
+
+@contextmanager
+def tag_rpc_calls(**tags):
+    """Tag the JSON-RPC calls made inside the block, tasks started inside it included."""
+    token = RPC_TAGS.set({**RPC_TAGS.get(), **tags})
+    try:
+        yield
+    finally:
+        RPC_TAGS.reset(token)
+
+
+class RPCAccounting:
+    """
+    Count the JSON-RPC calls of the process by method and by action, from the web3 middleware and RPCBatch.
+
+    The latencies of the last RPC_LATENCY_SAMPLE_SIZE calls of each method are kept for the percentiles. A call
+    slower than RPC_SLOW_CALL_SEC is traced to the system log with its tags, and the calls made inside a run (see
+    start_run) are also counted for the summary written to the user's log at its end.
+    """
+
+    _instance = None
+
+    def __init__(self, slow_call_sec=None, sample_size=None, system_logger=None):
+        self.slow_call_sec = slow_call_sec or settings.RPC_SLOW_CALL_SEC
+        self.system_logger = system_logger
+        self.lock = threading.Lock()
+        self.calls = Counter()  # {method: calls}
+        self.errors = Counter()  # {method: failed calls}
+        self.latencies = defaultdict(lambda: deque(maxlen=sample_size or settings.RPC_LATENCY_SAMPLE_SIZE))
+        self.action_calls = Counter()  # {(airdrop, action): calls}
+        self.action_counts = Counter()  # {(airdrop, action): executions}
+        self.runs = {}
+        self.run_ids = itertools.count(1)
+
+    @classmethod
+    def get_shared(cls):
+        """Return the accounting of the process, shared by all the connections and runs."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def observe(self, blockchain, method, latency, failed=False):
+        tags = RPC_TAGS.get()
+        action = (tags["airdrop"], tags["action"]) if "action" in tags else None
+        with self.lock:
+            self.calls[method] += 1
+            if failed:
+                self.errors[method] += 1
+            self.latencies[method].append(latency)
+            if action is not None:
+                self.action_calls[action] += 1
+            run = self.runs.get(tags.get("run"))
+            if run is not None:
+                run["methods"][method] += 1
+                run["latency"] += latency
+                if action is not None:
+                    run["actions"][action] += 1
+        if latency >= self.slow_call_sec and self.system_logger is not None:
+            context = ", ".join(f"{key}: {value}" for key, value in tags.items())
+            self.system_logger.add_log(f"WARNING - Slow RPC call: {method} on {blockchain} took {latency:.2f} s"
+                                       f"{f' ({context})' if context else ''}", logging.WARNING)
+
+    def count_action(self, airdrop, action):
+        with self.lock:
+            self.action_counts[(airdrop, action)] += 1
+
+    def start_run(self):
+        """Start counting the calls tagged with the returned run id."""
+        run_id = next(self.run_ids)
+        with self.lock:
+            self.runs[run_id] = {"methods": Counter(), "actions": Counter(), "latency": 0.0}
+        return run_id
+
+    def finish_run(self, run_id):
+        """Stop counting the calls of a run and return them."""
+        with self.lock:
+            return self.runs.pop(run_id, None)
+
+    def middleware(self, blockchain):
+        """Web3 middleware counting the calls of a blockchain."""
+        def rpc_accounting_middleware(make_request, w3):
+            def middleware(method, params):
+                start_time = time.perf_counter()
+                failed = True
+                try:
+                    response = make_request(method, params)
+                    failed = isinstance(response, dict) and "error" in response
+                    return response
+                finally:
+                    self.observe(blockchain, method, time.perf_counter() - start_time, failed)
+
+            return middleware
+
+        return rpc_accounting_middleware
+
+    def get_stats(self):
+        """Calls, errors and latency percentiles in seconds of each method, the most called first."""
+        with self.lock:
+            samples = {method: np.array(latencies) for method, latencies in self.latencies.items()}
+            stats = []
+            for method, calls in self.calls.most_common():
+                p50, p95, p99 = np.percentile(samples[method], [50, 95, 99]) if len(samples[method]) else (0, 0, 0)
+                stats.append({"method": method, "calls": calls, "errors": self.errors[method],
+                              "p50": p50, "p95": p95, "p99": p99})
+            return stats
+
+    def get_action_stats(self):
+        """Calls made by each (airdrop, action) and the average per execution, the most called first."""
+        with self.lock:
+            return [{"airdrop": airdrop, "action": action, "calls": calls,
+                     "per_action": calls / max(self.action_counts[(airdrop, action)], 1)}
+                    for (airdrop, action), calls in self.action_calls.most_common()]
+
+    @staticmethod
+    def format_run(run):
+        lines = [f"RPC calls of the run: {sum(run['methods'].values())}, {run['latency']:.2f} s spent waiting for them"]
+        for (airdrop, action), calls in run["actions"].most_common():
+            lines.append(f"  {airdrop} / {action.replace('_', ' ')}: {calls}")
+        lines.append("  By method: " + ", ".join(f"{method} {calls}" for method, calls in run["methods"].most_common()))
+        return "\n".join(lines)
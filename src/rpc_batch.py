@@ -0,0 +1,118 @@
+# rpc_batch.py
+import asyncio
+import time
+import httpx
+import config.settings as settings
+from src.rpc_accounting import RPCAccounting
+from src.rpc_cassette import CassetteMissError, RPCCassette
+
+
+class RPCBatchError(Exception):
+    def __init__(self, method, error):
+        self.method = method
+        self.error = error
+        super().__init__(f"{method} failed: {error}")
+
+
+class RPCBatch:
+    """
+    Collect JSON-RPC calls for one blockchain and send them as batched HTTP requests.
+
+    Results are returned in the order the calls were added. A failed call does not fail the
+    whole batch: its slot contains an RPCBatchError instead of the result.
+    """
+
+    def __init__(self, blockchain, timeout=None):
+        try:
+            self.endpoint = settings.BLOCKCHAIN_SETTINGS[blockchain]['endpoint']
+        except KeyError:
+            raise ValueError(f"Settings for blockchain '{blockchain}' not found.")
+        self.blockchain = blockchain
+        self.timeout = timeout if timeout is not None else settings.RPC_BATCH_TIMEOUT
+        self.cassette = RPCCassette.get(blockchain)
+        self.calls = []
+
+    def __len__(self):
+        return len(self.calls)
+
+    def add(self, method, params=None):
+        """Queue a call and return its index in the results list."""
+        self.calls.append((method, params if params is not None else []))
+        return len(self.calls) - 1
+
+    async def execute(self):
+        if not self.calls:
+            return []
+
+        chunk_size = settings.RPC_BATCH_MAX_SIZE
+        chunks = [range(i, min(i + chunk_size, len(self.calls))) for i in range(0, len(self.calls), chunk_size)]
+        results = [None] * len(self.calls)
+
+        start_time = time.perf_counter()
+        if self.cassette is not None and self.cassette.replaying:
+            responses = [await self._replay_chunk(chunk) for chunk in chunks]
+        else:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                responses = await asyncio.gather(*[self._send_chunk(client, chunk) for chunk in chunks],
+                                                 return_exceptions=True)
+        # The chunks are sent concurrently, each call took about the time of the whole batch
+        latency = time.perf_counter() - start_time
+
+        for chunk, response in zip(chunks, responses):
+            for index in chunk:
+                method = self.calls[index][0]
+                if isinstance(response, Exception):
+                    results[index] = RPCBatchError(method, response)
+                elif index not in response:
+                    results[index] = RPCBatchError(method, "missing response")
+                elif "error" in response[index]:
+                    results[index] = RPCBatchError(method, response[index]["error"])
+                else:
+                    results[index] = response[index].get("result")
+
+        accounting = RPCAccounting.get_shared()
+        for (method, _), result in zip(self.calls, results):
+            accounting.observe(self.blockchain, method, latency, isinstance(result, RPCBatchError))
+        self.calls = []
+        return results
+
+    async def _send_chunk(self, client, chunk):
+        payload = [{"jsonrpc": "2.0", "id": index, "method": self.calls[index][0], "params": self.calls[index][1]}
+                   for index in chunk]
+        start_time = time.perf_counter()
+        response = await client.post(self.endpoint, json=payload)
+        response.raise_for_status()
+        body = response.json()
+        # Some endpoints answer a batch containing a single call with a bare object
+        if isinstance(body, dict):
+            body = [body]
+        items = {item["id"]: item for item in body if isinstance(item, dict) and "id" in item}
+        if self.cassette is not None:
+            latency = time.perf_counter() - start_time
+            for index in chunk:
+                if index in items:
+                    self.cassette.record(self.calls[index][0], self.calls[index][1], items[index], latency)
+        return items
+
+    async def _replay_chunk(self, chunk):
+        items = {}
+        delay = 0
+        for index in chunk:
+            method, params = self.calls[index]
+            try:
+                entry = self.cassette.find(method, params)
+            except CassetteMissError as e:
+                items[index] = {"error": str(e)}
+                continue
+            items[index] = entry["r"]
+            delay = max(delay, self.cassette.get_delay(entry))
+        # The calls of a chunk share a single round trip
+        await asyncio.sleep(delay)
+        return items
+
+
+def to_int(value):
+    """Convert a hex quantity returned by a JSON-RPC call to an int."""
+    if value is None or isinstance(value, RPCBatchError) or value == "0x":
+        return None
+    return int(value, 16) if isinstance(value, str) else int(value)
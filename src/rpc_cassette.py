@@ -0,0 +1,198 @@
+# rpc_cassette.py
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from web3 import Web3
+from web3.providers.base import BaseProvider
+import config.settings as settings
+from src.metrics import rpc_metrics_middleware
+from src.rpc_accounting import RPCAccounting
+
+CASSETTES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', settings.RPC_CASSETTE_DIRECTORY)
+
+
+class CassetteMissError(Exception):
+    def __init__(self, blockchain, method, params):
+        self.method = method
+        super().__init__(f"No recorded response for {method} {json.dumps(params, default=to_json)} on {blockchain}")
+
+
+def to_json(value):
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    if hasattr(value, "items"):
+        return dict(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class RPCCassette:
+    """
+    JSON-RPC calls of a blockchain recorded to a file, to run the action code offline.
+
+    In "record" mode every request and its raw response are appended to <RPC_CASSETTE_DIRECTORY>/<blockchain>.jsonl,
+    one compact JSON line per call with its latency. In "replay" mode the file is loaded and the calls are answered
+    from it: first the unused recordings of the same method and params in their recorded order (so that a polled
+    receipt goes through the same states), then the last response given for these params, and then the next unused
+    recording of the method, for calls whose params change from one run to the next (deadlines, signatures).
+    RPC_CASSETTE_LATENCY delays each replayed answer by a fixed number of seconds or by its recorded latency.
+    """
+
+    _cassettes = {}
+    _lock = threading.Lock()
+
+    def __init__(self, blockchain, mode, path, latency="0"):
+        self.blockchain = blockchain
+        self.mode = mode
+        self.path = path
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = Counter()  # Calls by method, recorded or replayed
+        self.by_params = defaultdict(deque)
+        self.by_method = defaultdict(deque)
+        self.last = {}
+        if mode == "replay":
+            self.load()
+        elif mode == "record":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    @classmethod
+    def get(cls, blockchain):
+        """Return the cassette of a blockchain for RPC_CASSETTE_MODE, None when cassettes are off."""
+        if settings.RPC_CASSETTE_MODE not in ("record", "replay"):
+            return None
+        if blockchain not in cls._cassettes:
+            with cls._lock:
+                if blockchain not in cls._cassettes:
+                    cls._cassettes[blockchain] = cls(blockchain, settings.RPC_CASSETTE_MODE,
+                                                     os.path.join(CASSETTES_DIRECTORY, f"{blockchain}.jsonl"),
+                                                     settings.RPC_CASSETTE_LATENCY)
+        return cls._cassettes[blockchain]
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    @staticmethod
+    def get_key(method, params):
+        return method + json.dumps(params, sort_keys=True, separators=(",", ":"), default=to_json)
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entry["used"] = False
+                    self.by_params[self.get_key(entry["m"], entry["p"])].append(entry)
+                    self.by_method[entry["m"]].append(entry)
+
+    def record(self, method, params, response, latency):
+        line = json.dumps({"m": method, "p": params, "r": response, "t": round(latency, 4)},
+                          separators=(",", ":"), default=to_json)
+        with self.lock:
+            self.calls[method] += 1
+            with open(self.path, 'a') as f:
+                f.write(line + "\n")
+
+    @staticmethod
+    def next_unused(queue):
+        while queue and queue[0]["used"]:
+            queue.popleft()
+        if not queue:
+            return None
+        entry = queue.popleft()
+        entry["used"] = True
+        return entry
+
+    def find(self, method, params):
+        key = self.get_key(method, params)
+        with self.lock:
+            self.calls[method] += 1
+            entry = self.next_unused(self.by_params.get(key))
+            if entry is None:
+                # All the recordings of these params were used: give the last answer again, e.g. a mined receipt
+                entry = self.last.get(key) or self.next_unused(self.by_method.get(method))
+            if entry is None:
+                raise CassetteMissError(self.blockchain, method, params)
+            self.last[key] = entry
+            return entry
+
+    def get_delay(self, entry):
+        if self.latency == "recorded":
+            return entry.get("t", 0)
+        return float(self.latency or 0)
+
+    def replay(self, method, params):
+        """Recorded response of a call, after the configured latency."""
+        entry = self.find(method, params)
+        delay = self.get_delay(entry)
+        if delay:
+            time.sleep(delay)
+        return entry["r"]
+
+    def middleware(self, make_request, w3):
+        """Web3 middleware recording the raw responses, to add as the innermost middleware."""
+        def middleware(method, params):
+            start_time = time.perf_counter()
+            response = make_request(method, params)
+            self.record(method, params, response, time.perf_counter() - start_time)
+            return response
+
+        return middleware
+
+
+class CassetteProvider(BaseProvider):
+    """Web3 provider answering from a cassette, without any network access."""
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+        self.endpoint_uri = f"cassette://{cassette.blockchain}"
+
+    def make_request(self, method, params):
+        return self.cassette.replay(method, params)
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def create_web3(blockchain, provider=None):
+    """
+    Connect to a blockchain with the metrics and accounting middlewares, through its cassette when RPC_CASSETTE_MODE
+    is set, or through provider when given (e.g. the mock chain of the simulator).
+    """
+    cassette = RPCCassette.get(blockchain) if provider is None else None
+    if provider is not None:
+        web3 = Web3(provider)
+    elif cassette is not None and cassette.replaying:
+        web3 = Web3(CassetteProvider(cassette))
+    else:
+        web3 = Web3(Web3.HTTPProvider(settings.BLOCKCHAIN_SETTINGS[blockchain]['endpoint']))
+    web3.middleware_onion.add(rpc_metrics_middleware, name="metrics")
+    web3.middleware_onion.add(RPCAccounting.get_shared().middleware(blockchain), name="accounting")
+    if cassette is not None and not cassette.replaying:
+        web3.middleware_onion.add(cassette.middleware, name="cassette")
+    return web3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a recorded JSON-RPC cassette")
+    parser.add_argument("path", help="Cassette file, e.g. cassettes/goerli.jsonl")
+    args = parser.parse_args()
+
+    calls = Counter()
+    latency = Counter()
+    with open(args.path, 'r') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                calls[entry["m"]] += 1
+                latency[entry["m"]] += entry.get("t", 0)
+    print(f"RPC calls: {sum(calls.values())} - Recorded latency: {sum(latency.values()):.2f} s")
+    for method, count in calls.most_common():
+        print(f"  {method}: {count} ({latency[method] / count * 1000:.1f} ms average)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+# run_planner.py
+import asyncio
+from collections.abc import Mapping
+from web3 import Web3
+import config.settings as settings
+from src.airdrop_spec import thaw
+from src.rpc_batch import RPCBatch, RPCBatchError, to_int
+
+WALLET_PLACEHOLDER = "<WALLET_ADDRESS>"
+BALANCE_OF_ABI = [{"constant": True, "inputs": [{"name": "_owner", "type": "address"}], "name": "balanceOf",
+                   "outputs": [{"name": "balance", "type": "uint256"}], "type": "function"}]
+
+
+class RunPlanner:
+    """
+    Dry-run of a farming run: estimate gas, cost and duration without sending any transaction.
+
+    All chain reads are grouped per blockchain and sent as batched JSON-RPC requests, so the plan
+    for many wallets and actions only costs one round-trip per chain.
+    """
+
+    def __init__(self, airdrops, wallets, logger):
+        self.airdrops = airdrops
+        self.wallets = wallets
+        self.logger = logger
+        self.web3 = Web3()  # Only used to encode calls, never connected
+
+    async def plan(self):
+        steps = self.collect_steps()
+        chains, chain_results = await self.estimate_chains(steps)
+
+        plan = {
+            "airdrops": [airdrop["name"] for airdrop in self.airdrops],
+            "wallet_count": len(self.wallets),
+            "action_count": len(steps),
+            "chains": {},
+            "wallets": [],
+        }
+        for chain, result in zip(chains, chain_results):
+            plan["chains"][chain] = {
+                "gas_price": result["gas_price"],
+                "total_gas": result["total_gas"],
+                "total_cost": result["total_cost"],
+            }
+            plan["wallets"].extend(result["wallets"])
+        plan["duration_min_sec"], plan["duration_max_sec"] = self.project_duration()
+        plan["underfunded_wallets"] = [wallet for wallet in plan["wallets"] if not wallet["sufficient"]]
+
+        self.logger.info("Run plan: %s actions on %s chain(s), %s underfunded wallet(s)", plan['action_count'],
+                         len(chains), len(plan['underfunded_wallets']))
+        return plan
+
+    async def estimate_chains(self, steps):
+        chains = sorted({step["blockchain"] for step in steps})
+        chain_results = await asyncio.gather(*[self.estimate_chain(chain, [s for s in steps if s["blockchain"] == chain])
+                                               for chain in chains])
+        return chains, chain_results
+
+    async def find_unaffordable_airdrops(self):
+        """
+        Check the native and token balances of every wallet against the amounts and gas of the run.
+
+        Airdrops are admitted in order for each wallet, as long as the remaining balances on every chain cover them.
+        An airdrop that doesn't fit is skipped and the next ones are still considered, so a cheaper airdrop can run
+        even if an expensive one can't. A token bought by an action (e.g. swap_native_token, then add_liquidity) is
+        not checked for the following actions of the airdrop, nor for the next airdrops once it is admitted: the
+        amount received is only known after the swap. Returns {(wallet address in lowercase, airdrop name): reason}.
+        """
+        steps = self.collect_steps()
+        chains, chain_results = await self.estimate_chains(steps)
+        gas_prices = {chain: result["gas_price"] for chain, result in zip(chains, chain_results)}
+        # Remaining budget per (wallet, chain, asset), asset is None for the native token
+        budgets = {}
+        for result in chain_results:
+            for wallet in result["wallets"]:
+                budgets[(wallet["address"], wallet["blockchain"], None)] = wallet["balance"]
+                for token, balance in wallet["token_balances"].items():
+                    budgets[(wallet["address"], wallet["blockchain"], token)] = balance
+
+        requirements = {}
+        produced = {}  # Token keys received by the actions of each (wallet, airdrop), in the order of the actions
+        for step in steps:
+            requirement = requirements.setdefault((step["wallet"], step["airdrop"]), {})
+            outputs = produced.setdefault((step["wallet"], step["airdrop"]), set())
+            native_key = (step["wallet"], step["blockchain"], None)
+            requirement[native_key] = requirement.get(native_key, 0) + step["value"] + \
+                step["gas"] * gas_prices[step["blockchain"]]
+            for token, amount in step["tokens"]:
+                token_key = (step["wallet"], step["blockchain"], token)
+                if token_key not in outputs:
+                    requirement[token_key] = requirement.get(token_key, 0) + amount
+            outputs.update((step["wallet"], step["blockchain"], token) for token in step["produced_tokens"])
+
+        unaffordable = {}
+        for wallet in self.wallets:
+            address = self.web3.to_checksum_address(wallet["public_key"])
+            for airdrop in self.airdrops:
+                requirement = requirements.get((address, airdrop["name"]), {})
+                # A balance that couldn't be read doesn't prune anything, the action will report the error itself
+                missing = [key for key, amount in requirement.items()
+                           if budgets.get(key) is not None and budgets[key] < amount]
+                if missing:
+                    _, blockchain, token = missing[0]
+                    unaffordable[(address.lower(), airdrop["name"])] = \
+                        f"insufficient {'native token' if token is None else token} balance on {blockchain}"
+                    continue
+                for key, amount in requirement.items():
+                    if budgets.get(key) is not None:
+                        budgets[key] -= amount
+                for key in produced.get((address, airdrop["name"]), ()):
+                    budgets[key] = None
+
+        self.logger.info("Balance pre-check: %s wallet/airdrop pair(s) can't be funded", len(unaffordable))
+        return unaffordable
+
+    def collect_steps(self):
+        """Flatten the run into one step per (wallet, DeFi action)."""
+        steps = []
+        for airdrop in self.airdrops:
+            for action in airdrop["actions"]:
+                if not action["isActivated"] or action["platform"] != "defi":
+                    continue
+                for wallet in self.wallets:
+                    address = self.web3.to_checksum_address(wallet["public_key"])
+                    call, value = self.build_call(action, address)
+                    steps.append({
+                        "tokens": self.get_required_tokens(action),
+                        "produced_tokens": self.get_produced_tokens(action),
+                        "airdrop": airdrop["name"],
+                        "action": action["action"],
+                        "blockchain": action["blockchain"],
+                        "wallet": address,
+                        "call": call,
+                        "value": value,
+                    })
+        return steps
+
+    def build_call(self, action, address):
+        """
+        Build the call to estimate for an action.
+        Returns (call, value) where call is None for multi-transaction actions that use a default gas limit.
+        """
+        action_type = action["action"]
+        if action_type == "transfer_native_token":
+            value = int(action["amount_in_wei"])
+            return {"from": address, "to": self.web3.to_checksum_address(action["recipient_address"].strip('"')),
+                    "value": hex(value)}, value
+        if action_type == "interact_with_contract":
+            value = int(action.get("msg_value") or 0)
+            contract = self.web3.eth.contract(address=self.web3.to_checksum_address(action["contract_address"]),
+                                              abi=thaw(action["abi"]))
+            function_args = fill_wallet_placeholder(action.get("function_args", {}), address, self.web3)
+            data = contract.encodeABI(fn_name=action["function_name"], kwargs=function_args)
+            return {"from": address, "to": contract.address, "value": hex(value), "data": data}, value
+        if action_type == "swap_native_token":
+            return None, int(action["amount_in_wei"])
+        if action_type == "swap_tokens_with_steps" and action.get("token_in") == "ETH":
+            return None, int(action["amount_in"])
+        if action_type == "add_liquidity" and action.get("is_native"):
+            return None, int(1.5 * int(action["amount_b_desired"]))
+        return None, 0
+
+    def get_required_tokens(self, action):
+        """Return the (token address, amount) pairs an action spends from the wallet."""
+        action_type = action["action"]
+        if action_type == "swap_tokens":
+            return [(self.token_address(action["token_address"]), int(action["amount_in_wei"]))]
+        if action_type == "transfer_token":
+            return [(self.token_address(action["token_address"]), int(action["amount"]))]
+        if action_type == "swap_tokens_with_steps" and action.get("token_in") != "ETH":
+            return [(self.token_address(action["token_in"]), int(action["amount_in"]))]
+        if action_type == "add_liquidity":
+            tokens = [(self.token_address(action["token_a_address"]), int(action["amount_a_desired"]))]
+            if not action.get("is_native") and action.get("token_b_address"):
+                tokens.append((self.token_address(action["token_b_address"]), int(action["amount_b_desired"])))
+            return tokens
+        return []
+
+    def get_produced_tokens(self, action):
+        """Return the addresses of the tokens an action adds to the wallet."""
+        action_type = action["action"]
+        if action_type == "swap_native_token":
+            return [self.token_address(action["token_address"])]
+        if action_type == "swap_tokens":
+            return [self.token_address(action["token_out_address"])]
+        if action_type == "remove_liquidity":
+            tokens = [self.token_address(action["token_a_address"])]
+            if not action.get("is_native") and action.get("token_b_address"):
+                tokens.append(self.token_address(action["token_b_address"]))
+            return tokens
+        return []
+
+    def token_address(self, address):
+        return self.web3.to_checksum_address(address.strip('"'))
+
+    async def estimate_chain(self, blockchain, steps):
+        batch = RPCBatch(blockchain)
+        gas_price_index = batch.add("eth_gasPrice")
+        addresses = sorted({step["wallet"] for step in steps})
+        balance_indexes = {address: batch.add("eth_getBalance", [address, "latest"]) for address in addresses}
+        estimate_indexes = [batch.add("eth_estimateGas", [step["call"]]) if step["call"] else None for step in steps]
+        token_balance_indexes = {}
+        for step in steps:
+            for token, _ in step["tokens"]:
+                if (step["wallet"], token) not in token_balance_indexes:
+                    token_balance_indexes[(step["wallet"], token)] = batch.add(
+                        "eth_call", [self.build_balance_call(token, step["wallet"]), "latest"])
+
+        try:
+            results = await batch.execute()
+        except Exception as e:
+            self.logger.error("Could not fetch plan data from %s: %s", blockchain, e)
+            results = [RPCBatchError("batch", e)] * len(batch)
+
+        gas_price = to_int(results[gas_price_index]) or 0
+        default_gas = settings.PLAN_DEFAULT_GAS_LIMITS
+        per_wallet = {address: {"gas": 0, "value": 0, "estimated": True} for address in addresses}
+        for step, index in zip(steps, estimate_indexes):
+            gas = to_int(results[index]) if index is not None else None
+            if gas is None:
+                gas = default_gas.get(step["action"], default_gas["default"])
+                # Only a failed estimate makes the projection uncertain, default limits are expected
+                if index is not None:
+                    per_wallet[step["wallet"]]["estimated"] = False
+            step["gas"] = gas
+            per_wallet[step["wallet"]]["gas"] += gas
+            per_wallet[step["wallet"]]["value"] += step["value"]
+
+        wallets = []
+        for address in addresses:
+            balance = to_int(results[balance_indexes[address]])
+            gas_cost = per_wallet[address]["gas"] * gas_price
+            required = gas_cost + per_wallet[address]["value"]
+            wallets.append({
+                "address": address,
+                "blockchain": blockchain,
+                "balance": balance,
+                "gas": per_wallet[address]["gas"],
+                "gas_cost": gas_cost,
+                "required": required,
+                "estimated": per_wallet[address]["estimated"],
+                "sufficient": balance is not None and balance >= required,
+                "token_balances": {token: to_int(results[index])
+                                   for (wallet_address, token), index in token_balance_indexes.items()
+                                   if wallet_address == address},
+            })
+
+        total_gas = sum(wallet["gas"] for wallet in wallets)
+        return {"gas_price": gas_price, "total_gas": total_gas, "total_cost": total_gas * gas_price,
+                "wallets": wallets}
+
+    def build_balance_call(self, token, address):
+        contract = self.web3.eth.contract(address=token, abi=BALANCE_OF_ABI)
+        return {"to": token, "data": contract.encodeABI(fn_name="balanceOf", args=[address])}
+
+    def project_duration(self):
+        """Project the wall-clock time of the run from the configured waits, as a (min, max) range in seconds."""
+        transactions = 0
+        action_waits = 0
+        for airdrop in self.airdrops:
+            actions = [action for action in airdrop["actions"] if action["isActivated"]]
+            if not actions:
+                continue
+            transactions += len([action for action in actions if action["platform"] == "defi"]) * len(self.wallets)
+            # The executor waits between two actions of the same wallet, not after the last one
+            action_waits += (len(actions) - 1) * len(self.wallets)
+        airdrop_waits = max(len(self.airdrops) - 1, 0)
+
+        confirmation_time = transactions * settings.PLAN_CONFIRMATION_SEC
+        waits = action_waits + airdrop_waits
+        return (confirmation_time + waits * settings.MIN_WAITING_SEC,
+                confirmation_time + waits * settings.MAX_WAITING_SEC)
+
+
+def fill_wallet_placeholder(obj, address, web3):
+    """Return a plain copy of obj (see thaw) where the wallet placeholder is replaced and addresses are checksummed."""
+    if isinstance(obj, Mapping):
+        return {key: fill_wallet_placeholder(value, address, web3) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [fill_wallet_placeholder(value, address, web3) for value in obj]
+    if obj == WALLET_PLACEHOLDER:
+        return address
+    if isinstance(obj, str) and len(obj) == 42 and obj.startswith("0x") and web3.is_address(obj):
+        return web3.to_checksum_address(obj)
+    return obj
@@ -3,6 +3,7 @@ import logging
 from datetime import datetime
 from typing import Optional
 import hvac
+from src.metrics import VAULT_CALL_LATENCY
 
 
 class SecretsManager:
@@ -26,55 +27,60 @@ class SecretsManager:
 
     async def store_wallet(self, user_id: str, wallet: dict):
         try:
-            existing_wallets = self.get_wallet(user_id)
+            existing_wallets = await self.get_wallet(user_id)
             if existing_wallets is None:
                 # No existing wallets, create new secret
                 self.logger.add_log(f"Creating new secret for user {user_id}", logging.INFO)
-                self.client.secrets.kv.v1.create_or_update_secret(
-                    path=f'users/{user_id}/wallets',
-                    secret={'wallets': [wallet]},
-                    mount_point='secret',
-                )
+                with VAULT_CALL_LATENCY.labels("store_wallet").time():
+                    self.client.secrets.kv.v1.create_or_update_secret(
+                        path=f'users/{user_id}/wallets',
+                        secret={'wallets': [wallet]},
+                        mount_point='secret',
+                    )
             else:
                 # Existing wallets found, append new wallet and update secret
                 self.logger.add_log(f"Updating existing secret for user {user_id}", logging.INFO)
                 existing_wallets.append(wallet)
-                self.client.secrets.kv.v1.create_or_update_secret(
-                    path=f'users/{user_id}/wallets',
-                    secret={'wallets': existing_wallets},
-                    mount_point='secret',
-                )
+                with VAULT_CALL_LATENCY.labels("store_wallet").time():
+                    self.client.secrets.kv.v1.create_or_update_secret(
+                        path=f'users/{user_id}/wallets',
+                        secret={'wallets': existing_wallets},
+                        mount_point='secret',
+                    )
         except Exception as e:
             raise e
 
     async def delete_wallet(self, user_id: str, wallet: dict):
         try:
-            existing_wallets = self.get_wallet(user_id) or []
+            existing_wallets = await self.get_wallet(user_id) or []
             if wallet in existing_wallets:
                 existing_wallets.remove(wallet)
                 if existing_wallets:
                     # If there are other wallets, overwrite with the updated list
-                    self.client.secrets.kv.v1.create_or_update_secret(
-                        path=f'users/{user_id}/wallets',
-                        secret={'wallets': existing_wallets},
-                        mount_point='secret',
-                    )
+                    with VAULT_CALL_LATENCY.labels("delete_wallet").time():
+                        self.client.secrets.kv.v1.create_or_update_secret(
+                            path=f'users/{user_id}/wallets',
+                            secret={'wallets': existing_wallets},
+                            mount_point='secret',
+                        )
                 else:
                     # If there are no other wallets, delete the secret
-                    self.client.secrets.kv.v1.delete_secret(
-                        path=f'users/{user_id}/wallets',
-                        mount_point='secret',
-                    )
+                    with VAULT_CALL_LATENCY.labels("delete_wallet").time():
+                        self.client.secrets.kv.v1.delete_secret(
+                            path=f'users/{user_id}/wallets',
+                            mount_point='secret',
+                        )
         except Exception as e:
             raise e
 
     async def get_wallet(self, user_id: str) -> Optional[list]:
         try:
             # Proceed with retrieval.
-            read_response = self.client.secrets.kv.v1.read_secret(
-                path=f'users/{user_id}/wallets',
-                mount_point='secret',
-            )
+            with VAULT_CALL_LATENCY.labels("get_wallet").time():
+                read_response = self.client.secrets.kv.v1.read_secret(
+                    path=f'users/{user_id}/wallets',
+                    mount_point='secret',
+                )
             if read_response and 'data' in read_response:
                 wallets = read_response['data'].get('wallets', [])
                 if wallets:
@@ -0,0 +1,32 @@
+# signer_cache.py
+from eth_account import Account
+from eth_keys import keys
+
+
+class SignerCache:
+    """
+    Parsed private keys of the wallets of a run, so that each key is decoded and its public key derived only once.
+
+    eth_account derives the public key again whenever it is given a hex key (LocalAccount objects included, they
+    re-parse their key bytes on every signature), while an eth_keys PrivateKey is used as is. The cache belongs to
+    a single run and is cleared when the run ends.
+    """
+
+    def __init__(self):
+        self.private_keys = {}  # {lowercase address: PrivateKey}
+
+    def get_private_key(self, wallet):
+        address = wallet["address"].lower()
+        private_key = self.private_keys.get(address)
+        if private_key is None:
+            private_key = keys.PrivateKey(bytes.fromhex(wallet["private_key"].removeprefix("0x")))
+            if private_key.public_key.to_checksum_address().lower() != address:
+                raise ValueError(f"The private key doesn't match the wallet {wallet['address']}")
+            self.private_keys[address] = private_key
+        return private_key
+
+    def sign_transaction(self, wallet, transaction):
+        return Account.sign_transaction(transaction, self.get_private_key(wallet))
+
+    def clear(self):
+        self.private_keys.clear()
@@ -0,0 +1,286 @@
+# simulator.py
+"""
+Capacity-planning benchmark for the farming engine.
+
+Runs full farming schedules for synthetic users in virtual time and reports throughput, peak memory and
+RPC call counts. The real DeFiHandler and chain actors send their JSON-RPC calls to an in-memory mock chain,
+and the calls are counted by RPCAccounting like in production. Waits between actions and receipt polling
+take no real time, so a run of several hours completes in seconds.
+
+Usage: python -m src.simulator --users 100 --wallets 10
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import time
+import threading
+import tracemalloc
+from collections import Counter
+
+import rlp
+from eth_abi import decode, encode
+from eth_account import Account
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from config import settings
+from src.airdrop_execution import AirdropExecution
+from src.chain_actor import ChainActor
+from src.clock import VirtualClock
+from src.rpc_accounting import RPCAccounting
+from src.rpc_cassette import create_web3
+
+GAS_PRICE = 10 ** 9
+SELECTORS = {Web3.keccak(text=signature)[:4]: name for name, signature in {
+    "allowance": "allowance(address,address)",
+    "balanceOf": "balanceOf(address)",
+    "decimals": "decimals()",
+    "name": "name()",
+    "getAmountsOut": "getAmountsOut(uint256,address[])",
+    "minimum_transfer_amount": "minimum_transfer_amount()",
+}.items()}
+
+
+class NullLogger:
+    """Drops every record, the Lazy arguments of the records are never computed."""
+
+    def add_log(self, message, level=None):
+        pass
+
+    def is_enabled_for(self, level):
+        return False
+
+    def log(self, level, message, *args):
+        pass
+
+    def debug(self, message, *args):
+        pass
+
+    def info(self, message, *args):
+        pass
+
+    def warning(self, message, *args):
+        pass
+
+    def error(self, message, *args):
+        pass
+
+    def separator(self):
+        pass
+
+
+class MockChain(BaseProvider):
+    """
+    In-memory blockchain answering the JSON-RPC calls of web3, mining transactions after a random delay.
+
+    DeFiHandler runs unchanged on top of it, so the calls counted by RPCAccounting are the ones the farming code
+    really makes. Tokens have an unlimited balance and no allowance, and every call succeeds.
+    """
+
+    def __init__(self, blockchain, clock, min_confirmation_sec=2, max_confirmation_sec=settings.PLAN_CONFIRMATION_SEC * 2,
+                 failure_rate=0.0):
+        self.blockchain = blockchain
+        self.clock = clock
+        self.min_confirmation_sec = min_confirmation_sec
+        self.max_confirmation_sec = max_confirmation_sec
+        self.failure_rate = failure_rate
+        self.endpoint_uri = f"mock://{blockchain}"
+        self.transactions = {}  # {hash: (mined at, receipt)}
+        self.nonces = Counter()  # Next nonce of each address
+        self.block_number = 0
+        self.lock = threading.Lock()  # The handlers call the chain from worker threads
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+    def make_request(self, method, params):
+        handler = getattr(self, method, None)
+        if handler is None:
+            return {"jsonrpc": "2.0", "id": 0, "error": {"code": -32601, "message": f"{method} is not mocked"}}
+        try:
+            with self.lock:
+                return {"jsonrpc": "2.0", "id": 0, "result": handler(*params)}
+        except MockRPCError as e:
+            return {"jsonrpc": "2.0", "id": 0, "error": e.error}
+
+    def web3_clientVersion(self):
+        return "MockChain"
+
+    def eth_chainId(self):
+        return hex(1337)
+
+    def eth_blockNumber(self):
+        return hex(self.block_number)
+
+    def eth_getBalance(self, address, block="latest"):
+        return hex(10 ** 24)
+
+    def eth_gasPrice(self):
+        return hex(GAS_PRICE)
+
+    def eth_feeHistory(self, block_count, newest_block, percentiles):
+        block_count = int(block_count, 16) if isinstance(block_count, str) else block_count
+        return {"oldestBlock": hex(self.block_number), "baseFeePerGas": [hex(GAS_PRICE)] * (block_count + 1),
+                "gasUsedRatio": [0.5] * block_count, "reward": [[hex(GAS_PRICE // 10)] * len(percentiles)] * block_count}
+
+    def eth_getTransactionCount(self, address, block="latest"):
+        return hex(self.nonces[address.lower()])
+
+    def eth_estimateGas(self, transaction, block=None):
+        return hex(150000 if transaction.get("data") else 21000)
+
+    def eth_call(self, transaction, block="latest"):
+        data = bytes.fromhex(transaction.get("data", "0x")[2:])
+        name = SELECTORS.get(data[:4])
+        if name == "allowance":
+            return "0x" + encode(["uint256"], [0]).hex()
+        if name == "balanceOf":
+            return "0x" + encode(["uint256"], [10 ** 30]).hex()
+        if name == "decimals":
+            return "0x" + encode(["uint8"], [18]).hex()
+        if name == "name":
+            return "0x" + encode(["string"], ["Mock Token"]).hex()
+        if name == "getAmountsOut":
+            amount_in, path = decode(["uint256", "address[]"], data[4:])
+            return "0x" + encode(["uint256[]"], [[amount_in] * len(path)]).hex()
+        if name == "minimum_transfer_amount":
+            raise MockRPCError({"code": 3, "message": "execution reverted", "data": "0x"})
+        # Simulated transactions succeed, zeros decode as a zero, false or empty output of any type
+        return "0x" + "00" * 64
+
+    def eth_sendRawTransaction(self, raw_transaction):
+        raw_transaction = bytes.fromhex(raw_transaction[2:])
+        if random.random() < self.failure_rate:
+            raise MockRPCError({"code": -32000, "message": "transaction rejected by the mock chain"})
+        sender = Account.recover_transaction(raw_transaction).lower()
+        # Typed transactions: type byte then [chainId, nonce, tip, max fee, gas, ...], legacy: [nonce, price, gas, ...]
+        typed = raw_transaction[0] <= 0x7f
+        fields = rlp.decode(raw_transaction[1:] if typed else raw_transaction)
+        nonce, gas = (int.from_bytes(field, "big") for field in ((fields[1], fields[4]) if typed else (fields[0], fields[2])))
+        if nonce < self.nonces[sender]:
+            raise MockRPCError({"code": -32000, "message": "nonce too low"})
+        self.nonces[sender] = nonce + 1
+
+        txn_hash = Web3.to_hex(Web3.keccak(raw_transaction))
+        self.block_number += 1
+        receipt = {"transactionHash": txn_hash, "blockHash": "0x" + "00" * 32, "blockNumber": hex(self.block_number),
+                   "transactionIndex": "0x0", "from": sender, "status": "0x1", "gasUsed": hex(int(gas * 0.8)),
+                   "cumulativeGasUsed": hex(int(gas * 0.8)), "effectiveGasPrice": hex(GAS_PRICE), "logs": [],
+                   "logsBloom": "0x" + "00" * 256, "contractAddress": None}
+        self.transactions[txn_hash] = (self.clock.time() + random.uniform(self.min_confirmation_sec,
+                                                                          self.max_confirmation_sec), receipt)
+        return txn_hash
+
+    def eth_getTransactionReceipt(self, txn_hash):
+        mined_at, receipt = self.transactions.get(txn_hash, (None, None))
+        if mined_at is None or self.clock.time() < mined_at:
+            return None
+        return receipt
+
+
+class MockRPCError(Exception):
+    def __init__(self, error):
+        self.error = error
+        super().__init__(error["message"])
+
+
+class Simulator:
+    def __init__(self, users, wallets_per_user, failure_rate=0.0, seed=None):
+        self.users = users
+        self.wallets_per_user = wallets_per_user
+        self.clock = VirtualClock()
+        self.failure_rate = failure_rate
+        self.chains = {}
+        self.chain_actors = {}
+        random.seed(seed)
+
+    def get_chain_actor(self, blockchain):
+        if blockchain not in self.chain_actors:
+            self.chains[blockchain] = MockChain(blockchain, self.clock, failure_rate=self.failure_rate)
+            self.chain_actors[blockchain] = ChainActor(blockchain, web3=create_web3(blockchain, self.chains[blockchain]))
+        return self.chain_actors[blockchain]
+
+    @staticmethod
+    def create_wallet(user_index, wallet_index):
+        private_key = Web3.keccak(text=f"simulator:{user_index}:{wallet_index}").hex()
+        return {"public_key": Account.from_key(private_key).address, "private_key": private_key}
+
+    def create_execution(self, user_index):
+        wallets = [self.create_wallet(user_index, wallet_index) for wallet_index in range(self.wallets_per_user)]
+        execution = AirdropExecution(
+            logger=NullLogger(),
+            wallets=wallets,
+            clock=self.clock,
+            chain_actor_factory=self.get_chain_actor,
+        )
+        # Only DeFi actions can be simulated
+        execution.airdrop_info = [
+            {**airdrop, "actions": [action for action in airdrop["actions"] if action["platform"] == "defi"]}
+            for airdrop in execution.airdrop_info
+        ]
+        execution.has_discord_action = False
+        execution.balance_precheck = False
+        execution.cancel_stuck_transactions = False  # Nonce gaps are read with batched requests, the mock chains have no endpoint
+        # Deposits are not simulated, the actions following a bridge run right after it: the mock chains never
+        # credit a deposit on the L2 side
+        execution.bridge_watcher = None
+        execution.airdrops_to_execute = [airdrop["name"] for airdrop in execution.get_active_airdrops()]
+        return execution
+
+    async def run_all(self, executions):
+        return await asyncio.gather(*[execution.airdrop_execution() for execution in executions])
+
+    def run(self):
+        rpc_accounting = RPCAccounting.get_shared()
+        calls_before = Counter(rpc_accounting.calls)
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        executions = [self.create_execution(user_index) for user_index in range(self.users)]
+        # Executions print every step, silence them to measure the engine and not the terminal
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            asyncio.run(self.clock.run(self.run_all(executions)))
+        wall_time = time.perf_counter() - start_time
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        actions = sum(len([action for action in airdrop["actions"] if action["isActivated"]])
+                      for airdrop in executions[0].get_active_airdrops()) * self.users * self.wallets_per_user \
+            if executions else 0
+        statuses = [status for execution in executions for status in execution.airdrop_statuses.values()]
+        return {
+            "users": self.users,
+            "wallets": self.users * self.wallets_per_user,
+            "actions": actions,
+            "succeeded_airdrops": sum(status is True for status in statuses),
+            "total_airdrops": len(statuses),
+            "virtual_duration_sec": self.clock.time(),
+            "wall_time_sec": wall_time,
+            "actions_per_virtual_hour": actions / self.clock.time() * 3600 if self.clock.time() else 0,
+            "actions_per_wall_sec": actions / wall_time if wall_time else 0,
+            "peak_memory_bytes": peak_memory,
+            "rpc_calls": dict(rpc_accounting.calls - calls_before),
+        }
+
+
+def print_report(report):
+    print(f"Users: {report['users']} - Wallets: {report['wallets']} - Actions: {report['actions']}")
+    print(f"Airdrops completed: {report['succeeded_airdrops']}/{report['total_airdrops']}")
+    print(f"Virtual duration: {report['virtual_duration_sec'] / 3600:.2f} h - Wall time: {report['wall_time_sec']:.2f} s")
+    print(f"Throughput: {report['actions_per_virtual_hour']:.1f} actions/virtual hour, "
+          f"{report['actions_per_wall_sec']:.1f} actions/wall second")
+    print(f"Peak memory: {report['peak_memory_bytes'] / 1024 / 1024:.1f} MiB")
+    print(f"RPC calls: {sum(report['rpc_calls'].values())}")
+    for method, count in sorted(report["rpc_calls"].items()):
+        print(f"  {method}: {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate farming runs in virtual time")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--wallets", type=int, default=5, help="Wallets per user")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of transactions rejected by the chain")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    print_report(Simulator(args.users, args.wallets, args.failure_rate, args.seed).run())
@@ -0,0 +1,87 @@
+# sync_detector.py
+import hashlib
+import math
+from collections import OrderedDict, deque
+import config.settings as settings
+from src.clock import Clock
+
+
+class SyncDetector:
+    """
+    Streaming detection of wallets of the same user acting in sync.
+
+    Every broadcast transaction is indexed by (user, target contract, calldata hash, amount bucket) in a sliding
+    time window. The wallet's own address is blanked out of the calldata so that the same call made for different
+    wallets (e.g. a withdrawal to self) hashes the same. When enough distinct wallets of a user land in the same
+    window, on_alert is called once for that cluster.
+    """
+
+    def __init__(self, on_alert=None, window_sec=None, min_wallets=None, amount_tolerance=None, clock=None):
+        self.on_alert = on_alert
+        self.window_sec = window_sec or settings.SYNC_DETECTION_WINDOW_SEC
+        self.min_wallets = min_wallets or settings.SYNC_DETECTION_MIN_WALLETS
+        self.amount_tolerance = amount_tolerance or settings.SYNC_DETECTION_AMOUNT_TOLERANCE
+        self.clock = clock or Clock()
+        # {key: {"events": deque of (timestamp, wallet) in time order, "counts": {wallet: events},
+        #        "alerted_until": timestamp}}, ordered by last activity so that idle keys are evicted first
+        self.windows = OrderedDict()
+
+    def get_key(self, user_id, wallet_address, to, data, value):
+        data = (data or "0x").lower()
+        own_address = wallet_address.lower()[2:]
+        if own_address:
+            data = data.replace(own_address, "0" * len(own_address))
+        calldata_hash = hashlib.sha256(data.encode()).hexdigest()[:16]
+        return user_id, (to or "").lower(), calldata_hash, self.amount_bucket(value)
+
+    def amount_bucket(self, value):
+        # Logarithmic buckets: amounts within the tolerance of each other usually share a bucket
+        value = int(value or 0)
+        if value <= 0:
+            return 0
+        return math.floor(math.log(value) / math.log1p(self.amount_tolerance))
+
+    def record(self, user_id, wallet_address, to, data, value, timestamp=None):
+        """Index a broadcast transaction, return the alert if it completes a cluster of synchronized wallets."""
+        now = self.clock.time() if timestamp is None else timestamp
+        self.evict_idle(now)
+
+        key = self.get_key(user_id, wallet_address, to, data, value)
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = {"events": deque(), "counts": {}, "alerted_until": 0}
+        self.windows.move_to_end(key)
+
+        # Events arrive in time order, an earlier timestamp (clock adjustment) is counted at the last one so that
+        # the window stays sorted: appending and dropping what left the window are O(1) per event
+        events = window["events"]
+        if events and now < events[-1][0]:
+            now = events[-1][0]
+        events.append((now, wallet_address.lower()))
+        window["counts"][wallet_address.lower()] = window["counts"].get(wallet_address.lower(), 0) + 1
+        while events[0][0] < now - self.window_sec:
+            _, wallet = events.popleft()
+            window["counts"][wallet] -= 1
+            if not window["counts"][wallet]:
+                del window["counts"][wallet]
+
+        if len(window["counts"]) < self.min_wallets or now < window["alerted_until"]:
+            return None
+        window["alerted_until"] = now + self.window_sec
+        alert = {
+            "user_id": user_id,
+            "to": to,
+            "wallets": sorted(window["counts"]),
+            "transactions": len(window["events"]),
+            "window_sec": self.window_sec,
+        }
+        if self.on_alert is not None:
+            self.on_alert(alert)
+        return alert
+
+    def evict_idle(self, now):
+        while self.windows:
+            key, window = next(iter(self.windows.items()))
+            if window["events"] and window["events"][-1][0] >= now - self.window_sec:
+                return
+            del self.windows[key]
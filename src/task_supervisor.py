@@ -0,0 +1,39 @@
+# task_supervisor.py
+import asyncio
+import logging
+
+
+class TaskSupervisor:
+    """Keep a reference to every background task of the bot, log their failures and drain them on shutdown."""
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.tasks = set()
+        self.closing = False
+
+    def spawn(self, coroutine, name=None):
+        if self.closing:
+            coroutine.close()
+            raise RuntimeError("The bot is shutting down, no new task can be started")
+        task = asyncio.create_task(coroutine, name=name)
+        self.tasks.add(task)
+        task.add_done_callback(self.on_task_done)
+        return task
+
+    def on_task_done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.add_log(f"ERROR - Task {task.get_name()} failed: {task.exception()!r}", logging.ERROR)
+
+    async def drain(self, timeout):
+        """Stop accepting tasks, wait up to timeout seconds for the running ones and cancel the rest."""
+        self.closing = True
+        if not self.tasks:
+            return
+        _, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.logger.add_log(f"WARNING - Cancelled {len(pending)} task(s) still running after {timeout} seconds",
+                                logging.WARNING)
+            await asyncio.gather(*pending, return_exceptions=True)
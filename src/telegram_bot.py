@@ -12,11 +12,17 @@ from config import settings
 import logging
 from ecdsa import SECP256k1
 from eth_keys import keys
+from web3 import Web3
 from src.airdrop_execution import AirdropExecution
 from src.botStates import BotStates
 from src.discord_handler import DiscordHandler
+from src.execution_dispatcher import ExecutionDispatcher, ExecutionQueueFull
 from src.footprint import Footprint
 from src.logger import Logger
+from src.metrics import TelegramLatencyMiddleware
+from src.rpc_accounting import RPCAccounting
+from src.sync_detector import SyncDetector
+from src.task_supervisor import TaskSupervisor
 from src.user import User
 from coinpayments import CoinPaymentsAPI
 import re
@@ -31,10 +37,16 @@ class TelegramBot:
     def __init__(self, token, db_manager, system_logger):
         self.bot = Bot(token=token)
         self.dp = Dispatcher(self.bot, storage=MemoryStorage())
+        self.dp.middleware.setup(TelegramLatencyMiddleware())
         self.db_manager = db_manager
         self.user_message_states = {}
         self.farming_users = {}  # Used to keep track of the users that are farming
         self.user_airdrop_executions = defaultdict(dict)
+        # Holds the farming and notification tasks, the dispatcher shares the farming slots between the subscription tiers
+        self.task_supervisor = TaskSupervisor(system_logger)
+        self.execution_dispatcher = ExecutionDispatcher(self.task_supervisor)
+        # Watches the transactions of all the runs and warns users whose wallets act in sync
+        self.sync_detector = SyncDetector(on_alert=self.on_sync_alert)
         self.airdrop_events = defaultdict(asyncio.Event)
         self.discord_handler = DiscordHandler(self.airdrop_events)
         self.user_loggers = {}  # Used to store Logger instances for each user
@@ -88,6 +100,7 @@ class TelegramBot:
                                          commands_prefix='/', state='*')
         self.dp.register_message_handler(self.cmd_send_message_to_user, commands=['send_message'],
                                          commands_prefix='/', state='*')
+        self.dp.register_message_handler(self.cmd_rpc_stats, commands=['rpc_stats'], commands_prefix='/', state='*')
 
     async def start_polling(self):
         async def on_startup(dp):
@@ -110,6 +123,19 @@ class TelegramBot:
         finally:
             await on_shutdown(self.dp)
 
+    async def stop(self):
+        # Ask the farming sessions to stop after their current action, drop the queued ones and wait for all the tasks
+        for execution in list(self.user_airdrop_executions.values()):
+            if not isinstance(execution, tuple):
+                continue
+            airdrop_execution, airdrop_execution_task = execution
+            airdrop_execution.stop_requested = True
+            if self.execution_dispatcher.is_queued(airdrop_execution_task):
+                airdrop_execution_task.cancel()
+                airdrop_execution.finished = True
+        await self.task_supervisor.drain(settings.SHUTDOWN_DRAIN_TIMEOUT_SEC)
+        await self.bot.session.close()
+
     async def get_user(self, telegram_id, try_register=False):
         user = await User.get_user_by_telegram_id(telegram_id, self.db_manager, self.sys_logger)
         if user is None and try_register is False:
@@ -202,6 +228,31 @@ class TelegramBot:
             await self.bot.send_message(user_id,
                                         "Your request has been sent to our support team. We will get back to you as soon as possible.")
 
+    async def claim_referral_rewards(self, message: types.Message):
+        user_id = message.chat.id
+        payout_address = message.text.strip()
+        if payout_address.lower() == "cancel":
+            self.user_message_states.pop(user_id)
+            await self.bot.send_message(user_id, "Request canceled.")
+            return
+        if not Web3.is_address(payout_address):
+            await self.bot.send_message(user_id, "This is not a valid wallet address, please try again or type 'cancel' to cancel.")
+            return
+        self.user_message_states.pop(user_id)
+
+        user = await self.get_user(user_id)
+        try:
+            amount = await user.claim_reward(self.db_manager, Web3.to_checksum_address(payout_address))
+        except Exception:
+            await self.bot.send_message(user_id, "An error occurred while claiming your rewards. Please try again later.")
+            return
+        if not amount:
+            await self.bot.send_message(user_id, "You have no referral rewards to claim.")
+            return
+        # The rewards are paid in batches, see RewardPayouts
+        await self.bot.send_message(user_id, f"✅ Your ${amount:.2f} of rewards will be sent to `{Web3.to_checksum_address(payout_address)}` with the next payout. Payouts are made once a day.",
+                                    parse_mode='Markdown')
+
     async def cmd_show_subscriptions_plans(self, message: types.Message = None, user_id: int = None, message_id=None):
         if user_id is None:
             user_id = message.chat.id
@@ -536,6 +587,10 @@ class TelegramBot:
             await self.cmd_remove_airdrop(query, params[0])
         elif action == 'remove_wallet':
             await self.cmd_remove_wallet(query, params[0])
+        elif action == 'set_fee_window':
+            if int(params[0]) in settings.FEE_WINDOW_OPTIONS_SEC:
+                await user.set_preference("fee_window_sec", int(params[0]), self.db_manager)
+            await self.send_menu(query.from_user.id, 'settings', message_id=query.message.message_id)
         elif action == 'start_farming':
             await self.cmd_start_farming(query.from_user.id, query.from_user.id, query.message.message_id)
         elif action == "stop_farming":
@@ -607,7 +662,7 @@ class TelegramBot:
             user_id = query.from_user.id
             # Tell the user on what currency and what network the payment will be done and ask for the user's wallet adress
             await self.bot.send_message(query.from_user.id, "To claim your referral rewards, please send your wallet address on the *BNB* network. The rewards will be sent in *USDT*. Type 'cancel' to cancel.", parse_mode='Markdown')
-            self.user_message_states[user_id] = "awaiting_contact_message"
+            self.user_message_states[user_id] = "awaiting_reward_address"
             self.dp.register_message_handler(self.handle_message, lambda msg: msg.from_user.id == user_id)
 
         await self.retry_request(self.bot.answer_callback_query, query.id)
@@ -739,6 +794,7 @@ class TelegramBot:
                 InlineKeyboardButton("📤 Contact", callback_data="menu:contact"),
                 InlineKeyboardButton("⚙️ Settings", callback_data="menu:settings"),
                 InlineKeyboardButton("👥 Referral", callback_data="menu:referral"),
+                InlineKeyboardButton("🧮 Run plan", callback_data="menu:run_plan"),
             )
             # Check if the user has any farming in progress
             if chat_id in self.farming_users and self.farming_users[chat_id]['status']:
@@ -844,8 +900,17 @@ class TelegramBot:
         elif menu == 'choose_currency':
             await self.choose_currency(user_id=chat_id, message_id=message_id)
         elif menu == 'settings':
-            message = "⚙️ *Settings*\n------------------------------\nThere are currently no settings to configure."
+            fee_window_sec = user.get_preference("fee_window_sec", 0)
+            current_window = self.format_duration(fee_window_sec) if fee_window_sec else "off"
+            message = "⚙️ *Settings*\n------------------------------\n" \
+                      "⛽ *Gas saving*\n" \
+                      f"DeFi actions can wait for the network fees to drop before being sent. Choose how long an action may be delayed (current: *{current_window}*)."
             parse_mode = 'Markdown'
+            keyboard.add(*[
+                InlineKeyboardButton(("✅ " if window == fee_window_sec else "") + (self.format_duration(window) if window else "Off"),
+                                     callback_data=f"set_fee_window:{window}")
+                for window in settings.FEE_WINDOW_OPTIONS_SEC
+            ])
             keyboard.add(
                 InlineKeyboardButton("🔙 Back home", callback_data="menu:main")
             )
@@ -872,6 +937,13 @@ class TelegramBot:
                 stats = '\n'.join([f"{key}: {value}" for key, value in stats.items()])
             message = f"📊 *Referral stats*\n------------------------------\n{stats}"
             parse_mode = 'Markdown'
+        elif menu == 'run_plan':
+            message = await self.get_run_plan_message(user)
+            parse_mode = 'Markdown'
+            keyboard.add(
+                InlineKeyboardButton("🔙 Back home", callback_data="menu:main"),
+                InlineKeyboardButton("🔄 Refresh", callback_data="menu:run_plan"),
+            )
         # Add more menus as needed
         else:
             return
@@ -889,6 +961,54 @@ class TelegramBot:
             except Exception as e:
                 self.sys_logger.add_log(f"Error sending message: {e}", logging.ERROR)
 
+    async def get_run_plan_message(self, user):
+        message = "🧮 *Run plan*\n------------------------------\n"
+        user_wallets = await user.get_wallets()
+        valid_airdrops = await self.get_valid_user_airdrops(user.telegram_id)
+        if not user_wallets:
+            return message + "Add a wallet to get a plan of your next farming run."
+        if not valid_airdrops:
+            return message + "You must have at least one active airdrop registered to get a plan."
+
+        airdrop_execution = AirdropExecution(logger=self.get_user_logger(user.telegram_id), wallets=user_wallets)
+        airdrop_execution.airdrops_to_execute = valid_airdrops
+        try:
+            plan = await airdrop_execution.plan_airdrop_execution()
+        except Exception as e:
+            self.sys_logger.add_log(f"ERROR - Error while planning the run of user {user.telegram_id}: {e}", logging.ERROR)
+            return message + "An error occurred while planning your run. Please try again later."
+
+        message += f"• Airdrops: {', '.join(plan['airdrops'])}\n"
+        message += f"• Wallets: {plan['wallet_count']}\n"
+        message += f"• Transactions: {plan['action_count']}\n"
+        message += f"• Estimated duration: {self.format_duration(plan['duration_min_sec'])} - {self.format_duration(plan['duration_max_sec'])}\n"
+
+        if plan['chains']:
+            message += "\n*⛽ Gas cost*\n"
+            for chain, chain_plan in plan['chains'].items():
+                gas_price_gwei = chain_plan['gas_price'] / 10 ** 9
+                message += f"• {chain.capitalize().replace('_', ' ')}: {chain_plan['total_cost'] / 10 ** 18:.6f} ETH ({gas_price_gwei:.2f} gwei)\n"
+
+        if plan['underfunded_wallets']:
+            wallet_names = {wallet['public_key'].lower(): wallet['name'] for wallet in user_wallets}
+            message += "\n*⚠️ Underfunded wallets*\n"
+            for wallet in plan['underfunded_wallets']:
+                name = wallet_names.get(wallet['address'].lower(), wallet['address']).replace('_', '\\_')
+                balance = f"{wallet['balance'] / 10 ** 18:.6f}" if wallet['balance'] is not None else "unknown"
+                message += f"• {name} on {wallet['blockchain'].capitalize().replace('_', ' ')}: needs {wallet['required'] / 10 ** 18:.6f} ETH, has {balance} ETH\n"
+        else:
+            message += "\n✅ All your wallets have enough funds for this run."
+
+        if any(not wallet['estimated'] for wallet in plan['wallets']):
+            message += "\n\nSome actions could not be estimated, default gas limits were used for them."
+        return message
+
+    @staticmethod
+    def format_duration(seconds):
+        hours, remainder = divmod(int(seconds), 3600)
+        minutes = remainder // 60
+        return f"{hours}h {minutes:02d}min" if hours else f"{minutes}min"
+
     async def cmd_display_log(self, user_id, chat_id, log_date, message_id):
         # Check if user plan permits to view logs
         user = await self.get_user(user_id)
@@ -966,17 +1086,35 @@ class TelegramBot:
         return [airdrop for airdrop in user_airdrops if airdrop in active_airdrop_names]
 
     async def execute_airdrop_farming(self, user_id, valid_airdrops, user_wallets=None):
-        await self.bot.send_message(user_id, "Airdrop farming started. You will be notified when the farming is complete.")
-
         self.farming_users[user_id]['status'] = True
 
-        airdrop_execution = AirdropExecution(self.discord_handler, self.get_user_logger(user_id), user_wallets)
+        user = await self.get_user(user_id)
+        airdrop_execution = AirdropExecution(self.discord_handler, self.get_user_logger(user_id), user_wallets,
+                                             db_manager=self.db_manager, user_id=user_id,
+                                             sync_detector=self.sync_detector,
+                                             fee_window_sec=user.get_preference("fee_window_sec", 0) if user is not None else 0)
         airdrop_execution.airdrops_to_execute = valid_airdrops
 
-        airdrop_execution_task = asyncio.create_task(airdrop_execution.airdrop_execution())
+        # The run waits for a slot of the user's subscription tier
+        subscription_level = user.subscription_level if user is not None else None
+        try:
+            airdrop_execution_task = self.execution_dispatcher.submit(subscription_level, airdrop_execution.airdrop_execution,
+                                                                      name=f"farming-{user_id}")
+        except ExecutionQueueFull as e:
+            self.sys_logger.add_log(f"WARNING - Farming request of user {user_id} refused: {e}", logging.WARNING)
+            del self.farming_users[user_id]
+            await self.bot.send_message(user_id, "⏳ The bot is currently at full capacity. Please try again in a few minutes.")
+            return
         self.user_airdrop_executions[user_id] = (airdrop_execution, airdrop_execution_task)
 
-        asyncio.create_task(self.notify_airdrop_execution(user_id))
+        if self.execution_dispatcher.is_queued(airdrop_execution_task):
+            delay = self.execution_dispatcher.estimate_start_delay(airdrop_execution_task)
+            await self.bot.send_message(user_id, f"⏳ All farming slots are busy, your farming is queued and should start in about {self.format_duration(delay)}. "
+                                                 "You will be notified when the farming is complete.")
+        else:
+            await self.bot.send_message(user_id, "Airdrop farming started. You will be notified when the farming is complete.")
+
+        self.task_supervisor.spawn(self.notify_airdrop_execution(user_id), name=f"farming-notifier-{user_id}")
 
     async def cmd_stop_farming(self, user_id, chat_id, message_id, stop_requested=False):
         await self.bot.delete_message(chat_id, message_id)
@@ -987,7 +1125,12 @@ class TelegramBot:
                 self.get_user_logger(user_id).add_log("WARNING - Stop farming requested.")
                 await self.bot.send_message(chat_id,
                                             "Stopping airdrop farming. This may take a few minutes. Please wait...")
-                await asyncio.gather(airdrop_execution_task)
+                if self.execution_dispatcher.is_queued(airdrop_execution_task):
+                    # The run didn't get a slot yet, there is nothing to wait for
+                    airdrop_execution_task.cancel()
+                    airdrop_execution.finished = True
+                else:
+                    await asyncio.gather(airdrop_execution_task)
             else:
                 if not stop_requested:
                     await self.bot.send_message(chat_id, "Airdrop farming is not running.")
@@ -998,15 +1141,16 @@ class TelegramBot:
 
     async def notify_airdrop_execution(self, user_id):
         # Verify if the airdrop execution has finished and notify the user
-        while not self.user_airdrop_executions[user_id][0].finished:
+        airdrop_execution, airdrop_execution_task = self.user_airdrop_executions[user_id]
+        # A farming task that crashed never sets finished
+        while not airdrop_execution.finished and not airdrop_execution_task.done():
             await asyncio.sleep(1)
 
         user = await self.get_user(user_id)
         if user is None:
             return
 
-        airdrop_results = self.user_airdrop_executions[user_id][0].airdrop_statuses
-        airdrop_execution = self.user_airdrop_executions[user_id][0]
+        airdrop_results = airdrop_execution.airdrop_statuses
 
         if not airdrop_execution.stop_requested:
             for airdrop_name, status in airdrop_results.items():
@@ -1024,6 +1168,23 @@ class TelegramBot:
         del self.user_airdrop_executions[user_id]
         del self.farming_users[user_id]
 
+    def on_sync_alert(self, alert):
+        # Called synchronously from the transaction broadcast, the message is sent in the background
+        self.task_supervisor.spawn(self.send_sync_alert(alert), name=f"sync-alert-{alert['user_id']}")
+
+    async def send_sync_alert(self, alert):
+        self.get_user_logger(alert["user_id"]).add_log(
+            f"WARNING - {len(alert['wallets'])} wallets sent the same transaction to {alert['to']} within {alert['window_sec']} seconds: {', '.join(alert['wallets'])}",
+            logging.WARNING)
+        await self.bot.send_message(alert["user_id"],
+                                    f"⚠️ *Synchronized wallets detected*\n\n"
+                                    f"{len(alert['wallets'])} of your wallets sent the same transaction to `{alert['to']}` "
+                                    f"within {self.format_duration(alert['window_sec'])}.\n\n"
+                                    "Identical transactions sent at the same time make it easy to link your wallets together "
+                                    "and may get them excluded from airdrops. Consider spreading your actions over time "
+                                    "and varying the amounts.",
+                                    parse_mode='Markdown')
+
     async def validate_and_store_public_key(self, message: types.Message):
         user_id = message.chat.id
         user_message = message.text
@@ -1447,6 +1608,31 @@ class TelegramBot:
         else:
             await message.answer("You are not allowed to use this command")
 
+    async def cmd_rpc_stats(self, message: types.Message):
+        # Check if the user is an admin
+        if message.chat.id in settings.ADMIN_TG_IDS:
+            await message.answer(self.format_rpc_stats(), parse_mode='Markdown')
+        else:
+            await message.answer("You are not allowed to use this command")
+
+    @staticmethod
+    def format_rpc_stats(max_rows=20):
+        accounting = RPCAccounting.get_shared()
+        stats = accounting.get_stats()
+        if not stats:
+            return "No JSON-RPC call since the bot started."
+        message = "*JSON-RPC calls by method* (calls, errors, p50/p95/p99 latency)\n"
+        for stat in stats[:max_rows]:
+            message += f"`{stat['method']}`: {stat['calls']}, {stat['errors']}, " \
+                       f"{stat['p50'] * 1000:.0f}/{stat['p95'] * 1000:.0f}/{stat['p99'] * 1000:.0f} ms\n"
+        action_stats = accounting.get_action_stats()
+        if action_stats:
+            message += "\n*JSON-RPC calls by action* (calls, per action)\n"
+            for stat in action_stats[:max_rows]:
+                message += f"{stat['airdrop']} / {stat['action'].replace('_', ' ')}: {stat['calls']}, " \
+                           f"{stat['per_action']:.1f}\n"
+        return message
+
     async def handle_message(self, message):
         user_id = message.from_user.id
         state = self.user_message_states.get(user_id)
@@ -1454,4 +1640,6 @@ class TelegramBot:
         if state == 'awaiting_public_key':
             await self.validate_and_store_public_key(message)
         elif state == 'awaiting_contact_message':
-            await self.send_contact_message(message)
\ No newline at end of file
+            await self.send_contact_message(message)
+        elif state == 'awaiting_reward_address':
+            await self.claim_referral_rewards(message)
\ No newline at end of file
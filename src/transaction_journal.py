@@ -0,0 +1,94 @@
+# transaction_journal.py
+from collections import defaultdict
+import config.settings as settings
+from src.clock import Clock
+from src.rpc_batch import RPCBatch, to_int
+
+
+class TransactionJournal:
+    """
+    Transactions sent by the wallets of the process, by blockchain, wallet and nonce.
+
+    A transaction is stuck when its nonce is between the "latest" and the "pending" nonces of its wallet. Both
+    counts of all the wallets are read in one batched request per blockchain, and the journal gives the hash sent
+    with each gap nonce, so only these transactions are fetched instead of scanning the whole txpool of the node.
+    A gap nonce the journal doesn't know (sent from the wallet outside the bot, or before a restart) is noted when
+    first seen and only reported once it has been pending for as long as a known one.
+    """
+
+    _instances = {}  # {clock: journal}, None for the wall clock
+
+    def __init__(self, max_entries=None, clock=None):
+        self.max_entries = max_entries or settings.TRANSACTION_JOURNAL_SIZE  # Per wallet
+        self.clock = clock or Clock()
+        # {(blockchain, lowercase address): {nonce: {"hash", "transaction", "time"}}}, hash and transaction are None for
+        # the nonces we didn't send and time is when they were first seen
+        self.wallets = defaultdict(dict)
+
+    @classmethod
+    def get_shared(cls, clock=None):
+        """Return the journal shared by all the runs of the process on the same clock, see BridgeWatcher.get_shared."""
+        if clock not in cls._instances:
+            cls._instances[clock] = cls(clock=clock)
+        return cls._instances[clock]
+
+    def record(self, blockchain, address, transaction, txn_hash):
+        # A replacement takes the place of the transaction it replaces
+        self.add(blockchain, address, transaction["nonce"],
+                 {"hash": txn_hash if isinstance(txn_hash, str) else "0x" + bytes(txn_hash).hex(),
+                  "transaction": transaction, "time": self.clock.time()})
+
+    def add(self, blockchain, address, nonce, entry):
+        entries = self.wallets[(blockchain, address.lower())]
+        entries[nonce] = entry
+        if len(entries) > self.max_entries:
+            del entries[min(entries)]
+        return entry
+
+    def get(self, blockchain, address, nonce):
+        return self.wallets.get((blockchain, address.lower()), {}).get(nonce)
+
+    def prune(self, blockchain, address, latest_nonce):
+        # The transactions below the latest nonce are mined or were replaced
+        entries = self.wallets.get((blockchain, address.lower()), {})
+        for nonce in [nonce for nonce in entries if nonce < latest_nonce]:
+            del entries[nonce]
+
+    async def find_stuck_transactions(self, blockchain, addresses, min_age_sec=None):
+        """
+        Pending transactions of the wallets older than min_age_sec: {address: [{"nonce", "hash", "transaction"}]}.
+
+        The hash and transaction are None for a gap nonce the journal doesn't know, e.g. sent before a restart. Its
+        age is counted from the first call that saw it.
+        """
+        min_age_sec = settings.STUCK_TRANSACTION_SEC if min_age_sec is None else min_age_sec
+        batch = RPCBatch(blockchain)
+        for address in addresses:
+            batch.add("eth_getTransactionCount", [address, "latest"])
+            batch.add("eth_getTransactionCount", [address, "pending"])
+        results = await batch.execute()
+
+        now = self.clock.time()
+        stuck = defaultdict(list)
+        for position, address in enumerate(addresses):
+            latest, pending = to_int(results[2 * position]), to_int(results[2 * position + 1])
+            if latest is None or pending is None:
+                continue
+            self.prune(blockchain, address, latest)
+            for nonce in range(latest, pending):
+                entry = self.get(blockchain, address, nonce)
+                if entry is None:
+                    entry = self.add(blockchain, address, nonce, {"hash": None, "transaction": None, "time": now})
+                if now - entry["time"] < min_age_sec:
+                    continue
+                stuck[address].append({"nonce": nonce, "hash": entry["hash"], "transaction": entry["transaction"]})
+
+        # Only the transactions of the gap nonces are fetched, those mined since the counts were read are dropped
+        known = [transaction for transactions in stuck.values() for transaction in transactions if transaction["hash"]]
+        for transaction in known:
+            batch.add("eth_getTransactionByHash", [transaction["hash"]])
+        results = await batch.execute()
+        mined = {transaction["hash"] for transaction, result in zip(known, results)
+                 if isinstance(result, dict) and result.get("blockNumber") is not None}
+        return {address: pending for address, transactions in stuck.items()
+                if (pending := [transaction for transaction in transactions if transaction["hash"] not in mined])}
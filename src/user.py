@@ -9,7 +9,8 @@ from datetime import datetime, timezone, timedelta
 
 class User:
     def __init__(self, telegram_id, username, subscription_level, logger, airdrops=None,
-                 twitter_credentials=None, discord_credentials=None, session_logs=None, subscription_expiry=None, referral_code=None):
+                 twitter_credentials=None, discord_credentials=None, session_logs=None, subscription_expiry=None, referral_code=None,
+                 preferences=None):
         self.telegram_id = telegram_id
         self.username = username
         self.subscription_level = subscription_level
@@ -19,6 +20,7 @@ class User:
         self.session_logs = session_logs if session_logs is not None else []
         self.subscription_expiry = subscription_expiry
         self.referral_code = referral_code
+        self.preferences = preferences if preferences is not None else {}  # Settings chosen in the settings menu
         self.sys_logger = logger
         self._secrets_manager = SecretsManager(url=settings.VAULT_URL, token=settings.VAULT_TOKEN, logger=self.sys_logger)
 
@@ -39,7 +41,7 @@ class User:
                 user_data['airdrops'] = json.loads(user_data['airdrops'])
             else:
                 user_data['airdrops'] = []
-
+            user_data['preferences'] = json.loads(user_data['preferences']) if user_data.get('preferences') else {}
 
             user = cls(**user_data, logger=logger)
             return user
@@ -72,6 +74,15 @@ class User:
             return airdrops if airdrops else []
         return []
 
+    def get_preference(self, key, default=None):
+        return self.preferences.get(key, default)
+
+    async def set_preference(self, key, value, db_manager):
+        self.preferences[key] = value
+        await db_manager.execute_query(
+            "UPDATE users SET preferences = $1 WHERE telegram_id = $2", json.dumps(self.preferences), self.telegram_id
+        )
+
     async def add_wallet(self, wallet):
         try:
             await self._secrets_manager.store_wallet(self.telegram_id, wallet)
@@ -260,20 +271,18 @@ class User:
         except Exception as e:
             raise e
 
-    async def claim_reward(self, db_manager):
+    async def claim_reward(self, db_manager, payout_address):
+        """Queue the unclaimed rewards of the user for the next payout to payout_address, return their total."""
         try:
-            reward = await db_manager.fetch_query(
-                "SELECT * FROM rewards WHERE user_id = $1 AND claimed = FALSE", self.telegram_id
+            rewards = await db_manager.fetch_query(
+                "UPDATE rewards SET claimed = TRUE, payout_address = $2 WHERE user_id = $1 AND claimed = FALSE RETURNING amount",
+                self.telegram_id, payout_address
             )
-            if not reward:
+            if not rewards:
                 self.sys_logger.add_log(f"No unclaimed reward found for user {self.telegram_id}")
                 return None
-
-            await db_manager.execute_query(
-                "UPDATE rewards SET claimed = TRUE WHERE user_id = $1 AND claimed = FALSE", self.telegram_id
-            )
             self.sys_logger.add_log(f"User {self.telegram_id} claimed their reward")
-            return reward[0]['amount']
+            return sum(reward['amount'] for reward in rewards)
         except Exception as e:
             self.sys_logger.add_log(f"Error during reward claiming: {e}", logging.ERROR)
             raise e